@@ -16,12 +16,17 @@ This responds to the following requests:
      returns HTTP status 303 ("retry") with a new "request ID", and fires a notification to
      any 'searcher components' to lookup the artifact.  Those searchers can independently
      perform their lookups and return values, which will be sent back to Resilient later.
+     The request ID is derived from the artifact, so a request for an artifact that is
+     already being looked up gets the same ID, and the searchers aren't notified again
+     (unless the lookup hasn't completed after 'later_retry_secs').
 
 *   GET /<root>/<request_id>
     - returns any available results for the given request_id.
     - if the ID is queued & no results yet => return an HTTP 303 so that the 'retry' info
     - If the ID has results ==> return them.
       Also the results can now be removed from the cache.
+    - If the ID has results in the persistent cache (see 'cache_file'), from before a restart
+      or from another process that shares the file ==> return them.
     - If we don't have any information about the ID => return null results.
       The cause is probably that we were queried some time ago, but the query expired from the cache,
       or the process died and lost all the cached queries.  Resilient will retry artifact searches
@@ -35,6 +40,7 @@ Searchers register to a single path, e.g. '/cts/gsb' for the Google Safe Browsin
 
 import json
 import logging
+import time
 from collections import namedtuple
 from uuid import UUID, uuid4, uuid5
 from cachetools import TTLCache
@@ -44,6 +50,7 @@ from circuits import Event, BaseComponent
 from circuits.web import BaseController
 from circuits.core.handlers import handler
 from rc_cts import searcher_channel
+from rc_cts.lib.result_cache import ResultCache, parse_type_ttls
 from requests_toolbelt.multipart import decoder, NonMultipartContentTypeException
 
 
@@ -60,6 +67,9 @@ CONFIG_LATER_RETRY_SECS = ConfigKey(key="later_retry_secs", default=0)
 CONFIG_CACHE_SIZE = ConfigKey(key="cache_size", default=10000)
 CONFIG_CACHE_TTL = ConfigKey(key="cache_ttl", default=600)
 CONFIG_MAX_RETRIES = ConfigKey(key="max_retries", default=60)
+CONFIG_CACHE_FILE = ConfigKey(key="cache_file", default=None)
+CONFIG_CACHE_TTL_TYPES = ConfigKey(key="cache_ttl_types", default="")
+CONFIG_NEGATIVE_CACHE_TTL = ConfigKey(key="negative_cache_ttl", default=None)
 
 HELPER_CHANNEL = "threat_lookup_helper"
 LOOKUP_COMPLETE_CHANNEL = "threat_lookup_complete"
@@ -137,6 +147,8 @@ class CustomThreatServiceHelper(BaseComponent):
             self.maincomponent.fire(event, event.cts_channel)
         except:
             LOG.exception("Failed to dispatch event")
+            # so the next request for the artifact looks it up
+            self.maincomponent.lookup_not_in_flight(event)
 
 
 def _make_args(opts):
@@ -187,6 +199,21 @@ class CustomThreatService(BaseController):
         # an upper bound on the number of in-progress and recent lookups.
         self.cache = TTLCache(maxsize=self.cache_size, ttl=self.cache_ttl)
 
+        # Optionally, completed lookups are also kept in a sqlite file, so they survive restarts
+        # and are shared by all the processes configured with the same file.
+        # Results are kept for the TTL of their artifact type, and results with no hits for the negative TTL.
+        self.result_cache = None
+        cache_file = self.options.get(CONFIG_CACHE_FILE.key, CONFIG_CACHE_FILE.default)
+        if cache_file:
+            negative_ttl = self.options.get(CONFIG_NEGATIVE_CACHE_TTL.key, CONFIG_NEGATIVE_CACHE_TTL.default)
+            self.result_cache = ResultCache(
+                cache_file,
+                ttl=self.cache_ttl,
+                type_ttls=parse_type_ttls(self.options.get(CONFIG_CACHE_TTL_TYPES.key,
+                                                           CONFIG_CACHE_TTL_TYPES.default)),
+                negative_ttl=self.cache_ttl if negative_ttl is None else int(negative_ttl))
+            LOG.info("Persistent result cache %s", cache_file)
+
         # Helper component does event dispatch work
         self.async_helper = CustomThreatServiceHelper(self)
         (self.helper_thread, self.bridge) = self.async_helper.start()
@@ -259,8 +286,9 @@ class CustomThreatService(BaseController):
             LOG.warn(err)
             return {"id": str(uuid4()), "hits": []}
         
-        # Generate a request ID, derived from the artifact being requested.
-        request_id = str(uuid5(self.namespace, json.dumps(body)))
+        # Generate a request ID, derived from the artifact being requested
+        # (with its keys sorted, so the same artifact always has the same ID).
+        request_id = str(uuid5(self.namespace, json.dumps(body, sort_keys=True)))
         artifact_type = body.get("type", "unknown")
         artifact_value = body.get("value")
         response_object = {"id": request_id, "hits": []}
@@ -273,16 +301,30 @@ class CustomThreatService(BaseController):
             return response_object
 
         # If we already have a completed query for this key, return it immmediately
-        request_data = self.cache.get(cache_key)
+        request_data = self._get_cached(cache_key, body)
         if request_data and request_data.get("complete"):
-            response_object["hits"] = request_data.get("hits", [])
-            return response_object
+            if time.time() < request_data.get("expires", float("inf")):
+                response_object["hits"] = request_data.get("hits", [])
+                return response_object
+            # Kept past the TTL of its artifact type (for the GET requests of its lookup), so look it up again
+            self.cache.pop(cache_key, None)
 
         response.status = 303
         response_object["retry_secs"] = self.first_retry_secs
 
-        # Add the request to the cache, then notify searchers that there's a new request
-        self.cache.setdefault(cache_key, {"id": request_id, "artifact": body, "hits": [], "complete": False})
+        # Add the request to the cache, then notify searchers that there's a new request,
+        # unless they're already looking it up (in which case this request waits for that lookup)
+        request_data = self.cache.setdefault(cache_key, {"id": request_id, "artifact": body, "hits": [],
+                                                         "complete": False})
+        in_flight = request_data.get("in_flight")
+        if in_flight and time.time() - in_flight < self.later_retry_secs:
+            LOG.debug("Lookup already in progress for %s", cache_key)
+            return response_object
+        if in_flight:
+            LOG.info("Lookup for %s didn't complete in %ss, looking it up again", cache_key, self.later_retry_secs)
+        # The time of the lookup, until it completes (which replaces the request data).
+        # If it hasn't completed after later_retry_secs, the next request looks it up again.
+        request_data["in_flight"] = time.time()
         evt = ThreatServiceLookupEvent(request_id=request_id, name=artifact_type, artifact=body, channel=cts_channel)
         self.async_helper.fire(evt, HELPER_CHANNEL)
 
@@ -318,7 +360,7 @@ class CustomThreatService(BaseController):
         response_object = {"id": request_id, "hits": []}
 
         cache_key = (cts_channel, request_id)
-        request_data = self.cache.get(cache_key)
+        request_data = self._get_cached(cache_key)
         if not request_data:
             # There's no record of this request in our cache, return empty hits
             response.status = 200
@@ -348,6 +390,14 @@ class CustomThreatService(BaseController):
 
         return response_object
 
+    def lookup_not_in_flight(self, event):
+        """
+        The lookup event wasn't dispatched to the searchers, so the next request for the artifact fires it again
+        """
+        request_data = self.cache.get((event.cts_channel, event.request_id))
+        if request_data:
+            request_data.pop("in_flight", None)
+
     @handler(channel=LOOKUP_COMPLETE_CHANNEL)
     def _lookup_complete(self, event, *args, **kwargs):
         """
@@ -367,6 +417,7 @@ class CustomThreatService(BaseController):
         # or an exception, or a tuple (type, exception, traceback)
         hits = []
         complete = True
+        failed = False
         if isinstance(results, list):
             for result in results:
                 if result:
@@ -375,6 +426,7 @@ class CustomThreatService(BaseController):
                         complete = False
                     elif isinstance(result, (tuple, Exception)):
                         LOG.error("No hits due to exception")
+                        failed = True
                     else:
                         hits.append(result)
         elif results:
@@ -383,9 +435,36 @@ class CustomThreatService(BaseController):
                 complete = False
             elif isinstance(results, (tuple, Exception)):
                 LOG.error("No hits due to exception")
+                failed = True
             else:
                 hits.append(results)
 
         # Store the result and mark as complete (or not)
         cache_key = (cts_channel, request_id)
-        self.cache[cache_key] = {"id": request_id, "artifact": artifact, "hits": hits, "complete": complete}
+        request_data = {"id": request_id, "artifact": artifact, "hits": hits, "complete": complete}
+
+        if self.result_cache and complete:
+            # A new POST only uses the result for the TTL of its artifact type (or the negative TTL),
+            # as with the persistent cache. Until then, it answers the GET requests of this lookup.
+            request_data["expires"] = 0 if failed else \
+                time.time() + self.result_cache.get_ttl(event.parent.name, hits)
+            # Keep complete results in the persistent cache, unless a searcher failed (so it's asked again)
+            if not failed:
+                self.result_cache.put(cts_channel, request_id, event.parent.name, hits)
+        self.cache[cache_key] = request_data
+
+    def _get_cached(self, cache_key, artifact=None):
+        """
+        The cached request data for a request ID, from this process's cache,
+        or else the completed result from the persistent cache (if there's one)
+        """
+        request_data = self.cache.get(cache_key)
+        if request_data or not self.result_cache:
+            return request_data
+        result = self.result_cache.get_with_expiry(*cache_key)
+        if result is None:
+            return None
+        hits, expires = result
+        request_data = {"id": cache_key[1], "artifact": artifact, "hits": hits, "complete": True, "expires": expires}
+        self.cache[cache_key] = request_data
+        return request_data
@@ -9,7 +9,7 @@ urlbase=/cts
 # Whether we support file upload (for "file"-type artifacts)
 # upload_file=False
 
-# Retry time indicators
+# Retry time indicators (a lookup that hasn't completed after later_retry_secs is fired again by the next request)
 #first_retry_secs=5
 #later_retry_secs=60
 #max_retries=60
@@ -18,6 +18,13 @@ urlbase=/cts
 #cache_size=10000
 #cache_ttl=600000
 
+# Persistent cache of completed lookups, shared by all processes with the same file
+#cache_file=/var/cache/rc-cts/results.sqlite
+# Seconds to keep the results of each artifact type (others are kept for cache_ttl)
+#cache_ttl_types=net.ip=3600, hash.md5=86400, hash.sha256=86400
+# Seconds to keep results with no hits (default is cache_ttl, 0 to not keep them)
+#negative_cache_ttl=600
+
 # tests can be run with a minimal mock in the [resilient] section,
 #resilient_mock=rc_cts.lib.resilient_mock.MyResilientMock
 
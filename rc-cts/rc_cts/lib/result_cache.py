@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Persistent cache of completed threat service lookups.
+
+The results are kept in a sqlite database file, so they survive restarts and are shared by
+all the resilient-circuits processes that use the same file.  Each result is kept for the TTL
+of its artifact type (or the default TTL).  Lookups that found nothing are kept for the
+negative TTL, so the searchers aren't asked again straight away.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+# Remove the expired results after this many results are stored
+PURGE_INTERVAL = 100
+
+
+def parse_type_ttls(value):
+    """
+    Parse the per-artifact-type TTLs from app.config, "type=seconds" separated by commas, semicolons or lines
+
+    :param value: string, such as "net.ip=3600, hash.md5=86400"
+    :return: dictionary of TTL (seconds) by artifact type
+    """
+    ttls = {}
+    for item in re.split(r"[,;\n]", value or ""):
+        item = item.strip()
+        if not item:
+            continue
+        artifact_type, _, ttl = item.partition("=")
+        if not ttl.strip():
+            raise ValueError(u"artifact type TTL must be type=seconds: {}".format(item))
+        ttls[artifact_type.strip()] = int(ttl)
+    return ttls
+
+
+class ResultCache(object):
+    """ Completed lookups (their hits), by threat service channel and request ID, in a sqlite database file """
+
+    def __init__(self, filename, ttl, type_ttls=None, negative_ttl=0):
+        """
+        :param filename: sqlite database file, created if needed
+        :param ttl: default number of seconds to keep a result
+        :param type_ttls: dictionary of seconds to keep the results of each artifact type
+        :param negative_ttl: number of seconds to keep a result with no hits (0 to not keep them)
+        """
+        self.filename = filename
+        self.ttl = ttl
+        self.type_ttls = type_ttls or {}
+        self.negative_ttl = negative_ttl
+        self._stored = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, check_same_thread=False, timeout=30)
+        try:
+            # so that readers in other processes don't wait for writers
+            self._db.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error:
+            pass
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                             "channel TEXT, request_id TEXT, artifact_type TEXT, hits TEXT, expires REAL, "
+                             "PRIMARY KEY (channel, request_id))")
+
+    def get(self, channel, request_id):
+        """
+        :return: list of the hits of the completed lookup, or None if there's no unexpired result
+        """
+        result = self.get_with_expiry(channel, request_id)
+        return result[0] if result else None
+
+    def get_with_expiry(self, channel, request_id):
+        """
+        :return: (list of the hits of the completed lookup, time that it expires), or None if there's no unexpired result
+        """
+        with self._lock:
+            try:
+                row = self._db.execute("SELECT hits, expires FROM results "
+                                       "WHERE channel=? AND request_id=? AND expires>?",
+                                       (channel, request_id, time.time())).fetchone()
+            except sqlite3.Error as err:
+                LOG.warning(u"Unable to read result cache %s: %s", self.filename, err)
+                return None
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def get_ttl(self, artifact_type, hits):
+        """ number of seconds to keep these hits of a lookup: the TTL of the artifact type, or the negative TTL """
+        ttl = self.type_ttls.get(artifact_type, self.ttl) if hits else self.negative_ttl
+        return max(0, ttl or 0)
+
+    def put(self, channel, request_id, artifact_type, hits):
+        """ keep the hits of a completed lookup, for the TTL of the artifact type (or the negative TTL) """
+        ttl = self.get_ttl(artifact_type, hits)
+        if not ttl:
+            return
+        try:
+            hits_json = json.dumps(hits)
+        except (TypeError, ValueError) as err:
+            LOG.warning(u"Unable to cache the hits for %s: %s", request_id, err)
+            return
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                                     (channel, request_id, artifact_type, hits_json, time.time() + ttl))
+                    self._stored += 1
+                    if self._stored % PURGE_INTERVAL == 0:
+                        self._db.execute("DELETE FROM results WHERE expires<=?", (time.time(),))
+            except sqlite3.Error as err:
+                LOG.warning(u"Unable to save result to cache %s: %s", self.filename, err)
+
+    def pop(self, channel, request_id):
+        """ remove the result of a lookup (if there is one), so it's looked up again """
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.execute("DELETE FROM results WHERE channel=? AND request_id=?", (channel, request_id))
+            except sqlite3.Error as err:
+                LOG.warning(u"Unable to remove result from cache %s: %s", self.filename, err)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
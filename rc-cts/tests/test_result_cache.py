@@ -0,0 +1,65 @@
+"""Tests for the persistent cache of threat service results"""
+import os
+import shutil
+import tempfile
+import time
+import pytest
+from rc_cts.lib.result_cache import ResultCache, parse_type_ttls
+
+HITS = [{"props": [{"type": "string", "name": "Source", "value": "test"}]}]
+
+
+class TestResultCache(object):
+    """ Unit tests """
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "results.sqlite")
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.directory)
+
+    def test_parse_type_ttls(self):
+        assert parse_type_ttls(None) == {}
+        assert parse_type_ttls("net.ip=3600, hash.md5 = 86400;\nnet.uri=60") == \
+            {"net.ip": 3600, "hash.md5": 86400, "net.uri": 60}
+        with pytest.raises(ValueError):
+            parse_type_ttls("net.ip")
+
+    def test_shared(self):
+        """Results are kept in the file, for other processes (or after a restart)"""
+        cache = ResultCache(self.filename, ttl=600)
+        assert cache.get("example", "id1") is None
+        cache.put("example", "id1", "net.ip", HITS)
+        assert cache.get("example", "id1") == HITS
+        assert cache.get("other", "id1") is None
+        cache.close()
+
+        other = ResultCache(self.filename, ttl=600)
+        assert other.get("example", "id1") == HITS
+        other.pop("example", "id1")
+        assert other.get("example", "id1") is None
+        other.close()
+
+    def test_ttls(self):
+        cache = ResultCache(self.filename, ttl=600, type_ttls={"net.ip": 0.2, "hash.md5": 0}, negative_ttl=0.2)
+        cache.put("example", "ip", "net.ip", HITS)
+        cache.put("example", "uri", "net.uri", HITS)
+        cache.put("example", "md5", "hash.md5", HITS)
+        cache.put("example", "none", "net.uri", [])
+        assert cache.get("example", "ip") == HITS
+        assert cache.get("example", "none") == []
+        # a TTL of 0 isn't kept
+        assert cache.get("example", "md5") is None
+
+        time.sleep(0.3)
+        assert cache.get("example", "ip") is None
+        assert cache.get("example", "none") is None
+        assert cache.get("example", "uri") == HITS
+        cache.close()
+
+    def test_no_negative_caching(self):
+        cache = ResultCache(self.filename, ttl=600)
+        cache.put("example", "none", "net.uri", [])
+        assert cache.get("example", "none") is None
+        cache.close()
@@ -0,0 +1,202 @@
+"""Tests for the custom threat service request handling"""
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from circuits import Event
+from circuits.core.values import Value
+from rc_cts.components.threat_webservice import CustomThreatService, ThreatServiceLookupEvent, \
+    ThreatLookupIncompleteException
+
+
+class Request(object):
+    def __init__(self, body):
+        self.body = io.BytesIO(json.dumps(body).encode("utf-8"))
+        self.headers = {"Content-Type": "application/json"}
+
+
+class Response(object):
+    status = 200
+
+
+class TestCustomThreatService(object):
+    """ Unit tests, without the web server """
+
+    def setup_method(self, method):
+        self.fired = []
+        self.cts = self.start({})
+
+    def teardown_method(self, method):
+        self.stop(self.cts)
+
+    def start(self, options):
+        """ a service that records the lookups, rather than firing them to searchers """
+        cts = CustomThreatService({"custom_threat_service": options})
+        fire = cts.async_helper.fire
+
+        def fire_lookup(evt, *channels):
+            if isinstance(evt, ThreatServiceLookupEvent):
+                self.fired.append(evt)
+            else:
+                fire(evt, *channels)
+        cts.async_helper.fire = fire_lookup
+        return cts
+
+    def stop(self, cts):
+        del cts.async_helper.fire
+        cts.async_helper.stop()
+        if cts.result_cache:
+            cts.result_cache.close()
+
+    def post(self, body):
+        response = Response()
+        result = self.cts._handle_post_request(Event(Request(body), response), "example")
+        return response.status, result
+
+    def complete(self, evt, results):
+        evt.value = Value(evt)
+        evt.value.value = results
+        complete_event = Event()
+        complete_event.parent = evt
+        self.cts._lookup_complete(complete_event)
+
+    def test_request_id(self):
+        """The same artifact has the same ID, whatever the order of its keys"""
+        _, result1 = self.post({"type": "net.ip", "value": "10.1.1.1", "properties": []})
+        _, result2 = self.post({"properties": [], "value": "10.1.1.1", "type": "net.ip"})
+        _, result3 = self.post({"type": "net.ip", "value": "10.1.1.2"})
+        assert result1["id"] == result2["id"]
+        assert result1["id"] != result3["id"]
+
+    def test_in_flight(self):
+        """An artifact is only looked up once while the lookup is in progress"""
+        artifact = {"type": "net.ip", "value": "10.1.1.1"}
+        for _ in range(3):
+            status, result = self.post(artifact)
+            assert status == 303
+        assert len(self.fired) == 1
+        evt = self.fired[0]
+        assert isinstance(evt, ThreatServiceLookupEvent)
+        assert evt.request_id == result["id"]
+
+        hit = {"props": [{"type": "string", "name": "Source", "value": "test"}]}
+        self.complete(evt, hit)
+        status, result = self.post(artifact)
+        assert status == 200
+        assert result["hits"] == [hit]
+        assert len(self.fired) == 1
+
+    def test_incomplete(self):
+        """A lookup that the searchers couldn't complete is made again by the next request"""
+        artifact = {"type": "net.ip", "value": "10.1.1.1"}
+        self.post(artifact)
+        self.complete(self.fired[0], ThreatLookupIncompleteException())
+        status, _ = self.post(artifact)
+        assert status == 303
+        assert len(self.fired) == 2
+
+    def test_stale_in_flight(self):
+        """A lookup that hasn't completed after later_retry_secs is fired again by the next request"""
+        self.cts.later_retry_secs = 0.1
+        artifact = {"type": "net.ip", "value": "10.1.1.1"}
+        self.post(artifact)
+        self.post(artifact)
+        assert len(self.fired) == 1
+        time.sleep(0.2)
+        status, _ = self.post(artifact)
+        assert status == 303
+        assert len(self.fired) == 2
+
+    def test_dispatch_failed(self):
+        """A lookup that couldn't be dispatched to the searchers is fired again by the next request"""
+        artifact = {"type": "net.ip", "value": "10.1.1.1"}
+        self.post(artifact)
+
+        def fail(evt, *channels):
+            raise RuntimeError("no searchers")
+        self.cts.fire = fail
+        self.cts.async_helper._lookup(self.fired[0])
+        del self.cts.fire
+
+        self.post(artifact)
+        assert len(self.fired) == 2
+
+
+class TestCustomThreatServiceCacheFile(TestCustomThreatService):
+    """ The same tests, and those of the persistent cache, with a cache_file """
+
+    def setup_method(self, method):
+        self.directory = tempfile.mkdtemp()
+        self.options = {"cache_file": os.path.join(self.directory, "results.sqlite"),
+                        "cache_ttl_types": "net.ip=1", "negative_cache_ttl": "0"}
+        super(TestCustomThreatServiceCacheFile, self).setup_method(method)
+        self.stop(self.cts)
+        self.cts = self.start(self.options)
+
+    def teardown_method(self, method):
+        super(TestCustomThreatServiceCacheFile, self).teardown_method(method)
+        shutil.rmtree(self.directory)
+
+    def restart(self):
+        self.stop(self.cts)
+        self.cts = self.start(self.options)
+
+    def test_restart(self):
+        """A completed lookup is used after a restart, without looking it up again"""
+        artifact = {"type": "net.uri", "value": "http://example.com"}
+        self.post(artifact)
+        hit = {"props": [{"type": "string", "name": "Source", "value": "test"}]}
+        self.complete(self.fired[0], hit)
+
+        self.restart()
+        status, result = self.post(artifact)
+        assert status == 200
+        assert result["hits"] == [hit]
+        assert len(self.fired) == 1
+
+    def test_failed_not_kept(self):
+        """A lookup where a searcher failed isn't kept, so it's looked up again (after a restart too)"""
+        artifact = {"type": "net.uri", "value": "http://example.com"}
+        self.post(artifact)
+        self.complete(self.fired[0], ValueError("searcher failed"))
+        assert self.cts.result_cache.get("example", self.fired[0].request_id) is None
+        status, _ = self.post(artifact)
+        assert status == 303
+        assert len(self.fired) == 2
+
+        self.restart()
+        status, _ = self.post(artifact)
+        assert status == 303
+        assert len(self.fired) == 3
+
+    def test_type_and_negative_ttls(self):
+        """The TTLs of artifact types, and for no hits, also apply to the results in memory"""
+        hit = {"props": [{"type": "string", "name": "Source", "value": "test"}]}
+        ip = {"type": "net.ip", "value": "10.1.1.1"}
+        none = {"type": "net.uri", "value": "http://example.com"}
+        self.post(ip)
+        self.post(none)
+        self.complete(self.fired[0], hit)
+        self.complete(self.fired[1], None)
+
+        # the results answer the GET requests of their lookups
+        response = Response()
+        result = self.cts._handle_get_request(Event(None, response), "example", self.fired[1].request_id)
+        assert response.status == 200
+        assert result["hits"] == []
+
+        status, result = self.post(ip)
+        assert status == 200
+        assert result["hits"] == [hit]
+        # but a new POST looks up an artifact with no hits again (the negative TTL is 0)
+        status, _ = self.post(none)
+        assert status == 303
+        assert len(self.fired) == 3
+
+        # and the artifact with hits once its type's TTL has passed
+        time.sleep(1.1)
+        status, _ = self.post(ip)
+        assert status == 303
+        assert len(self.fired) == 4
@@ -11,7 +11,7 @@ import base64
 from collections import Callable
 from signal import SIGINT, SIGTERM
 from six import string_types
-from circuits import BaseComponent, Worker
+from circuits import BaseComponent, Worker, task
 from circuits.core.manager import ExceptionWrapper
 from circuits.core.handlers import handler
 from requests.utils import DEFAULT_CA_BUNDLE_PATH
@@ -33,9 +33,9 @@ STOMP_TIMEOUT = 120                 # 2-minute socket timeout
 RETRY_TIMER_INTERVAL = 60           # Retry failed deliveries every minute
 MAX_RETRY_COUNT = 3                 # Retry failed deliveries this many times
 
-# Global idle timer, fires after 10 minutes to reset the REST connection
-IDLE_TIMER_INTERVAL = 600
-_idle_timer = None
+# Refresh the REST API session every 10 minutes, so it doesn't expire when idle
+SESSION_REFRESH_INTERVAL = 600
+SESSION_REFRESH_TIMEOUT = 30
 
 
 def validate_cert(cert, hostname):
@@ -159,20 +159,11 @@ class ResilientComponent(BaseComponent):
         """Return a connected instance of the :class:`resilient.SimpleClient`
         that can be used to access the Resilient REST API.
         """
-        self.reset_idle_timer()
         return get_resilient_client(self.opts)
 
     def reset_idle_timer(self):
-        """Create an idle-timer that we can use to reset the REST connection"""
-        global _idle_timer
-        if _idle_timer is None:
-            LOG.debug("create idle timer")
-            _idle_timer = Timer(IDLE_TIMER_INTERVAL,
-                                Event.create("idle_reset"), persist=True)
-            _idle_timer.register(self)
-        else:
-            LOG.debug("Reset idle timer")
-            _idle_timer.reset()
+        """Deprecated: the REST API session is now kept alive by the Actions component"""
+        pass
 
     def get_incident_field(self, fieldname):
         """Get the definition of an incident-field"""
@@ -280,8 +271,12 @@ class Actions(ResilientComponent):
         _retry_timer = Timer(RETRY_TIMER_INTERVAL, Event.create("retry_failed_deliveries"), persist=True)
         _retry_timer.register(self)
 
+        _session_refresh_timer = Timer(SESSION_REFRESH_INTERVAL, Event.create("session_refresh"), persist=True)
+        _session_refresh_timer.register(self)
+
         # Make a worker thread-pool that will run functions
-        self._functionworker = FunctionWorker(process=False, channel="functionworker")
+        self._functionworker = FunctionWorker(process=False, workers=opts.get("num_workers"),
+                                              channel="functionworker")
         self._functionworker.register(self.root)
 
         if opts.get("test_actions", False):
@@ -450,6 +445,23 @@ class Actions(ResilientComponent):
         LOG.debug("Idle reset")
         reset_resilient_client()
 
+    @handler("session_refresh")
+    def session_refresh(self, event):
+        """Keep the REST API session alive, keeping the client's pooled connections and cache"""
+        if self.opts.get("resilient_mock") or self.opts.get("replay_http_responses"):
+            return
+        # The refresh is a blocking REST call, so it runs in the function worker pool,
+        # rather than holding up the event loop (and message handling) until it returns
+        self.fire(task(self._refresh_session), "functionworker")
+
+    def _refresh_session(self):
+        LOG.debug("Session refresh")
+        try:
+            self.rest_client().refresh_session(timeout=SESSION_REFRESH_TIMEOUT)
+        except Exception as exc:
+            # The next request will re-authenticate if it needs to
+            LOG.warning(u"REST API session refresh failed: %s", exc)
+
     def _setup_stomp(self):
         rest_client = self.rest_client()
         if not rest_client.actions_enabled:
@@ -458,7 +470,7 @@ class Actions(ResilientComponent):
                       "No stomp connection attempted."))
             return
 
-        self.resilient_mock = self.opts["resilient_mock"] or False
+        self.resilient_mock = self.opts["resilient_mock"] or self.opts.get("replay_http_responses") or False
         if self.resilient_mock:
             # Using mock API, no need to create a real stomp connection
             LOG.warn("Using Mock. No Stomp connection")
@@ -963,7 +975,7 @@ class Actions(ResilientComponent):
                 if function_result:
                     LOG.debug("Result: %s", function_result.value)
                     reply_dto["results"] = function_result.value
-                reply_message = json.dumps(reply_dto, indent=2)
+                reply_message = json.dumps(reply_dto)
                 if not fevent.test:
                     self.fire(Send(headers={'correlation-id': correlation_id},
                                    body=reply_message,
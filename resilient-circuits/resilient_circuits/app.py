@@ -37,6 +37,7 @@ class AppArgumentParser(keyring_arguments.ArgumentParser):
     DEFAULT_LOG_LEVEL = 'INFO'
     DEFAULT_LOG_FILE = 'app.log'
     DEFAULT_NO_PROMPT_PASS = "False"
+    DEFAULT_NUM_WORKERS = 10
 
     def __init__(self, config_file=None):
 
@@ -53,6 +54,7 @@ class AppArgumentParser(keyring_arguments.ArgumentParser):
         default_log_dir = self.getopt("resilient", "logdir") or APP_LOG_DIR
         default_log_level = self.getopt("resilient", "loglevel") or self.DEFAULT_LOG_LEVEL
         default_log_file = self.getopt("resilient", "logfile") or self.DEFAULT_LOG_FILE
+        default_num_workers = self.getopt("resilient", "num_workers") or self.DEFAULT_NUM_WORKERS
 
         # STOMP port is usually 65001
         default_stomp_port = self.getopt("resilient", "stomp_port") or self.DEFAULT_STOMP_PORT
@@ -71,6 +73,8 @@ class AppArgumentParser(keyring_arguments.ArgumentParser):
         default_test_port = self.getopt("resilient", "test_port") or None
         default_log_responses = self.getopt("resilient",
                                             "log_http_responses") or ""
+        default_replay_responses = self.getopt("resilient",
+                                               "replay_http_responses") or ""
         logging.getLogger().removeHandler(temp_handler)
 
         self.add_argument("--stomp-port",
@@ -102,6 +106,10 @@ class AppArgumentParser(keyring_arguments.ArgumentParser):
                           type=str,
                           default=default_log_file,
                           help="File to log to")
+        self.add_argument("--num-workers",
+                          type=int,
+                          default=default_num_workers,
+                          help="Number of threads that run functions")
         self.add_argument("--no-prompt-password",
                           type=bool,
                           default=default_no_prompt_password,
@@ -133,6 +141,11 @@ class AppArgumentParser(keyring_arguments.ArgumentParser):
                           default=default_log_responses,
                           help=("Log all responses from Resilient "
                                 "REST API to this directory"))
+        self.add_argument("--replay-http-responses",
+                          type=str,
+                          default=default_replay_responses,
+                          help=("Replay responses from Resilient REST API "
+                                "that were logged to this directory"))
 
     def parse_args(self, args=None, namespace=None):
         """Parse commandline arguments and construct an opts dictionary"""
@@ -18,6 +18,8 @@ import datetime
 import pytz
 import random
 import re
+import threading
+from cachetools import LRUCache
 
 try:
     # Python 3.2 adds html.escape() and deprecates cgi.escape().
@@ -280,11 +282,78 @@ ENV = jinja2.Environment(autoescape=jinja2.select_autoescape(default_for_string=
 ENV.globals.update(JINJA_FILTERS)
 ENV.filters.update(JINJA_FILTERS)
 
+# Compiled templates, keyed by template text
+TEMPLATE_CACHE_SIZE = 256
+_template_cache = LRUCache(maxsize=TEMPLATE_CACHE_SIZE)
+_template_cache_lock = threading.Lock()
+
+# Named templates, precompiled by components at load time
+_named_templates = {}
+
+# Control characters that render_json replaces with spaces
+_CONTROL_CHARS = dict((n, u" ") for n in range(1, 32))
+
+
+def compile_template(template):
+    """Compile a template, or get it from the cache of compiled templates.
+
+        The template is usually a string, but can be a dict (or an already-compiled template).
+
+        >>> compile_template("template {{value}}") is compile_template("template {{value}}")
+        True
+    """
+    if isinstance(template, jinja2.Template):
+        return template
+
+    stringtemplate = template
+    if isinstance(template, dict):
+        stringtemplate = json.dumps(template, sort_keys=True)
+
+    with _template_cache_lock:
+        jtemplate = _template_cache.get(stringtemplate)
+    if jtemplate is not None:
+        return jtemplate
+
+    try:
+        jtemplate = ENV.from_string(stringtemplate)
+    except jinja2.exceptions.TemplateSyntaxError:
+        LOG.error("Render failed, with template: {0}".format(stringtemplate))
+        raise
+
+    with _template_cache_lock:
+        _template_cache[stringtemplate] = jtemplate
+    return jtemplate
+
+
+def add_template(name, template):
+    """Precompile a template and save it by name, for use with get_template() or render().
+       Components can call this when they load, so that the first render doesn't pay to compile.
+
+        >>> jtemplate = add_template("doctest_named", {"template": "{{value}}"})
+        >>> render(get_template("doctest_named"), {"value":"123"})
+        u'{"template": "123"}'
+    """
+    jtemplate = compile_template(template)
+    _named_templates[name] = jtemplate
+    return jtemplate
+
+
+def get_template(name):
+    """Get a template that was added by add_template()"""
+    return _named_templates[name]
+
+
+def clear_template_cache():
+    """Discard the compiled templates (but not the named templates)"""
+    with _template_cache_lock:
+        _template_cache.clear()
+
 
 def render(template, data):
     """Render data into a template, producing a string result
 
-        The template is usually a string, but can be a dict.
+        The template is usually a string, but can be a dict, or a compiled template.
+        Compiled templates are cached, so rendering the same template again is cheap.
 
         >>> render("template {{value}}", {"value":"123"})
         u'template 123'
@@ -343,15 +412,7 @@ def render(template, data):
         u'{"description": "DN=uid=einstein,dc=example,dc=com, mail=einstein@ldap.forumsys.com"}'
     """
 
-    stringtemplate = template
-    if isinstance(template, dict):
-        stringtemplate = json.dumps(template, sort_keys=True)
-
-    try:
-        jtemplate = ENV.from_string(stringtemplate)
-    except jinja2.exceptions.TemplateSyntaxError:
-        LOG.error("Render failed, with template: {0}".format(stringtemplate))
-        raise
+    jtemplate = compile_template(template)
 
     try:
         stringvalue = jtemplate.render(data)
@@ -374,8 +435,12 @@ def render_json(template, data):
        {u'result': u'the new thing'}
     """
     result = render(template, data)
-    for n in range(1, 32):
-        result = result.replace(chr(n), " ")
+    return _loads_clean(result)
+
+
+def _loads_clean(result):
+    """Replace control characters with spaces, in one pass, then parse the JSON"""
+    result = result.translate(_CONTROL_CHARS)
     try:
         value = json.loads(result)
     except:
@@ -384,6 +449,30 @@ def render_json(template, data):
     return value
 
 
+def render_many(template, rows):
+    """Render each of the rows into a template, producing a string result for each.
+       The template is compiled once.  This is a generator, so the results can be
+       streamed out as they are rendered.
+
+       >>> list(render_many("template {{value}}", [{"value":"1"}, {"value":"2"}]))
+       [u'template 1', u'template 2']
+    """
+    jtemplate = compile_template(template)
+    for data in rows:
+        yield render(jtemplate, data)
+
+
+def render_json_many(template, rows):
+    """Render each of the rows into a template, producing a JSON result for each
+       (as render_json does).  This is a generator.
+
+       >>> list(render_json_many('{"result":"{{value}}"}', [{"value":"a" + chr(10) + "b"}]))
+       [{u'result': u'a b'}]
+    """
+    for result in render_many(template, rows):
+        yield _loads_clean(result)
+
+
 def environment():
     return ENV
 
@@ -0,0 +1,58 @@
+# (c) Copyright IBM Corp. 2010, 2018. All Rights Reserved.
+from __future__ import print_function
+import threading
+import time
+from circuits import Manager
+import resilient_circuits.actions_component as actions_component
+from resilient_circuits.actions_component import Actions
+
+
+class FakeClient(object):
+    """ REST client that records the session refreshes """
+    org_id = 201
+    actions_enabled = False
+
+    def __init__(self):
+        self.refreshes = []
+
+    def cached_get(self, uri):
+        return {"entities": []} if uri in ("/message_destinations", "/functions") else []
+
+    def get(self, uri):
+        return {"entities": []}
+
+    def refresh_session(self, timeout=None):
+        self.refreshes.append((threading.current_thread().name, timeout))
+
+
+class TestSessionRefresh:
+    def test_refresh_in_function_worker(self, monkeypatch):
+        """The session refresh timer fires, and the refresh runs in the function worker pool"""
+        client = FakeClient()
+        monkeypatch.setattr(actions_component, "get_resilient_client", lambda opts: client)
+        monkeypatch.setattr(actions_component, "SESSION_REFRESH_INTERVAL", 0.1)
+        opts = {"stomp_prefetch_limit": 20, "num_workers": 2, "resilient_mock": None, "log_http_responses": None}
+
+        manager = Manager()
+        Actions(opts).register(manager)
+        # the event loop's thread
+        loop_thread, _ = manager.start()
+        try:
+            deadline = time.time() + 5
+            while len(client.refreshes) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            manager.stop()
+
+        assert len(client.refreshes) >= 2
+        for thread_name, timeout in client.refreshes:
+            assert thread_name != loop_thread.name
+            assert thread_name != threading.current_thread().name
+            assert timeout == actions_component.SESSION_REFRESH_TIMEOUT
+
+    def test_no_refresh_with_mock(self, monkeypatch):
+        client = FakeClient()
+        monkeypatch.setattr(actions_component, "get_resilient_client", lambda opts: client)
+        actions = Actions({"stomp_prefetch_limit": 20, "num_workers": 1, "resilient_mock": "some.Mock"})
+        actions.session_refresh(None)
+        assert client.refreshes == []
@@ -0,0 +1,72 @@
+# (c) Copyright IBM Corp. 2010, 2018. All Rights Reserved.
+from __future__ import print_function
+import pytest
+import jinja2
+from resilient_circuits import template_functions
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    template_functions.clear_template_cache()
+
+
+class TestTemplateCache:
+    def test_string_template_compiled_once(self, monkeypatch):
+        calls = []
+        from_string = template_functions.ENV.from_string
+
+        def counting_from_string(source):
+            calls.append(source)
+            return from_string(source)
+        monkeypatch.setattr(template_functions.ENV, "from_string", counting_from_string)
+
+        for value in range(3):
+            assert template_functions.render("v={{value}}", {"value": value}) == "v={0}".format(value)
+        assert calls == ["v={{value}}"]
+
+    def test_dict_template(self):
+        template = {"name": "{{value}}", "id": 1}
+        first = template_functions.compile_template(template)
+        assert template_functions.compile_template({"id": 1, "name": "{{value}}"}) is first
+        assert template_functions.render_json(template, {"value": "x"}) == {"name": "x", "id": 1}
+
+    def test_bounded(self, monkeypatch):
+        monkeypatch.setattr(template_functions, "_template_cache", template_functions.LRUCache(maxsize=2))
+        first = template_functions.compile_template("{{a}}")
+        template_functions.compile_template("{{b}}")
+        template_functions.compile_template("{{a}}")
+        template_functions.compile_template("{{c}}")
+        assert len(template_functions._template_cache) == 2
+        assert template_functions.compile_template("{{a}}") is first
+
+    def test_syntax_error_not_cached(self):
+        with pytest.raises(jinja2.TemplateSyntaxError):
+            template_functions.render("{{value", {})
+        assert len(template_functions._template_cache) == 0
+
+    def test_named_template(self):
+        compiled = template_functions.add_template("test_named", "hello {{name}}")
+        assert template_functions.get_template("test_named") is compiled
+        assert template_functions.render(compiled, {"name": "world"}) == "hello world"
+        with pytest.raises(KeyError):
+            template_functions.get_template("not_added")
+
+
+class TestRenderMany:
+    def test_render_many(self):
+        rows = ({"value": n} for n in range(3))
+        results = template_functions.render_many("v={{value}}", rows)
+        assert not isinstance(results, list)
+        assert list(results) == ["v=0", "v=1", "v=2"]
+
+    def test_render_json_many(self):
+        rows = [{"value": "a" + chr(1) + "b" + chr(31) + "c"}, {"value": "d" + chr(32) + "e"}]
+        results = list(template_functions.render_json_many({"result": "{{value}}"}, rows))
+        assert results == [{"result": "a b c"}, {"result": "d e"}]
+        assert results[0] == template_functions.render_json({"result": "{{value}}"}, rows[0])
+
+    def test_render_json_many_invalid(self):
+        results = template_functions.render_json_many('{"result": {{value}} }', [{"value": 1}, {"value": "x"}])
+        assert next(results) == {"result": 1}
+        with pytest.raises(ValueError):
+            next(results)
@@ -4,4 +4,10 @@ __import__('pkg_resources').declare_namespace(__name__)
 from resilient_lib.components.function_result import ResultPayload
 from resilient_lib.components.html2markdown import MarkdownParser
 from resilient_lib.components.requests_common import RequestsCommon
+from resilient_lib.components.response_cache import ResponseCache
+from resilient_lib.components.response_stream import ResponseStream
+from resilient_lib.components.attachment_cache import AttachmentCache
+from resilient_lib.components.multi_hash import MultiHash
+from resilient_lib.components.data_tables import DataTableReader, DataTableWriter
+from resilient_lib.components.artifacts import IncidentArtifacts, create_artifacts
 from resilient_lib.components.resilient_common import *
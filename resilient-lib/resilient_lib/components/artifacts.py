@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+# pragma pylint: disable=unused-argument, no-self-use
+
+import threading
+from six import string_types
+from resilient_lib.components.rest_batch import RestBatch, DEFAULT_MAX_CONCURRENCY, DEFAULT_RETRIES, \
+    DEFAULT_RETRY_BACKOFF, DEFAULT_RETRY_MAX_DELAY
+
+
+def create_artifacts(res_client, incident_id, artifacts, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Add artifacts to an incident, except those it already has (with the same type and value)
+
+    :param res_client: required for communication back to resilient
+    :param incident_id: incident to add the artifacts to
+    :param artifacts: list of artifact DTOs, such as {"type": "IP Address", "value": "192.168.1.1", "description": ...}
+    :param max_concurrency: maximum number of artifacts created at once
+    :return: see IncidentArtifacts.create_artifacts
+    """
+    return IncidentArtifacts(res_client, incident_id, max_concurrency=max_concurrency).create_artifacts(artifacts)
+
+
+class IncidentArtifacts(RestBatch):
+    """
+    The artifacts of an incident, read once and indexed by type and value, so new artifacts can be checked
+    for duplicates without a REST call each. The artifacts that aren't duplicates are created up to
+    max_concurrency at a time.
+
+        incident_artifacts = IncidentArtifacts(res_client, incident_id)
+        result = incident_artifacts.create_artifacts([{"type": "IP Address", "value": ip} for ip in ips])
+
+    Artifact types are names (as with handle_format=names), or ids which are looked up in the artifact types
+    of the ConstREST endpoint.
+
+    If creating an artifact fails in a way that the server may have created it anyway (such as a read timeout
+    or a 502), the incident's artifacts are read again, and it's only created again if it isn't there.
+    """
+    def __init__(self, res_client, incident_id, max_concurrency=DEFAULT_MAX_CONCURRENCY, retries=DEFAULT_RETRIES,
+                 retry_backoff=DEFAULT_RETRY_BACKOFF, retry_max_delay=DEFAULT_RETRY_MAX_DELAY):
+        """
+        :param res_client: required for communication back to resilient
+        :param incident_id: incident with the artifacts
+        :param max_concurrency: maximum number of calls in progress at once
+        :param retries: number of times to make a call again after a transient failure
+        :param retry_backoff: seconds to wait before the first retry, doubling for each retry after
+        :param retry_max_delay: maximum seconds to wait before a retry
+        """
+        super(IncidentArtifacts, self).__init__(res_client, max_concurrency=max_concurrency, retries=retries,
+                                                retry_backoff=retry_backoff, retry_max_delay=retry_max_delay)
+        self.incident_id = incident_id
+        self.uri = "/incidents/{}/artifacts".format(incident_id)
+        self._index = None
+        self._type_names = None
+        self._lock = threading.RLock()
+
+    def get_artifacts(self):
+        """ the incident's artifacts (read once) """
+        with self._lock:
+            return [artifact for artifacts in self._get_index().values() for artifact in artifacts]
+
+    def refresh(self):
+        """ read the incident's artifacts again """
+        artifacts = self.call("get", self.uri + "?handle_format=names")
+        with self._lock:
+            self._index = {}
+            for artifact in artifacts:
+                self._index.setdefault(self._key(artifact), []).append(artifact)
+
+    def find(self, artifact_type, value):
+        """ the incident's artifacts with this type (name or id) and value """
+        with self._lock:
+            return list(self._get_index().get(self._key({"type": artifact_type, "value": value}), ()))
+
+    def create_artifacts(self, artifacts):
+        """
+        Create the artifacts that the incident doesn't have yet
+
+        :param artifacts: list of artifact DTOs, such as {"type": "IP Address", "value": "192.168.1.1"}
+        :return: dictionary of "created" (list of the results of creating the new artifacts, in order;
+            the result is the exception if one couldn't be created) and "duplicates" (the artifacts that
+            the incident already had, or that were in the list more than once)
+        """
+        new, duplicates = [], []
+        with self._lock:
+            index = self._get_index()
+            keys = set()
+            for artifact in artifacts:
+                key = self._key(artifact)
+                if key in index or key in keys:
+                    duplicates.append(artifact)
+                else:
+                    keys.add(key)
+                    new.append(artifact)
+
+        results = self.call_many([("post", self.uri, artifact, self._find_created(artifact)) for artifact in new])
+
+        with self._lock:
+            for artifact, result in zip(new, results):
+                if isinstance(result, Exception):
+                    continue
+                # the created artifacts, with the type as it was given (unless they were read again)
+                indexed = self._index.setdefault(self._key(artifact), [])
+                ids = set(existing.get("id") for existing in indexed)
+                created = result if isinstance(result, list) else [result]
+                indexed.extend(new_artifact for new_artifact in created if new_artifact.get("id") not in ids)
+
+        return {"created": results, "duplicates": duplicates}
+
+    def _find_created(self, artifact):
+        """ check for a failed post of the artifact: the incident's artifacts with its type and value, read again """
+        def check():
+            self.refresh()
+            with self._lock:
+                return list(self._index.get(self._key(artifact), ())) or None
+        return check
+
+    def _get_index(self):
+        if self._index is None:
+            self.refresh()
+        return self._index
+
+    def _key(self, artifact):
+        """ (type name, value) of an artifact """
+        artifact_type = artifact.get("type")
+        if isinstance(artifact_type, dict):
+            artifact_type = artifact_type.get("name", artifact_type.get("id"))
+        if not isinstance(artifact_type, string_types):
+            artifact_type = self._get_type_names().get(artifact_type, artifact_type)
+        value = artifact.get("value")
+        if isinstance(value, string_types):
+            value = value.strip()
+        return artifact_type, value
+
+    def _get_type_names(self):
+        if self._type_names is None:
+            self._type_names = dict((artifact_type["id"], artifact_type["name"])
+                                    for artifact_type in self.res_client.get_const().get("artifact_types", []))
+        return self._type_names
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+# pragma pylint: disable=unused-argument, no-self-use
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from resilient_lib.components.resilient_common import _get_attachment_uri
+from resilient_lib.components.response_stream import ResponseStream
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "resilient-attachments")
+DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+# Attachment caches, shared by all threads in the process
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_attachment_cache(directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+    """ get the shared attachment cache in this directory, creating it if needed """
+    key = (os.path.abspath(directory), max_size)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = AttachmentCache(directory=directory, max_size=max_size)
+            _caches[key] = cache
+        return cache
+
+
+class AttachmentCache(object):
+    """
+    This class keeps the data of attachments and artifacts on disk, so that functions in a workflow that
+    each need the same file (to hash it, submit it to a sandbox, scan it, ...) only download it once.
+
+    The files are named by the sha256 of their data, so identical data is only kept once. They are found
+    by incident, attachment or artifact id and the object's version, so a changed object is downloaded again.
+    When the files add up to more than max_size, the least recently used are removed. The index is a
+    sqlite database in the directory, so the cache can be shared by processes.
+
+        cache = get_attachment_cache()
+        data = cache.get_file_attachment(res_client, incident_id, artifact_id=artifact_id)
+        mapped = cache.get_mmap(res_client, incident_id, artifact_id=artifact_id)
+    """
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_size=DEFAULT_MAX_SIZE):
+        """
+        :param directory: directory for the files and index, created if needed
+        :param max_size: maximum number of bytes of files to keep
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # one download at a time of each object: [lock, number of threads using it] by key,
+        # removed when no thread is using it
+        self._downloads = {}
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False, timeout=30)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, digest TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS files (digest TEXT PRIMARY KEY, size INTEGER, last_used REAL)")
+
+    def stats(self):
+        """ hit/miss metrics """
+        with self._lock:
+            row = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "files": row[0],
+                    "size": row[1]}
+
+    def get_path(self, res_client, incident_id, artifact_id=None, task_id=None, attachment_id=None, version=None):
+        """
+        Get the path of the cached file with the data of the attachment or artifact, downloading it if needed
+
+        :param res_client: required for communication back to resilient
+        :param incident_id: required
+        :param artifact_id: optional
+        :param task_id: optional
+        :param attachment_id: optional
+        :param version: the object's version (its "vers"), if known. Otherwise, it's looked up.
+        :return: path of the file. Don't change it, it may be shared.
+        """
+        uri = _get_attachment_uri(incident_id, artifact_id, task_id, attachment_id)
+        if version is None:
+            version = _get_version(res_client.get(uri))
+        key = json.dumps([incident_id, task_id, artifact_id, attachment_id, version])
+
+        with self._lock:
+            download = self._downloads.setdefault(key, [threading.Lock(), 0])
+            download[1] += 1
+        try:
+            with download[0]:
+                path = self._lookup(key)
+                if path is not None:
+                    with self._lock:
+                        self.hits += 1
+                    return path
+                with self._lock:
+                    self.misses += 1
+                return self._download(res_client, uri, key)
+        finally:
+            with self._lock:
+                download[1] -= 1
+                if not download[1]:
+                    del self._downloads[key]
+
+    def get_file_attachment(self, res_client, incident_id, artifact_id=None, task_id=None, attachment_id=None,
+                            version=None):
+        """ the same as resilient_lib.get_file_attachment, from the cache: byte string of attachment """
+        path = self.get_path(res_client, incident_id, artifact_id=artifact_id, task_id=task_id,
+                             attachment_id=attachment_id, version=version)
+        with open(path, "rb") as infile:
+            return infile.read()
+
+    def get_mmap(self, res_client, incident_id, artifact_id=None, task_id=None, attachment_id=None, version=None):
+        """
+        The data of the attachment or artifact, mapped into memory (read-only) from the cache rather than copied.
+        It can be sliced, searched and hashed like a byte string. close() it when done.
+
+        :return: mmap.mmap (or an empty byte string, since an empty file can't be mapped)
+        """
+        path = self.get_path(res_client, incident_id, artifact_id=artifact_id, task_id=task_id,
+                             attachment_id=attachment_id, version=version)
+        with open(path, "rb") as infile:
+            if os.fstat(infile.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def clear(self):
+        with self._lock:
+            for (digest,) in self._db.execute("SELECT digest FROM files").fetchall():
+                self._remove_file(digest)
+            with self._db:
+                self._db.execute("DELETE FROM entries")
+                self._db.execute("DELETE FROM files")
+
+    def _file_path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _lookup(self, key):
+        """ path of the cached file for the key, or None """
+        with self._lock:
+            row = self._db.execute("SELECT digest FROM entries WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            path = self._file_path(row[0])
+            if not os.path.exists(path):
+                # removed by another process
+                return None
+            with self._db:
+                self._db.execute("UPDATE files SET last_used=? WHERE digest=?", (time.time(), row[0]))
+            return path
+
+    def _download(self, res_client, uri, key):
+        """ download the data to a temporary file, then move it to its place by digest """
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as outfile:
+                if hasattr(res_client, "get_content_stream"):
+                    with ResponseStream(res_client.get_content_stream(uri + "/contents"), hashes=["sha256"]) as stream:
+                        result = stream.save(outfile)
+                    digest, size = result["hashes"]["sha256"], result["size"]
+                else:
+                    content = res_client.get_content(uri + "/contents")
+                    outfile.write(content)
+                    digest, size = hashlib.sha256(content).hexdigest(), len(content)
+
+            path = self._file_path(digest)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path), 0o700)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.rename(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        with self._lock:
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (digest, size, time.time()))
+                self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?)", (key, digest))
+            self._evict(keep=digest)
+        return path
+
+    def _evict(self, keep):
+        """ remove the least recently used files, until they add up to no more than max_size """
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        if total <= self.max_size:
+            return
+        rows = self._db.execute("SELECT digest, size FROM files WHERE digest != ? ORDER BY last_used",
+                                (keep,)).fetchall()
+        for digest, size in rows:
+            if total <= self.max_size:
+                break
+            self._remove_file(digest)
+            with self._db:
+                self._db.execute("DELETE FROM entries WHERE digest=?", (digest,))
+                self._db.execute("DELETE FROM files WHERE digest=?", (digest,))
+            total -= size
+
+    def _remove_file(self, digest):
+        try:
+            os.remove(self._file_path(digest))
+        except OSError as err:
+            # already removed, or still open (on Windows)
+            LOG.debug(u"Unable to remove cached file %s: %s", digest, err)
+
+
+def _get_version(dto):
+    """ version of the attachment or artifact, so that a changed object isn't found in the cache """
+    attachment = dto.get("attachment") or {}
+    for obj in (dto, attachment):
+        if obj.get("vers") is not None:
+            return obj["vers"]
+    # without a version, a change of the file's creation time or size means that it changed
+    return [attachment.get("created", dto.get("created")), attachment.get("size", dto.get("size"))]
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+# pragma pylint: disable=unused-argument, no-self-use
+
+import threading
+import time
+from collections import OrderedDict
+from resilient_lib.components.rest_batch import RestBatch, DEFAULT_MAX_CONCURRENCY, DEFAULT_RETRIES, \
+    DEFAULT_RETRY_BACKOFF, DEFAULT_RETRY_MAX_DELAY
+
+# Number of seconds that a shared reader keeps a table before fetching it again,
+# for changes made by others (changes made with DataTableWriter are applied to it)
+DEFAULT_TABLE_TTL = 60
+
+# Maximum number of shared readers to keep. The least recently used is dropped for a new one,
+# and a reader that hasn't been used for its TTL is dropped when another is got.
+MAX_TABLE_READERS = 128
+
+# Data table readers, shared by all threads in the process: (reader, last used) by table, least recently used first
+_readers = OrderedDict()
+_readers_lock = threading.Lock()
+
+# ttl of get_data_table_reader for a reader that's already shared, to keep its ttl
+_KEEP_TTL = object()
+
+
+def get_data_table_reader(res_client, incident_id, table_name, ttl=DEFAULT_TABLE_TTL):
+    """
+    Get the shared reader of an incident's data table, creating it if needed. It's kept between
+    function invocations, so each lookup only fetches the table when it's first read or has expired.
+    Up to MAX_TABLE_READERS readers are kept, and each is dropped when it isn't used for its ttl.
+
+    :param res_client: required for communication back to resilient
+    :param incident_id: incident with the data table
+    :param table_name: api name (or id) of the data table
+    :param ttl: number of seconds to keep the table before fetching it again.
+        If the reader is already shared, its ttl is changed to this one.
+    :return: DataTableReader
+    """
+    return _shared_reader(res_client, incident_id, table_name, ttl=ttl)
+
+
+def _shared_reader(res_client, incident_id, table_name, ttl=_KEEP_TTL, create=True):
+    """ the shared reader of the table (or None, if it has none and create is False) """
+    key = (getattr(res_client, "base_url", None), getattr(res_client, "org_id", None), incident_id, table_name)
+    now = time.time()
+    with _readers_lock:
+        _drop_idle_readers(now)
+        entry = _readers.pop(key, None)
+        if entry is None:
+            if not create:
+                return None
+            reader = DataTableReader(res_client, incident_id, table_name,
+                                     ttl=DEFAULT_TABLE_TTL if ttl is _KEEP_TTL else ttl)
+        else:
+            reader = entry[0]
+            # a new client for the same server and org
+            reader.res_client = res_client
+            if ttl is not _KEEP_TTL:
+                reader.ttl = ttl
+        # (re-)added as the most recently used
+        _readers[key] = (reader, now)
+        while len(_readers) > MAX_TABLE_READERS:
+            _readers.popitem(last=False)
+        return reader
+
+
+def _drop_idle_readers(now):
+    """ drop the readers that haven't been used for their ttl (their tables would be fetched again anyway) """
+    for key, (reader, used) in list(_readers.items()):
+        if reader.ttl is not None and now - used >= reader.ttl:
+            del _readers[key]
+
+
+def row_values(row):
+    """ the values of a data table row, by column name """
+    return dict((name, cell.get("value")) for name, cell in (row.get("cells") or {}).items())
+
+
+class DataTableReader(object):
+    """
+    Reads an incident's data table once, and indexes its rows by the values of columns, so each lookup
+    is a dictionary lookup rather than a fetch of the table and a scan of its rows.
+
+        reader = get_data_table_reader(res_client, incident_id, "dt_lookup_results")
+        if not reader.contains("ip", "192.168.1.1"):
+            DataTableWriter(res_client, incident_id, "dt_lookup_results").insert_rows([{"ip": "192.168.1.1"}])
+
+    The table is fetched again after the TTL, or after invalidate(). Rows written with DataTableWriter are
+    applied to the shared reader (a row is only replaced by the same or a later version of it).
+    """
+    def __init__(self, res_client, incident_id, table_name, index_columns=None, ttl=DEFAULT_TABLE_TTL):
+        """
+        :param res_client: required for communication back to resilient
+        :param incident_id: incident with the data table
+        :param table_name: api name (or id) of the data table
+        :param index_columns: columns to index when the table is read (others are indexed when first looked up)
+        :param ttl: number of seconds to keep the table before fetching it again, or None to keep it
+        """
+        self.res_client = res_client
+        self.incident_id = incident_id
+        self.table_name = table_name
+        self.ttl = ttl
+        self.fetches = 0
+        self.uri = "/incidents/{}/table_data/{}".format(incident_id, table_name)
+        self._index_columns = set(index_columns or [])
+        self._rows = None
+        self._indexes = {}
+        self._fetched = 0
+        self._lock = threading.RLock()
+
+    def get_rows(self):
+        """ all the rows of the table (row DTOs, with the cells by column name) """
+        with self._lock:
+            rows = self._get_rows()
+            return [rows[row_id] for row_id in sorted(rows)]
+
+    def lookup(self, column, value):
+        """
+        :param column: column name
+        :param value: value to find (a list, for a multi-select)
+        :return: list of the rows with the value in the column
+        """
+        with self._lock:
+            self._get_rows()
+            index = self._indexes.get(column)
+            if index is None:
+                index = self._build_index(column)
+            return list(index.get(_index_value(value), ()))
+
+    def contains(self, column, value):
+        """ True if a row has the value in the column """
+        return bool(self.lookup(column, value))
+
+    def refresh(self):
+        """ fetch the table now """
+        rows = self.res_client.get(self.uri + "?handle_format=names").get("rows") or []
+        with self._lock:
+            self.fetches += 1
+            self._fetched = time.time()
+            self._rows = dict((row["id"], row) for row in rows)
+            columns = set(self._indexes) | self._index_columns
+            self._indexes = {}
+            for column in columns:
+                self._build_index(column)
+
+    def invalidate(self):
+        """ fetch the table again when it's next read """
+        with self._lock:
+            self._rows = None
+
+    def apply_row(self, row):
+        """ add or replace a row, such as one returned from a write (unless the table has a later version of it) """
+        with self._lock:
+            if self._rows is None:
+                return
+            current = self._rows.get(row["id"])
+            if current is not None:
+                if current.get("version", 0) > row.get("version", 0):
+                    return
+                self._unindex(current)
+            self._rows[row["id"]] = row
+            for column, index in self._indexes.items():
+                index.setdefault(_index_value(row_values(row).get(column)), []).append(row)
+
+    def remove_row(self, row_id):
+        """ remove a row, such as one that was deleted """
+        with self._lock:
+            if self._rows is None:
+                return
+            current = self._rows.pop(row_id, None)
+            if current is not None:
+                self._unindex(current)
+
+    def _get_rows(self):
+        if self._rows is None or (self.ttl is not None and time.time() - self._fetched >= self.ttl):
+            self.refresh()
+        return self._rows
+
+    def _build_index(self, column):
+        index = {}
+        for row_id in sorted(self._rows):
+            row = self._rows[row_id]
+            index.setdefault(_index_value(row_values(row).get(column)), []).append(row)
+        self._indexes[column] = index
+        return index
+
+    def _unindex(self, row):
+        values = row_values(row)
+        for column, index in self._indexes.items():
+            rows = index.get(_index_value(values.get(column)))
+            if rows is not None:
+                rows[:] = [other for other in rows if other["id"] != row["id"]]
+
+
+def _row_payload(values, row_id=None):
+    payload = {"cells": dict((name, {"value": value}) for name, value in values.items())}
+    if row_id is not None:
+        payload["id"] = row_id
+    return payload
+
+
+class DataTableWriter(RestBatch):
+    """
+    Adds, updates and deletes the rows of an incident's data table, up to max_concurrency calls at a time.
+    The REST API changes one row per call, so writing many rows one after the other is slow. Calls that
+    fail with a connection error or a transient status (such as 409, 429 or 503) are made again,
+    with exponential backoff. An insert is only made again if the server didn't act on it
+    (it failed to connect, or the response was 429 or 503), so it doesn't add the row twice.
+
+        writer = DataTableWriter(res_client, incident_id, "dt_lookup_results")
+        writer.insert_rows([{"ip": "192.168.1.1", "score": 10}, {"ip": "192.168.1.2", "score": 60}])
+        writer.upsert_rows([{"ip": "192.168.1.1", "score": 20}], key="ip")
+
+    The results are in the same order as the rows. If a row can't be written, its result is the exception.
+    """
+    def __init__(self, res_client, incident_id, table_name, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 retries=DEFAULT_RETRIES, retry_backoff=DEFAULT_RETRY_BACKOFF, retry_max_delay=DEFAULT_RETRY_MAX_DELAY):
+        """
+        :param res_client: required for communication back to resilient
+        :param incident_id: incident with the data table
+        :param table_name: api name (or id) of the data table
+        :param max_concurrency: maximum number of calls in progress at once
+        :param retries: number of times to make a call again after a transient failure
+        :param retry_backoff: seconds to wait before the first retry, doubling for each retry after
+        :param retry_max_delay: maximum seconds to wait before a retry
+        """
+        super(DataTableWriter, self).__init__(res_client, max_concurrency=max_concurrency, retries=retries,
+                                              retry_backoff=retry_backoff, retry_max_delay=retry_max_delay)
+        self.incident_id = incident_id
+        self.table_name = table_name
+        self.uri = "/incidents/{}/table_data/{}".format(incident_id, table_name)
+
+    @property
+    def reader(self):
+        """ the shared reader of the table, which written rows are applied to """
+        return _shared_reader(self.res_client, self.incident_id, self.table_name)
+
+    def get_rows(self):
+        """ all the rows of the table (row DTOs, with the cells by column name) """
+        return self.call("get", self.uri + "?handle_format=names").get("rows") or []
+
+    def insert_rows(self, rows):
+        """
+        Add rows to the table
+
+        :param rows: list of dictionaries of values by column name
+        :return: list of the added row DTOs (or the exceptions)
+        """
+        results = self.call_many([("post", self.uri + "/row_data?handle_format=names", _row_payload(values))
+                                  for values in rows])
+        self._apply(results)
+        return results
+
+    def update_rows(self, updates):
+        """
+        Change the values of rows in the table. Columns that aren't given keep their values.
+
+        :param updates: list of (row id, dictionary of values by column name)
+        :return: list of the updated row DTOs (or the exceptions)
+        """
+        results = self.call_many([("put", "{}/row_data/{}?handle_format=names".format(self.uri, row_id),
+                                   _row_payload(values, row_id)) for row_id, values in updates])
+        self._apply(results)
+        return results
+
+    def delete_rows(self, row_ids):
+        """
+        Remove rows from the table
+
+        :param row_ids: list of row ids
+        :return: list of the results (or the exceptions)
+        """
+        row_ids = list(row_ids)
+        results = self.call_many([("delete", "{}/row_data/{}".format(self.uri, row_id), None) for row_id in row_ids])
+        reader = _shared_reader(self.res_client, self.incident_id, self.table_name, create=False)
+        for row_id, result in zip(row_ids, results):
+            if reader is not None and not isinstance(result, Exception):
+                reader.remove_row(row_id)
+        return results
+
+    def upsert_rows(self, rows, key, refresh=True):
+        """
+        Update the rows that have the same value in the key column as a row in the table,
+        and add the others. Rows that have the same values as in the table aren't written.
+
+        :param rows: list of dictionaries of values by column name. Each needs a value for the key column.
+        :param key: name of the column that identifies a row
+        :param refresh: False to use the shared reader's copy of the table (if it has one), rather than fetching it
+        :return: dictionary of "inserted" and "updated" (the results of insert_rows and update_rows)
+            and "unchanged" (the row DTOs that already had the values)
+        """
+        reader = self.reader
+        if refresh:
+            reader.refresh()
+
+        # the last of the rows with the same key wins
+        by_key = {}
+        for values in rows:
+            if key not in values:
+                raise ValueError(u"row has no value for the key column {}: {}".format(key, values))
+            by_key[_index_value(values[key])] = values
+
+        inserts, updates, unchanged = [], [], []
+        for values in by_key.values():
+            existing = reader.lookup(key, values[key])
+            if not existing:
+                inserts.append(values)
+                continue
+            row = existing[0]
+            current = row_values(row)
+            if all(current.get(name) == value for name, value in values.items()):
+                unchanged.append(row)
+            else:
+                updates.append((row["id"], values))
+
+        return {"inserted": self.insert_rows(inserts),
+                "updated": self.update_rows(updates),
+                "unchanged": unchanged}
+
+    def _apply(self, results):
+        """ apply the written rows to the shared reader, if the table has one """
+        reader = _shared_reader(self.res_client, self.incident_id, self.table_name, create=False)
+        if reader is None:
+            return
+        for result in results:
+            if isinstance(result, dict) and "id" in result:
+                reader.apply_row(result)
+
+
+def _index_value(value):
+    """ a value that can be a dictionary key (such as a tuple for the list of a multi-select) """
+    if isinstance(value, list):
+        return tuple(_index_value(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((name, _index_value(item)) for name, item in value.items()))
+    return value
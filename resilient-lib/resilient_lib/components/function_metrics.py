@@ -2,42 +2,281 @@
 # (c) Copyright IBM Corp. 2018. All Rights Reserved.
 # pragma pylint: disable=unused-argument, no-self-use
 
+from collections import deque
 from datetime import datetime
+import json
+import os
 import platform
+import sys
+import tempfile
+import threading
+import time
 import pkg_resources  # part of setuptools
 
-METRICS_VERSION = "1.0"
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+METRICS_VERSION = "1.2"
+
+# Number of recent executions of each function kept for the percentiles
+METRICS_SAMPLES = 1000
+
+# If set, the summary of all functions is written to this file (at most every METRICS_FILE_INTERVAL seconds)
+# for the command line: python -m resilient_lib.util.metrics_summary [file]
+METRICS_FILE = os.environ.get("APP_METRICS_FILE")
+METRICS_FILE_INTERVAL = 10
+
+_host = None
+_packages = {}
+_summaries = {}
+_lock = threading.Lock()
+_last_saved = 0
+
+# Outbound calls counted for each thread (and for the pool threads that make calls for it)
+_calls = threading.local()
+
+
+class _CallCounter(object):
+    """ outbound calls and their bytes, added to by any thread making calls for the counter's thread """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def add(self, bytes_sent, bytes_received):
+        with self.lock:
+            self.count += 1
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+
+    def totals(self):
+        with self.lock:
+            return self.count, self.bytes_sent, self.bytes_received
+
+
+def _thread_counter():
+    counter = getattr(_calls, "counter", None)
+    if counter is None:
+        counter = _calls.counter = _CallCounter()
+    return counter
+
+
+def record_call(bytes_sent=0, bytes_received=0):
+    """ count an outbound http call (such as from RequestsCommon), for the function running in this thread """
+    _thread_counter().add(bytes_sent, bytes_received)
+
+
+def count_calls_for_caller(func):
+    """
+    Wrap a callable that runs in another thread (such as a pool's), so the calls that it makes
+    are counted for the function in the thread that wrapped it
+
+    :param func: callable
+    :return: callable, with the same arguments
+    """
+    counter = _thread_counter()
+
+    def counted(*args, **kwargs):
+        previous = getattr(_calls, "counter", None)
+        _calls.counter = counter
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _calls.counter = previous
+    return counted
+
+
+def _thread_calls():
+    return _thread_counter().totals()
+
+
+def _thread_cpu_time():
+    """ CPU seconds used by this thread (or by the process, where that isn't available) """
+    if hasattr(time, "thread_time"):
+        return time.thread_time()
+    if resource is not None and hasattr(resource, "RUSAGE_THREAD"):
+        usage = resource.getrusage(resource.RUSAGE_THREAD)
+        return usage.ru_utime + usage.ru_stime
+    if hasattr(time, "process_time"):
+        return time.process_time()
+    return time.clock()
+
+
+def _peak_memory_kb():
+    """ peak resident memory of the process, in KB (or None, where that isn't available) """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KB elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _get_host():
+    global _host
+    if _host is None:
+        _host = platform.node()
+    return _host
+
+
+def _get_package(func):
+    """ get information about the package, once """
+    pkg = _packages.get(func)
+    if pkg is None:
+        try:
+            dist = pkg_resources.get_distribution(func)
+            pkg = (dist.project_name, dist.version)
+        except pkg_resources.DistributionNotFound:
+            pkg = (MissingPkg.project_name, MissingPkg.version)
+        _packages[func] = pkg
+    return pkg
+
+
+def _percentile(values, percent):
+    """ nearest-rank percentile of sorted values """
+    if not values:
+        return None
+    rank = max(1, int(round(percent / 100.0 * len(values))))
+    return values[min(rank, len(values)) - 1]
+
+
+class FunctionSummary(object):
+    """ metrics of a function, aggregated across its executions """
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.failures = 0
+        self.execution_times = deque(maxlen=METRICS_SAMPLES)
+        self.cpu_time_ms = 0
+        self.http_calls = 0
+        self.outbound_bytes = 0
+        self.inbound_bytes = 0
+
+    def add(self, metrics, success=None):
+        self.count += 1
+        if success is False:
+            self.failures += 1
+        self.execution_times.append(metrics["execution_time_ms"])
+        self.cpu_time_ms += metrics["cpu_time_ms"]
+        self.http_calls += metrics["http_calls"]
+        self.outbound_bytes += metrics["outbound_bytes"]
+        self.inbound_bytes += metrics["inbound_bytes"]
+
+    def to_dict(self):
+        times = sorted(self.execution_times)
+        return {
+            "count": self.count,
+            "failures": self.failures,
+            "execution_time_ms": {
+                "p50": _percentile(times, 50),
+                "p95": _percentile(times, 95),
+                "p99": _percentile(times, 99),
+                "max": times[-1] if times else None
+            },
+            "cpu_time_ms": self.cpu_time_ms,
+            "http_calls": self.http_calls,
+            "outbound_bytes": self.outbound_bytes,
+            "inbound_bytes": self.inbound_bytes
+        }
+
+
+def get_metrics_summary(func=None):
+    """
+    Get the metrics aggregated across executions, such as the count and the p50/p95/p99 execution times
+
+    :param func: function (or package) name, or None for all
+    :return: dictionary of metrics for the function, or a dictionary of them by name
+    """
+    with _lock:
+        if func is not None:
+            summary = _summaries.get(func)
+            return summary.to_dict() if summary else None
+        return dict((name, summary.to_dict()) for name, summary in _summaries.items())
+
+
+def reset_metrics_summary():
+    with _lock:
+        _summaries.clear()
+
+
+def save_metrics_summary(path):
+    """ write the summary of all functions to a json file """
+    summary = get_metrics_summary()
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(handle, "w") as outfile:
+        json.dump(summary, outfile, indent=2, sort_keys=True)
+    if hasattr(os, "replace"):
+        os.replace(temp_path, path)
+    else:
+        os.rename(temp_path, path)
+
+
+def _save_metrics_file():
+    global _last_saved
+    if not METRICS_FILE:
+        return
+    now = time.time()
+    with _lock:
+        if now - _last_saved < METRICS_FILE_INTERVAL:
+            return
+        _last_saved = now
+    try:
+        save_metrics_summary(METRICS_FILE)
+    except (IOError, OSError):
+        pass
+
 
 class FunctionMetrics:
     """
     Use this function to track metrics on the function's operation. It tracks information on the package,
-    it's environment and the execution time
+    it's environment and the execution time, the CPU time, the growth of peak memory, and the outbound http calls
+    made with RequestsCommon (including those it makes in other threads, with execute_many and execute_call_async). Each finished function is also added to a summary of the function's executions
+    (see get_metrics_summary).
     """
 
-    def finish(self):
+    def finish(self, success=None):
         """ build out the final metrics data structure """
         self.end_time = datetime.now()
 
         ttl_time = self.end_time - self.start_time
+        project_name, version = _get_package(self.func)
 
-        try:
-            # get information about the package we're running
-            pkg = pkg_resources.get_distribution(self.func)
-        except pkg_resources.DistributionNotFound:
-            pkg = MissingPkg()
+        calls, bytes_sent, bytes_received = _thread_calls()
+        peak_memory = _peak_memory_kb()
 
-        return {
+        metrics = {
             "version": METRICS_VERSION,
-            "package": pkg.project_name,
-            "package_version": pkg.version,
-            "host": platform.node(),
+            "package": project_name,
+            "package_version": version,
+            "host": _get_host(),
             "execution_time_ms": int(ttl_time.total_seconds() * 1000),
+            "cpu_time_ms": int((_thread_cpu_time() - self.start_cpu_time) * 1000),
+            "peak_memory_delta_kb": peak_memory - self.start_peak_memory if peak_memory is not None else None,
+            "http_calls": calls - self.start_calls[0],
+            "outbound_bytes": bytes_sent - self.start_calls[1],
+            "inbound_bytes": bytes_received - self.start_calls[2],
             "timestamp": self.end_time.strftime("%Y-%m-%d %H:%M:%S")
         }
 
+        with _lock:
+            summary = _summaries.get(self.func)
+            if summary is None:
+                summary = _summaries[self.func] = FunctionSummary(self.func)
+            summary.add(metrics, success)
+        _save_metrics_file()
+
+        return metrics
+
     def __init__(self, func):
         self.start_time = datetime.now()
         self.func = func
+        self.start_cpu_time = _thread_cpu_time()
+        self.start_peak_memory = _peak_memory_kb()
+        self.start_calls = _thread_calls()
 
 
 class MissingPkg:
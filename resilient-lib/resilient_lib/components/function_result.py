@@ -3,10 +3,16 @@
 # pragma pylint: disable=unused-argument, no-self-use
 
 import json
+import logging
 from .function_metrics import FunctionMetrics
 
 PAYLOAD_VERSION = "1.0"
 
+# Largest "raw" string to include in the payload, unless done() is given one (None for no limit)
+RAW_MAX_SIZE = None
+
+LOG = logging.getLogger(__name__)
+
 class ResultPayload:
     """ Class to create a standard payload for functions. The resulting payload follows the following format:
         1.0
@@ -15,7 +21,7 @@ class ResultPayload:
           "reason": str          -- a string to explain if success=False
           "content": json        -- the result of the function call
           "raw": str             -- a string representation of content. This is sometimes needed when the result of one function is
-                                    piped into the next
+                                    piped into the next. If done() is given a raw_max_size, it's only included up to that size (otherwise None)
           "inputs": json         -- a copy of the input parameters, useful for post-processor script use
           "metrics": json        -- a set of information to capture specifics metrics about the function's runtime environment
         }
@@ -37,22 +43,37 @@ class ResultPayload:
             "metrics": None
         }
 
-    def done(self, success, content, reason=None):
+    def done(self, success, content, reason=None, raw_max_size=RAW_MAX_SIZE):
         """
          complete the function payload
         :param success: True|False
         :param content: json result to pass back
         :param reason: comment fields when success=False
+        :param raw_max_size: largest "raw" string to include, 0 to never include it, or None for no limit (the default).
+            A function can set it from its app.config section, such as raw_max_size=65536, for large results
+            that aren't piped into the next function.
         :return: completed payload in json
         """
         self.payload['success'] = success
         self.payload['reason'] = reason
         self.payload['content'] = content
-        self.payload['metrics'] = self.fm.finish()
+        self.payload['metrics'] = self.fm.finish(success)
 
         try:
-            self.payload['raw'] = json.dumps(content)
+            self.payload['raw'] = self._raw(content, raw_max_size)
         except:
             pass
 
         return self.payload
+
+    @staticmethod
+    def _raw(content, raw_max_size):
+        """ json string of the content, or None if it's longer than raw_max_size """
+        if raw_max_size is not None and not raw_max_size:
+            return None
+        raw = json.dumps(content)
+        if raw_max_size is not None and len(raw) > raw_max_size:
+            LOG.info(u"raw result of %s characters is more than raw_max_size (%s), so it isn't included",
+                     len(raw), raw_max_size)
+            return None
+        return raw
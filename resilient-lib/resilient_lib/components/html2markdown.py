@@ -2,8 +2,10 @@
 # (c) Copyright IBM Corp. 2018. All Rights Reserved.
 # pragma pylint: disable=unused-argument, no-self-use
 
+import copy
 import re
 import logging
+from collections import deque
 from six import string_types
 
 try:
@@ -12,6 +14,15 @@ except:
     from html.parser import HTMLParser
 
 class MarkdownParser(HTMLParser):
+    """
+    Convert html (such as Quill rich text) to markdown. An instance can be reused, and shared by threads:
+    each conversion is made with its own copy of the parser.
+
+        parser = MarkdownParser()
+        markdown = parser.convert(html)
+        markdowns = parser.convert_many([html1, html2])
+        markdown = "".join(parser.convert_stream(chunks_of_html))
+    """
     QUILL_RTE = "rte"       # first <div> will have this class. This is part of quill
 
     HTML_STYLE_COLOR = r'rgb\(([\d]+),[\s]*([\d]+),[\s]*([\d]+)\)'
@@ -40,14 +51,17 @@ class MarkdownParser(HTMLParser):
         self.headers = headers
         self.blockquote = blockquote
 
+        self.last_markdown = None  # result of the last conversion, for str()
+
     def init_buffers(self):
+        self.list_bullets = list(self.list_bullets)  # changed while parsing nested lists
         self.buffer = []      # end markdown buffer
         self.curr_tag = []    # stack of tags to track
         self.curr_attrs = []  # stack of tag attributes to track
         self.curr_list = []   # stack of embedded ordered and unordered list symbols
         self.data = []        # buffer for a given tag, cleared when and ending tag is found (ex. </p>)
         self.data_pre = []    # markdown data to prefix the data
-        self.data_post = []   # markdown data to follow the data
+        self.data_post = deque()  # markdown data to follow the data
         self.prev_tag = None
         self.prev_attrs = []
 
@@ -57,14 +71,59 @@ class MarkdownParser(HTMLParser):
         :param data: html string
         :return: converted text to markdown
         """
-
-        self.init_buffers()
-
         if not data or not isinstance(data, string_types):
             return data
 
-        self.feed(data)
-        return self.toString()
+        converter = self._new_converter()
+        converter.feed(data)
+        self.last_markdown = converter.toString()
+        return self.last_markdown
+
+    def convert_many(self, items):
+        """
+        convert a list of html strings
+        :param items: iterable of html strings
+        :return: list of converted text to markdown
+        """
+        return [self.convert(data) for data in items]
+
+    def convert_stream(self, chunks):
+        """
+        convert html that arrives in chunks, producing the markdown as it's converted.
+        Joined together, the results are the same as convert() of the whole html.
+        :param chunks: iterable of html strings
+        :return: generator of markdown strings
+        """
+        converter = self._new_converter()
+        pending = ""
+        for chunk in chunks:
+            converter.feed(chunk)
+            markdown, pending = converter._drain(pending)
+            if markdown:
+                yield markdown
+
+        converter.push_data()
+        markdown, pending = converter._drain(pending)
+        if markdown:
+            yield markdown
+
+    def _new_converter(self):
+        """ a copy of this parser, with its own state, for one conversion """
+        converter = copy.copy(self)
+        converter.reset()
+        converter.init_buffers()
+        return converter
+
+    def _drain(self, pending):
+        """
+        take the markdown produced so far, holding back trailing newlines (which are removed at the end)
+        :param pending: newlines held back from before
+        :return: (markdown, newlines held back)
+        """
+        markdown = pending + ''.join(self.buffer)
+        self.buffer = []
+        text = markdown.rstrip('\n')
+        return text, markdown[len(text):]
 
     def handle_starttag(self, tag, attrs):
         """
@@ -90,19 +149,19 @@ class MarkdownParser(HTMLParser):
 
         if tag == "strong":
             self.data_pre.append(self.bold)
-            self.data_post.insert(0, self.bold)
+            self.data_post.appendleft(self.bold)
 
         elif tag == "em":
             self.data_pre.append(self.italic)
-            self.data_post.insert(0, self.italic)
+            self.data_post.appendleft(self.italic)
 
         elif tag == "s":
             self.data_pre.append(self.strikeout)
-            self.data_post.insert(0, self.strikeout)
+            self.data_post.appendleft(self.strikeout)
 
         elif tag == "u":
             self.data_pre.append(self.underscore)
-            self.data_post.insert(0, self.underscore)
+            self.data_post.appendleft(self.underscore)
 
         elif tag == "ol":
             self.curr_list.append(self.list_number)  # number to be incremented with every <li>
@@ -130,7 +189,7 @@ class MarkdownParser(HTMLParser):
         elif tag == "a":
             href = self.get_attr(attrs, 'href')
             self.data_pre.extend(["[{}]".format(href), '('])
-            self.data_post.insert(0, ")")
+            self.data_post.appendleft(")")
 
         elif tag in ('h', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
             if tag == 'h':
@@ -144,11 +203,11 @@ class MarkdownParser(HTMLParser):
 
         elif tag == "blockquote":
             self.data_pre.append(self.blockquote)
-            self.data_post.insert(0, self.blockquote)
+            self.data_post.appendleft(self.blockquote)
 
         elif tag not in MarkdownParser.SUPPORTED_TAGS:
             self.log.warning("Unknown html tag: {}".format(tag))
-            self.data_post.insert(0, MarkdownParser.MARKDOWN_NEWLINE)
+            self.data_post.appendleft(MarkdownParser.MARKDOWN_NEWLINE)
 
         # determine if styling is needed
         style = self.get_attr(attrs, 'style')
@@ -157,17 +216,17 @@ class MarkdownParser(HTMLParser):
             if rgb:
                 rgb_hex = self.convert_rgb(self.get_rgb(rgb))
                 self.data_pre.append("{{color:{0}}}".format(rgb_hex))
-                self.data_post.insert(0, "{color}")
+                self.data_post.appendleft("{color}")
 
             # format monospace data blocks
             font_family = self.get_style_attr(style, 'font-family')
             if font_family and font_family == "monospace":
                 if isinstance(self.monospace, list):
                     self.data_pre.append(self.monospace[0])
-                    self.data_post.insert(0, self.monospace[1])
+                    self.data_post.appendleft(self.monospace[1])
                 else:
                     self.data_pre.append(self.monospace)
-                    self.data_post.insert(0, self.monospace)
+                    self.data_post.appendleft(self.monospace)
 
 
     def handle_data(self, data):
@@ -177,8 +236,7 @@ class MarkdownParser(HTMLParser):
         :return: None
         """
         # clean data of prefix whitespace
-        cleaned = re.search(r"^[\n\t\r]*(.*)", data, re.S)
-        cleaned and self.data.append(cleaned.group(1))
+        self.data.append(data.lstrip("\n\t\r"))
 
 
     def handle_endtag(self, tag):
@@ -229,7 +287,7 @@ class MarkdownParser(HTMLParser):
             # clean up
             self.data = []
             self.data_pre = []
-            self.data_post = []
+            self.data_post = deque()
 
 
     def convert_rgb(self, rgb):
@@ -282,10 +340,10 @@ class MarkdownParser(HTMLParser):
 
 
     def __str__(self):
-        return self.toString()
+        return self.last_markdown or ""
 
     def __repr__(self):
-        return self.toString()
+        return self.last_markdown or ""
 
     def toString(self):
         """
@@ -296,7 +354,4 @@ class MarkdownParser(HTMLParser):
 
         result = ''.join(self.buffer)
         # clean up ending new line characters
-        while result[-1:] == '\n':
-            result = result[:-1]
-
-        return result
+        return result.rstrip('\n')
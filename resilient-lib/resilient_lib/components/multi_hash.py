@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+# pragma pylint: disable=unused-argument, no-self-use
+
+import hashlib
+
+try:
+    import ssdeep
+except ImportError:
+    # optional, for "ssdeep" fuzzy hashes
+    ssdeep = None
+
+DEFAULT_HASHES = ("md5", "sha1", "sha256")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_stream(stream, hashes=DEFAULT_HASHES, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Compute several digests of a stream in one pass, reading it a chunk at a time
+
+    :param stream: file-like object opened for reading bytes (such as a ResponseStream), or an iterator of bytes chunks
+    :param hashes: list of hashlib algorithm names, or "ssdeep" (if it's installed)
+    :param chunk_size: number of bytes to read at a time
+    :return: dictionary of hex digests by algorithm name
+    """
+    multi_hash = MultiHash(hashes)
+    if hasattr(stream, "read"):
+        chunks = iter(lambda: stream.read(chunk_size), b"")
+    else:
+        chunks = stream
+    for chunk in chunks:
+        multi_hash.update(chunk)
+    return multi_hash.hexdigests()
+
+
+def hash_file(path, hashes=DEFAULT_HASHES, chunk_size=HASH_CHUNK_SIZE):
+    """ Compute several digests of a file in one pass: dictionary of hex digests by algorithm name """
+    with open(path, "rb") as infile:
+        return hash_stream(infile, hashes=hashes, chunk_size=chunk_size)
+
+
+def hash_data(data, hashes=DEFAULT_HASHES):
+    """ Compute several digests of bytes or an mmap (without copying it): dictionary of hex digests by algorithm name """
+    return MultiHash(hashes).update(data).hexdigests()
+
+
+class MultiHash(object):
+    """
+    Several digests of the same data, updated together, so the data is only read once.
+    It's updated with each chunk of a ResponseStream (see execute_call's hashes), or it can be updated directly:
+
+        multi_hash = MultiHash(["md5", "sha256", "ssdeep"])
+        for chunk in chunks:
+            multi_hash.update(chunk)
+        multi_hash.hexdigests()  # {"md5": "...", "sha256": "...", "ssdeep": "..."}
+    """
+    def __init__(self, hashes=DEFAULT_HASHES):
+        """
+        :param hashes: list of hashlib algorithm names, or "ssdeep" (if it's installed)
+        """
+        self.size = 0
+        self._digests = dict((name, _new_hash(name)) for name in (hashes or []))
+
+    def update(self, data):
+        """ add the next bytes: bytes, bytearray, memoryview or mmap """
+        for digest in self._digests.values():
+            digest.update(data)
+        self.size += len(data)
+        return self
+
+    def hexdigests(self):
+        """ hex digests of the data so far """
+        return dict((name, digest.hexdigest()) for name, digest in self._digests.items())
+
+
+def _new_hash(name):
+    if name == "ssdeep":
+        if ssdeep is None:
+            raise ValueError("ssdeep hashes require the ssdeep package")
+        return _SsdeepHash()
+    return hashlib.new(name)
+
+
+class _SsdeepHash(object):
+    """ ssdeep fuzzy hash, with the same methods as a hashlib hash """
+    def __init__(self):
+        self._hash = ssdeep.Hash()
+
+    def update(self, data):
+        self._hash.update(data if isinstance(data, bytes) else bytes(data))
+
+    def hexdigest(self):
+        return self._hash.digest()
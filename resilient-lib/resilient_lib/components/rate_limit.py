@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+# pragma pylint: disable=unused-argument, no-self-use
+
+import re
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+RATE_PERIODS = {"s": 1, "sec": 1, "second": 1,
+                "m": 60, "min": 60, "minute": 60,
+                "h": 3600, "hr": 3600, "hour": 3600,
+                "d": 86400, "day": 86400}
+
+# Rate limiters, shared by all threads in the process
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def parse_rate(value):
+    """
+    Parse a rate limit from app.config, such as "10/s", "500/min" or "4/m". A number alone is per second.
+
+    :param value: string
+    :return: (count, period) - the number of calls allowed in each period of seconds
+    """
+    match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*(?:/\s*(\d*)\s*([a-z]+))?\s*$", str(value).lower())
+    if not match or (match.group(3) and match.group(3) not in RATE_PERIODS):
+        raise ValueError(u"rate limit must be a number of calls per s, m, h or d, such as 10/s: {}".format(value))
+    count = float(match.group(1))
+    period = RATE_PERIODS[match.group(3) or "s"] * int(match.group(2) or 1)
+    if count <= 0 or period <= 0:
+        raise ValueError(u"rate limit must allow more than 0 calls in more than 0 seconds: {}".format(value))
+    return count, period
+
+
+def get_rate_limiter(key, rate_limit):
+    """
+    Get the shared token bucket for this key (such as a host name) and rate limit, creating it if needed
+
+    :param key: what the limit applies to
+    :param rate_limit: string, such as "10/s"
+    :return: TokenBucket
+    """
+    with _limiters_lock:
+        limiter = _limiters.get((key, rate_limit))
+        if limiter is None:
+            count, period = parse_rate(rate_limit)
+            limiter = TokenBucket(count / period, capacity=count)
+            _limiters[(key, rate_limit)] = limiter
+        return limiter
+
+
+def retry_after(resp, default):
+    """ number of seconds to wait, from the Retry-After header of the response (or the default) """
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        parsed = parsedate_tz(value)
+        if parsed is None:
+            return default
+        return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. Each call takes a token, and tokens are added at a fixed rate
+    up to the capacity, so calls can burst up to the capacity and then continue at the rate.
+    """
+    def __init__(self, rate, capacity=1):
+        """
+        :param rate: tokens added per second
+        :param capacity: maximum number of tokens
+        """
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self.tokens = self.capacity
+        self.updated = time.time()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, waiting until one is available
+
+        :return: number of seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+            waited += wait
+
+    def pause(self, seconds):
+        """ make every caller wait for this many seconds, such as when the server returns 429 """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.time() + seconds)
+            self.tokens = 0
@@ -2,8 +2,81 @@
 # (c) Copyright IBM Corp. 2018. All Rights Reserved.
 # pragma pylint: disable=unused-argument, no-self-use
 
+import functools
+import logging
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 import requests
+from requests.packages.urllib3.util.retry import Retry
+from six import text_type
+from six.moves.http_cookiejar import DefaultCookiePolicy
+from six.moves.urllib.parse import urlparse
+from resilient.co3base import TLSHttpAdapter, keepalive_socket_options
+from resilient_lib.components.function_metrics import count_calls_for_caller, record_call
 from resilient_lib.components.integration_errors import IntegrationError
+from resilient_lib.components.rate_limit import get_rate_limiter, retry_after
+from resilient_lib.components.response_cache import DEFAULT_CACHE_SIZE, get_response_cache, parse_ttl_patterns
+from resilient_lib.components.response_stream import DEFAULT_CHUNK_SIZE, ResponseStream
+
+try:
+    import asyncio
+except ImportError:
+    # Python 2
+    asyncio = None
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_CONCURRENCY = 10
+DEFAULT_RETRY_BACKOFF = 1
+DEFAULT_RETRY_MAX_DELAY = 60
+
+# Responses that mean "try again later"
+RETRY_STATUS_CODES = (429, 503)
+
+# Methods that can be sent again after a 503, which the server may have acted on
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE")
+
+LOG = logging.getLogger(__name__)
+
+# Pooled sessions, one per host (and pool settings), shared by all RequestsCommon instances
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url, pool_size=DEFAULT_POOL_SIZE, keepalive=None, retries=0):
+    """
+    Get the pooled requests Session for the host of this url, creating it if needed.
+    Connections to the host are kept open and reused by all threads that make calls to it.
+
+    :param url: url of the call (only the scheme and host are used)
+    :param pool_size: number of connections to keep open to the host
+    :param keepalive: enable TCP keep-alive, probing idle connections after this many seconds
+    :param retries: number of times to retry after a connection error, or a 502/503/504 response
+        to an idempotent request, with exponential backoff
+    :return: requests.Session
+    """
+    parsed = urlparse(url)
+    key = (parsed.scheme.lower(), parsed.netloc.lower(), pool_size, keepalive, retries)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            # The session is shared, so don't keep cookies from one call to send on the next
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+            adapter_args = {"pool_maxsize": pool_size}
+            if retries:
+                adapter_args["max_retries"] = Retry(total=retries,
+                                                    backoff_factor=0.5,
+                                                    status_forcelist=(502, 503, 504),
+                                                    raise_on_status=False)
+            if keepalive:
+                adapter_args["socket_options"] = keepalive_socket_options(keepalive)
+            adapter = TLSHttpAdapter(**adapter_args)
+            session.mount(u'https://', adapter)
+            session.mount(u'http://', adapter)
+            _sessions[key] = session
+        return session
 
 
 class RequestsCommon:
@@ -17,14 +90,151 @@ class RequestsCommon:
     https_proxy=
 
     Similar properties may exist in the function's section which would override the [integrations] properties.
+
+    Calls reuse pooled connections to each host. The pool can be configured in the [integrations] section:
+
+    [integrations]
+    # number of connections to keep open to each host
+    http_pool_size=10
+    # enable TCP keep-alive, probing idle connections after this many seconds
+    http_keepalive=60
+    # retry connection errors, and 502/503/504 responses to idempotent requests, this many times
+    http_retries=2
+
+    GET responses can be cached, by setting these properties in the [integrations] section
+    or the function's section:
+
+    # cache responses (see ResponseCache)
+    cache=true
+    # number of responses to keep in memory
+    cache_size=256
+    # default number of seconds to keep responses without Cache-Control
+    cache_ttl=300
+    # number of seconds to keep responses for matching urls, one "regex=seconds" per line or separated by ";"
+    cache_ttl_patterns=api\\.example\\.com/v2/ip/=3600
+    # sqlite database file for an on-disk cache, shared by processes
+    cache_file=/var/cache/resilient/responses.sqlite
+
+    Calls can be rate limited, and retried when the server is busy, by setting these properties in the
+    [integrations] section or the function's section. The limits are shared by all threads in the process:
+
+    # maximum rate of calls, per s, m, h or d
+    rate_limit=10/s
+    # apply the rate limit to each host (the default), or to all calls made with the function's settings
+    rate_limit_scope=host
+    # retry 429 responses, and 503 responses to idempotent requests, this many times,
+    # waiting for Retry-After or with exponential backoff
+    retry=3
+    # also retry 503 responses to POST and PATCH requests (only if the API won't act on a request twice)
+    retry_non_idempotent=false
+    # seconds to wait before the first retry (doubled for each retry), and the maximum wait.
+    # A longer Retry-After from the server is cut to the maximum (and logged)
+    retry_backoff=1
+    retry_max_delay=60
     """
     def __init__(self, opts=None, function_opts=None):
         # capture the properties for the integration as well as the global settings for all integrations for proxy urls
         self.integration_options = opts.get('integrations', None) if opts else None
         self.function_opts = function_opts
+        self.proxies = self._get_proxies()
+
+        options = self.integration_options or {}
+        self.pool_size = int(options.get("http_pool_size") or DEFAULT_POOL_SIZE)
+        self.keepalive = int(options.get("http_keepalive") or 0) or None
+        self.retries = int(options.get("http_retries") or 0)
+        self.cache = self._get_cache()
+
+        self.rate_limit = self._get_option("rate_limit")
+        self.rate_limit_scope = self._get_option("rate_limit_scope", "host")
+        self.retry = int(self._get_option("retry", 0))
+        self.retry_backoff = float(self._get_option("retry_backoff", DEFAULT_RETRY_BACKOFF))
+        self.retry_max_delay = float(self._get_option("retry_max_delay", DEFAULT_RETRY_MAX_DELAY))
+        self.retry_non_idempotent = str(self._get_option("retry_non_idempotent", "false")).lower() in \
+            ("1", "true", "yes")
 
     def get_proxies(self):
         """ proxies can be specified globally for all integrations or specifically per function """
+        return self.proxies
+
+    def get_session(self, url):
+        """ get the pooled session for the host of this url """
+        return get_session(url, pool_size=self.pool_size, keepalive=self.keepalive, retries=self.retries)
+
+    def get_rate_limiter(self, url):
+        """ get the shared token bucket for calls to this url, or None if there's no rate limit """
+        if not self.rate_limit:
+            return None
+        if self.rate_limit_scope == "function":
+            key = tuple(sorted((name, str(value)) for name, value in (self.function_opts or {}).items()))
+        else:
+            key = urlparse(url).netloc.lower()
+        return get_rate_limiter(key, self.rate_limit)
+
+    def get_cache_stats(self):
+        """ hit/miss metrics of the response cache, or None if caching is not enabled """
+        return self.cache.stats() if self.cache else None
+
+    def _get_cache(self):
+        options = dict(self.integration_options or {})
+        options.update(dict((name, value) for name, value in (self.function_opts or {}).items()
+                            if name.startswith("cache") and value is not None))
+        if str(options.get("cache", "false")).lower() not in ("1", "true", "yes"):
+            return None
+        ttl = options.get("cache_ttl")
+        return get_response_cache(maxsize=int(options.get("cache_size") or DEFAULT_CACHE_SIZE),
+                                  ttl=int(ttl) if ttl not in (None, "") else None,
+                                  ttl_patterns=parse_ttl_patterns(options.get("cache_ttl_patterns")),
+                                  filename=options.get("cache_file") or None)
+
+    def _get_option(self, name, default=None):
+        """ get a property from the function's section, or the [integrations] section """
+        for options in (self.function_opts, self.integration_options):
+            if options and options.get(name) not in (None, ""):
+                return options.get(name)
+        return default
+
+    def _send(self, session, method, url, **kwargs):
+        """ make the call, within the rate limit, retrying while the server says to try again later """
+        limiter = self.get_rate_limiter(url)
+        attempt = 0
+        while True:
+            limiter and limiter.acquire()
+            resp = session.request(method, url, **kwargs)
+            self._record_call(resp, kwargs.get("stream"))
+            if not self._should_retry(method, resp) or attempt >= self.retry:
+                return resp
+            resp.close()
+
+            wait = retry_after(resp, None)
+            if wait is not None and wait > self.retry_max_delay:
+                LOG.warning(u"%s asked to retry after %ss, waiting retry_max_delay (%ss) instead",
+                            url, wait, self.retry_max_delay)
+            delay = min(self.retry_max_delay, self.retry_backoff * (2 ** attempt) if wait is None else wait)
+            attempt += 1
+            if limiter:
+                # slow down every thread calling the same host (or function), not just this one
+                limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+    def _should_retry(self, method, resp):
+        """ a 429 wasn't acted on, so it's always retried; a 503 only if the request can be sent again """
+        if resp.status_code not in RETRY_STATUS_CODES:
+            return False
+        return resp.status_code == 429 or self.retry_non_idempotent or method.upper() in IDEMPOTENT_METHODS
+
+    @staticmethod
+    def _record_call(resp, stream):
+        """ count the call, and its size, for the function's metrics """
+        body = resp.request.body if resp.request is not None else None
+        bytes_sent = len(body) if isinstance(body, (bytes, text_type)) else 0
+        if stream:
+            bytes_received = int(resp.headers.get("Content-Length") or 0)
+        else:
+            bytes_received = len(resp.content or b"")
+        record_call(bytes_sent, bytes_received)
+
+    def _get_proxies(self):
         proxies = None
         if self.integration_options and (self.integration_options.get("http_proxy") or self.integration_options.get("https_proxy")):
             proxies = {'http': self.integration_options.get("http_proxy"), 'https': self.integration_options.get("https_proxy")}
@@ -36,7 +246,8 @@ class RequestsCommon:
 
 
     def execute_call(self, verb, url, payload={ }, log=None, basicauth=None, verify_flag=True, headers=None,
-                     proxies=None, timeout=None, resp_type='json', callback=None):
+                     proxies=None, timeout=None, resp_type='json', callback=None,
+                     download_to=None, hashes=None, chunk_size=DEFAULT_CHUNK_SIZE):
         """
         Function: perform the http API call. Different types of http operations are supported:
         GET, HEAD, PATCH, POST, PUT, DELETE
@@ -52,9 +263,12 @@ class RequestsCommon:
         :param headers: dictionary of http headers
         :param proxies: http and https proxies for call
         :param timeout: timeout before call should abort
-        :param resp_type: type of output to return: json, text, bytes
+        :param resp_type: type of output to return: json, text, bytes, stream (a ResponseStream to read in chunks)
         :param callback: callback routine used to handle errors
-        :return: json of returned data
+        :param download_to: file path or file-like object to write the response to, in chunks
+        :param hashes: list of hash algorithms, such as ["sha256"], to compute over a stream or download
+        :param chunk_size: number of bytes to read at a time, for a stream or download
+        :return: json of returned data. For download_to, a dictionary of the path, size, content_type and hashes
         """
 
         try:
@@ -66,12 +280,24 @@ class RequestsCommon:
             if proxies is None:
                 proxies = self.get_proxies()
 
+            session = self.get_session(url)
             if verb.lower() == 'post':
-                resp = requests.request(verb.upper(), url, verify=verify_flag, headers=headers, json=payload,
-                                        auth=basicauth, timeout=timeout, proxies=proxies)
+                payload_args = {"json": payload}
+            else:
+                payload_args = {"params": payload}
+            stream = resp_type == 'stream' or download_to is not None
+            if stream:
+                payload_args["stream"] = True
+
+            def send(conditional_headers=None):
+                call_headers = dict(headers or {}, **conditional_headers) if conditional_headers else headers
+                return self._send(session, verb.upper(), url, verify=verify_flag, headers=call_headers,
+                                  auth=basicauth, timeout=timeout, proxies=proxies, **payload_args)
+
+            if verb.lower() == 'get' and self.cache and not stream:
+                resp = self.cache.fetch(self.cache.make_key(url, payload, headers, basicauth), send)
             else:
-                resp = requests.request(verb.upper(), url, verify=verify_flag, headers=headers, params=payload,
-                                        auth=basicauth, timeout=timeout, proxies=proxies)
+                resp = send()
 
             if resp is None:
                 raise IntegrationError('no response returned')
@@ -85,6 +311,12 @@ class RequestsCommon:
                 # get the result
                 raise IntegrationError(resp.text)
 
+            # streamed content is read in chunks, by the caller or into the file
+            if download_to is not None:
+                return ResponseStream(resp, chunk_size=chunk_size, hashes=hashes).save(download_to)
+            if resp_type == 'stream':
+                return ResponseStream(resp, chunk_size=chunk_size, hashes=hashes)
+
             # check if anything returned
             log and log.debug(resp.text)
 
@@ -104,3 +336,59 @@ class RequestsCommon:
             msg = str(err)
             log and log.error(msg)
             raise IntegrationError(msg)
+
+    def execute_many(self, calls, max_concurrency=DEFAULT_MAX_CONCURRENCY, log=None):
+        """
+        Function: perform many http API calls, up to max_concurrency at a time.
+        Each call is made with execute_call, so it has the same verb checks, proxies and callback handling.
+
+        :param calls: list of calls. Each call is a dictionary of execute_call arguments,
+            such as {"verb": "get", "url": url, "payload": payload}, or a tuple of (verb, url, payload)
+        :param max_concurrency: maximum number of calls in progress at once
+        :param log: optional log statement, used for calls that don't specify one
+        :return: list of results, in the same order as the calls. If a call fails,
+            its result is the IntegrationError rather than a value
+        """
+        calls = list(calls)
+        if not calls:
+            return []
+
+        def call(args):
+            try:
+                if isinstance(args, dict):
+                    kwargs = dict(args)
+                    kwargs.setdefault("log", log)
+                    return self.execute_call(**kwargs)
+                return self.execute_call(*args, log=log)
+            except IntegrationError as err:
+                return err
+            except Exception as err:
+                # e.g. bad arguments for the call
+                log and log.error(str(err))
+                return IntegrationError(str(err))
+
+        pool = ThreadPool(max(1, min(max_concurrency, len(calls))))
+        try:
+            return pool.map(count_calls_for_caller(call), calls)
+        finally:
+            pool.close()
+
+    def execute_call_async(self, verb, url, payload={ }, loop=None, executor=None, **kwargs):
+        """
+        Function: perform the http API call from an asyncio event loop (Python 3 only).
+        The call is made with execute_call, in the executor (by default the loop's default executor).
+
+        :param loop: the asyncio event loop (by default the running event loop)
+        :param executor: concurrent.futures executor to run the call in
+        :param kwargs: other execute_call arguments
+        :return: awaitable, for the result of execute_call (or which raises IntegrationError)
+        """
+        if asyncio is None:
+            raise IntegrationError("execute_call_async requires Python 3")
+
+        if loop is None:
+            # get_event_loop is deprecated when no loop is running; get_running_loop is Python 3.7+
+            get_loop = getattr(asyncio, "get_running_loop", None) or asyncio.get_event_loop
+            loop = get_loop()
+        call = functools.partial(self.execute_call, verb, url, payload, **kwargs)
+        return loop.run_in_executor(executor, count_calls_for_caller(call))
@@ -3,17 +3,41 @@
 # pragma pylint: disable=unused-argument, no-self-use
 
 import datetime
-from bs4 import BeautifulSoup
-from six import string_types
+import os
+from multiprocessing.pool import ThreadPool
+from six import string_types, unichr
+from resilient_lib.components.multi_hash import DEFAULT_HASHES, MultiHash
+from resilient_lib.components.response_stream import ResponseStream
 try:
     from HTMLParser import HTMLParser as htmlparser
 except:
     from html.parser import HTMLParser as htmlparser
+try:
+    from html import unescape as html_unescape
+except ImportError:
+    html_unescape = htmlparser().unescape
+try:
+    from html.entities import name2codepoint
+except ImportError:
+    from htmlentitydefs import name2codepoint
 
 
 INCIDENT_FRAGMENT = '#incidents'
 PAYLOAD_VERSION = "1.0"
 
+# number of attachments retrieved at once by get_file_attachments
+ATTACHMENT_CONCURRENCY = 4
+
+ASCII_SPACES = u"\x20\x0a\x09\x0c\x0d"
+# tags that have no content (and so no end tag)
+VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+                       'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+                       'nextid', 'spacer'])
+# tags where whitespace is kept as it is
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+# tags whose content isn't text (such as scripts)
+NON_TEXT_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
 def build_incident_url(url, incidentId):
     """
     build the url to link to an resilient incident
@@ -35,11 +59,12 @@ def build_resilient_url(host, port):
 
     return "https://{0}:{1}".format(host, port)
 
-def clean_html(html_fragment):
+def clean_html(html_fragment, normalize_whitespace=False):
     """
     Resilient textarea fields return html fragments. This routine will remove the html and insert any code within <div></div>
     with a linefeed
     :param html_fragment: str presenting the html to clean up
+    :param normalize_whitespace: True to replace each run of whitespace with a single space, and strip the result
     :return: cleaned up code. This may not format well as no presentation of line feeds are preserved in the way supported by
        tags such as <br> or <ol>, <ul>, etc. See html2markdown for a better way to translate html input to markdown.
     """
@@ -47,9 +72,144 @@ def clean_html(html_fragment):
     if not html_fragment or not isinstance(html_fragment, string_types):
         return html_fragment
 
-    s = BeautifulSoup(unescape(html_fragment), "html.parser")
+    extractor = HTMLTextExtractor()
+    extractor.feed(unescape(html_fragment))
+    extractor.close()
+    text = u' '.join(extractor.pop_strings())
+
+    if normalize_whitespace:
+        text = u' '.join(text.split())
+    return text
+
+
+class HTMLTextExtractor(htmlparser):
+    """
+    Extract the text strings from html as it's parsed, without building a document tree. The strings are the same as
+    BeautifulSoup(html, "html.parser").strings: text within scripts, styles and comments is left out, and whitespace
+    between tags becomes a single space (or newline).
+
+    Feed it html in as many chunks as needed, take the strings found so far with pop_strings(), and close() it at the end.
+    """
+    def __init__(self):
+        try:
+            htmlparser.__init__(self, convert_charrefs=False)
+        except TypeError:
+            # Python 2
+            htmlparser.__init__(self)
+        self.strings = []
+        self._data = []
+        self._tags = []
+        self._closed_void_tags = []
+        self._preserve_whitespace = 0
+        self._non_text = 0
+
+    def pop_strings(self):
+        """ get the strings found so far """
+        strings, self.strings = self.strings, []
+        return strings
+
+    def close(self):
+        htmlparser.close(self)
+        self._end_data()
+
+    def handle_starttag(self, tag, attrs):
+        self._end_data()
+        self._push(tag)
+        if tag in VOID_TAGS:
+            self._pop_to(tag)
+            self._closed_void_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_data()
+        self._push(tag)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._closed_void_tags:
+            # end tag of a void tag, such as <br></br>
+            self._closed_void_tags.remove(tag)
+            return
+        self._end_data()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_entityref(self, name):
+        if name in name2codepoint:
+            self._data.append(unichr(name2codepoint[name]))
+        else:
+            self._data.append(u"&" + name)
+
+    def handle_charref(self, name):
+        if name[:1] in ("x", "X"):
+            codepoint = int(name.lstrip("xX"), 16)
+        else:
+            codepoint = int(name)
+        data = None
+        if codepoint < 256:
+            # often meant as windows-1252, such as &#147; for a quotation mark
+            try:
+                data = bytearray([codepoint]).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = unichr(codepoint)
+            except (ValueError, OverflowError):
+                pass
+        self._data.append(data or u"\ufffd")
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+
+    def handle_pi(self, data):
+        self._end_data()
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith("CDATA["):
+            self._data.append(data[len("CDATA["):])
+            self._end_data(text=True)
+
+    def error(self, message):
+        # Python 2 raises HTMLParseError for malformed html, such as an unfinished entity. Keep going instead.
+        pass
+
+    def _push(self, tag):
+        self._tags.append(tag)
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace += 1
+        if tag in NON_TEXT_TAGS:
+            self._non_text += 1
+
+    def _pop_to(self, tag):
+        """ close the most recent tag with this name, and any tags within it """
+        if tag not in self._tags:
+            return
+        while self._tags:
+            popped = self._tags.pop()
+            if popped in PRESERVE_WHITESPACE_TAGS:
+                self._preserve_whitespace -= 1
+            if popped in NON_TEXT_TAGS:
+                self._non_text -= 1
+            if popped == tag:
+                break
+
+    def _end_data(self, text=False):
+        """ the end of a string: keep it if it's text """
+        if not self._data:
+            return
+        data = u''.join(self._data)
+        self._data = []
+        if not self._preserve_whitespace and not data.strip(ASCII_SPACES):
+            data = u'\n' if u'\n' in data else u' '
+        if text or not self._non_text:
+            self.strings.append(data)
 
-    return ' '.join(s.strings)
 
 def unescape(data):
     """ Return unescaped data such as &gt; -> >, &quot -> ', etc.
@@ -58,8 +218,7 @@ def unescape(data):
     if data is None:
         return None
 
-    h = htmlparser()
-    return h.unescape(data)
+    return html_unescape(data)
 
 
 def validate_fields(field_list, kwargs):
@@ -85,17 +244,7 @@ def get_file_attachment(res_client, incident_id, artifact_id=None, task_id=None,
     :return: byte string of attachment
     """
 
-    if incident_id and artifact_id:
-        data_uri = "/incidents/{}/artifacts/{}/contents".format(incident_id, artifact_id)
-    elif attachment_id:
-        if task_id:
-            data_uri = "/tasks/{}/attachments/{}/contents".format(task_id, attachment_id)
-        elif incident_id:
-            data_uri = "/incidents/{}/attachments/{}/contents".format(incident_id, attachment_id)
-        else:
-            raise ValueError("task_id or incident_id must be specified with attachment")
-    else:
-        raise ValueError("artifact or attachment or incident id must be specified")
+    data_uri = _get_attachment_uri(incident_id, artifact_id, task_id, attachment_id) + "/contents"
 
     # Get the data
     return res_client.get_content(data_uri)
@@ -112,24 +261,127 @@ def get_file_attachment_name(res_client, incident_id, artifact_id=None, task_id=
     :return: file attachment name
     """
 
-    name = ""
+    name_url = _get_attachment_uri(incident_id, artifact_id, task_id, attachment_id)
+    name = str(_get_attachment_name(res_client.get(name_url), artifact_id))
+
+    # Return name string
+    return name
+
+
+def get_file_attachment_hashes(res_client, incident_id, artifact_id=None, task_id=None, attachment_id=None,
+                               hashes=DEFAULT_HASHES):
+    """
+    call the Resilient REST API to get several digests of the attachment or artifact data, in one pass over
+    the data as it's downloaded (so it's never held in memory all at once)
+    :param res_client: required for communication back to resilient
+    :param incident_id: required
+    :param artifact_id: optional
+    :param task_id: optional
+    :param attachment_id: optional
+    :param hashes: list of hashlib algorithm names, or "ssdeep" (if it's installed)
+    :return: dictionary of hex digests by algorithm name
+    """
+    data_uri = _get_attachment_uri(incident_id, artifact_id, task_id, attachment_id) + "/contents"
+
+    if not hasattr(res_client, "get_content_stream"):
+        return MultiHash(hashes).update(res_client.get_content(data_uri)).hexdigests()
+
+    with ResponseStream(res_client.get_content_stream(data_uri), hashes=hashes) as stream:
+        for _ in stream:
+            pass
+        return stream.hexdigests()
+
+
+def get_file_attachments(res_client, refs, max_concurrency=ATTACHMENT_CONCURRENCY, download_dir=None, hashes=None):
+    """
+    call the Resilient REST API to get the names and data of several attachments or artifacts, up to
+    max_concurrency at a time. The results are returned as they complete, which may not be in the order of refs.
+
+        for result in get_file_attachments(res_client, [(incident_id, None, None, attachment_id) for ...]):
+            if result["error"]:
+                ...
+            process(result["name"], result["content"])
+
+    :param res_client: required for communication back to resilient
+    :param refs: list of (incident_id, task_id, artifact_id, attachment_id) tuples,
+        or dictionaries with those keys (any that aren't needed can be None or left out)
+    :param max_concurrency: maximum number of attachments retrieved at once
+    :param download_dir: optional directory to stream the data to, rather than holding it in memory
+    :param hashes: optional list of hashlib algorithm names (or "ssdeep"), to compute the digests of the data
+    :return: generator of dictionaries of the ref, name, content (byte string, or None if it's in download_dir),
+        path (in download_dir, or None), size, hashes (dictionary of hex digests, or None)
+        and error (the exception, if it couldn't be retrieved)
+    """
+    refs = list(refs)
+    if not refs:
+        return
+
+    def get_attachment(ref):
+        result = {"ref": ref, "name": None, "content": None, "path": None, "size": None, "hashes": None,
+                  "error": None}
+        try:
+            if isinstance(ref, dict):
+                incident_id, task_id, artifact_id, attachment_id = \
+                    (ref.get(key) for key in ("incident_id", "task_id", "artifact_id", "attachment_id"))
+            else:
+                incident_id, task_id, artifact_id, attachment_id = ref
+            uri = _get_attachment_uri(incident_id, artifact_id, task_id, attachment_id)
+            result["name"] = _get_attachment_name(res_client.get(uri), artifact_id)
+
+            if download_dir:
+                kind, object_id = ("artifact", artifact_id) if artifact_id else ("attachment", attachment_id)
+                path = os.path.join(download_dir, u"{}-{}-{}".format(kind, object_id,
+                                                                    os.path.basename(result["name"])))
+                if hasattr(res_client, "get_content_stream"):
+                    with ResponseStream(res_client.get_content_stream(uri + "/contents"), hashes=hashes) as stream:
+                        saved = stream.save(path)
+                    result["size"] = saved["size"]
+                    result["hashes"] = saved["hashes"] if hashes else None
+                else:
+                    content = res_client.get_content(uri + "/contents")
+                    with open(path, "wb") as outfile:
+                        outfile.write(content)
+                    result["size"] = len(content)
+                    result["hashes"] = MultiHash(hashes).update(content).hexdigests() if hashes else None
+                result["path"] = path
+            else:
+                result["content"] = res_client.get_content(uri + "/contents")
+                result["size"] = len(result["content"])
+                if hashes:
+                    result["hashes"] = MultiHash(hashes).update(result["content"]).hexdigests()
+        except Exception as err:
+            result["error"] = err
+        return result
+
+    pool = ThreadPool(max(1, min(max_concurrency, len(refs))))
+    try:
+        for result in pool.imap_unordered(get_attachment, refs):
+            yield result
+    finally:
+        # stops any that are left if the caller doesn't take them all
+        pool.terminate()
+
+
+def _get_attachment_uri(incident_id, artifact_id=None, task_id=None, attachment_id=None):
+    """ uri of the attachment or artifact (add /contents for its data) """
     if incident_id and artifact_id:
-        name_url = "/incidents/{}/artifacts/{}".format(incident_id, artifact_id)
-        name = str(res_client.get(name_url)["attachment"]["name"])
+        return "/incidents/{}/artifacts/{}".format(incident_id, artifact_id)
     elif attachment_id:
         if task_id:
-            name_url = "/tasks/{}/attachments/{}".format(task_id, attachment_id)
-            name = str(res_client.get(name_url)["name"])
+            return "/tasks/{}/attachments/{}".format(task_id, attachment_id)
         elif incident_id:
-            name_url = "/incidents/{}/attachments/{}".format(incident_id, attachment_id)
-            name = str(res_client.get(name_url)["name"])
+            return "/incidents/{}/attachments/{}".format(incident_id, attachment_id)
         else:
             raise ValueError("task_id or incident_id must be specified with attachment")
     else:
         raise ValueError("artifact or attachment or incident id must be specified")
 
-    # Return name string
-    return name
+
+def _get_attachment_name(dto, artifact_id=None):
+    """ file name from the attachment or artifact """
+    if artifact_id:
+        return dto["attachment"]["name"]
+    return dto["name"]
 
 
 def readable_datetime(timestamp, milliseconds=True, rtn_format='%Y-%m-%dT%H:%M:%SZ'):
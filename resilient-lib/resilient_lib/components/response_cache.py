@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+# pragma pylint: disable=unused-argument, no-self-use
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from cachetools import LRUCache
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_CACHE_SIZE = 256
+
+# Response caches, shared by all RequestsCommon instances with the same settings
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def parse_ttl_patterns(value):
+    """
+    Parse the per-URL-pattern TTLs from app.config, one "regex=seconds" per line (or separated by ";").
+    The patterns are matched (re.search) against the url, and the first match is used.
+
+    :param value: string, such as "api\\.example\\.com/v2/ip/=3600; api\\.example\\.com/=60"
+    :return: tuple of (pattern, ttl) tuples
+    """
+    patterns = []
+    for line in re.split(r"[;\n]", value or ""):
+        line = line.strip()
+        if not line:
+            continue
+        pattern, _, ttl = line.rpartition("=")
+        if not pattern:
+            raise ValueError(u"cache TTL pattern must be regex=seconds: {}".format(line))
+        patterns.append((pattern.strip(), int(ttl)))
+    return tuple(patterns)
+
+
+def get_response_cache(maxsize=DEFAULT_CACHE_SIZE, ttl=None, ttl_patterns=None, filename=None):
+    """ get the shared response cache with these settings, creating it if needed """
+    key = (maxsize, ttl, tuple(ttl_patterns or ()), filename)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ResponseCache(maxsize=maxsize, ttl=ttl, ttl_patterns=ttl_patterns, filename=filename)
+            _caches[key] = cache
+        return cache
+
+
+def _cache_control(headers):
+    """ parse the Cache-Control header into a dictionary of directives """
+    directives = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip().strip('"')
+    return directives
+
+
+class CachedResponse(object):
+    """ A response body and the headers needed to rebuild and revalidate it """
+    def __init__(self, url, status_code, headers, content, encoding, expires):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.encoding = encoding
+        self.expires = expires
+
+    def is_fresh(self):
+        return time.time() < self.expires
+
+    def validators(self):
+        """ conditional request headers, to revalidate with the server """
+        headers = {}
+        if self.headers.get("ETag"):
+            headers["If-None-Match"] = self.headers["ETag"]
+        if self.headers.get("Last-Modified"):
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+    def response(self):
+        """ rebuild a requests.Response """
+        resp = requests.Response()
+        resp.url = self.url
+        resp.status_code = self.status_code
+        resp.reason = "OK"
+        resp.headers = CaseInsensitiveDict(self.headers)
+        resp.encoding = self.encoding
+        resp._content = self.content
+        resp.from_cache = True
+        return resp
+
+
+class ResponseCache(object):
+    """
+    This class caches the responses of GET calls, in memory (LRU) and optionally in a sqlite database file
+    that is shared by processes. Caching follows the Cache-Control header (no-store, no-cache, max-age) of
+    the response. Otherwise, responses are kept for the TTL of the first pattern that matches the url, or
+    the default TTL. Stale responses with an ETag or Last-Modified header are revalidated with the server.
+    """
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, ttl=None, ttl_patterns=None, filename=None):
+        """
+        :param maxsize: number of responses kept in memory
+        :param ttl: default number of seconds to keep responses, or None to keep only
+            responses that allow it with Cache-Control (or can be revalidated)
+        :param ttl_patterns: list of (regex, ttl) for urls that have their own TTL
+        :param filename: sqlite database file for the on-disk tier, or None for memory only
+        """
+        self.ttl = ttl
+        self.ttl_patterns = [(re.compile(pattern), pattern_ttl) for pattern, pattern_ttl in (ttl_patterns or ())]
+        self.filename = filename
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._memory = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._db = None
+        if filename:
+            self._db = sqlite3.connect(filename, check_same_thread=False)
+            with self._db:
+                self._db.execute("CREATE TABLE IF NOT EXISTS responses ("
+                                 "key TEXT PRIMARY KEY, url TEXT, status_code INTEGER, headers TEXT, "
+                                 "content BLOB, encoding TEXT, expires REAL, revalidate INTEGER)")
+
+    @staticmethod
+    def make_key(url, params=None, headers=None, auth=None):
+        """ the cache key of a call: the url and parameters, and the headers and credentials that were sent """
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        if headers:
+            headers = sorted((name.lower(), value) for name, value in headers.items())
+        text = json.dumps([url, params, headers, repr(auth)], sort_keys=True, default=repr)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def stats(self):
+        """ hit/miss metrics """
+        with self._lock:
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "revalidated": self.revalidated,
+                    "size": len(self._memory)}
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db:
+                with self._db:
+                    self._db.execute("DELETE FROM responses")
+
+    def fetch(self, key, send):
+        """
+        Get the response from the cache, or by making the call
+
+        :param key: cache key, from make_key
+        :param send: function to make the call, given a dictionary of additional (conditional) headers
+        :return: requests.Response
+        """
+        entry = self.get(key)
+        if entry is not None and entry.is_fresh():
+            with self._lock:
+                self.hits += 1
+            return entry.response()
+
+        resp = send(entry.validators() if entry is not None else {})
+
+        if entry is not None and resp.status_code == 304:
+            # not modified, so keep the cached body for longer
+            ttl = self._get_ttl(entry.url, resp.headers)
+            entry.expires = time.time() + (ttl or 0)
+            self.put(key, entry)
+            with self._lock:
+                self.revalidated += 1
+            return entry.response()
+
+        with self._lock:
+            self.misses += 1
+        if resp.status_code == 200:
+            self.store(key, resp)
+        return resp
+
+    def store(self, key, resp):
+        """ cache the response, if it's cacheable """
+        ttl = self._get_ttl(resp.url, resp.headers)
+        if ttl is None:
+            return
+        entry = CachedResponse(resp.url, resp.status_code, resp.headers, resp.content, resp.encoding,
+                               time.time() + ttl)
+        if ttl <= 0 and not entry.validators():
+            return
+        self.put(key, entry)
+
+    def _get_ttl(self, url, headers):
+        """ number of seconds to keep the response, or None if it isn't to be cached """
+        cache_control = _cache_control(headers)
+        if "no-store" in cache_control:
+            return None
+        if "no-cache" in cache_control:
+            return 0
+        if "max-age" in cache_control:
+            try:
+                return int(cache_control["max-age"])
+            except ValueError:
+                pass
+        for pattern, ttl in self.ttl_patterns:
+            if pattern.search(url or ""):
+                return ttl
+        if self.ttl is None and (headers.get("ETag") or headers.get("Last-Modified")):
+            return 0
+        return self.ttl
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None or self._db is None:
+                return entry
+            row = self._db.execute("SELECT url, status_code, headers, content, encoding, expires "
+                                   "FROM responses WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            entry = CachedResponse(row[0], row[1], json.loads(row[2]), bytes(row[3]), row[4], row[5])
+            self._memory[key] = entry
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            if self._db is not None:
+                try:
+                    with self._db:
+                        self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                         (key, entry.url, entry.status_code, json.dumps(dict(entry.headers)),
+                                          sqlite3.Binary(entry.content), entry.encoding, entry.expires,
+                                          1 if entry.validators() else 0))
+                        # responses that can't be revalidated are no use once they expire
+                        self._db.execute("DELETE FROM responses WHERE expires < ? AND revalidate=0", (time.time(),))
+                except sqlite3.Error as err:
+                    LOG.warning(u"Unable to save response to cache file %s: %s", self.filename, err)
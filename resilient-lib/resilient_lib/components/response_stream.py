@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+# pragma pylint: disable=unused-argument, no-self-use
+
+import os
+from six import string_types
+from resilient_lib.components.integration_errors import IntegrationError
+from resilient_lib.components.multi_hash import MultiHash
+
+DEFAULT_CHUNK_SIZE = 65536
+
+
+class ResponseStream(object):
+    """
+    The body of a streamed response, read in chunks so it's never held in memory all at once.
+    It can be iterated for the chunks, read like a file, or saved to a file. The number of bytes
+    and the hashes of the content are updated as it's read.
+
+    It can be posted as an attachment as it's downloaded, as the bytes_handle of
+    resilient's SimpleClient.post_attachment or post_artifact_file:
+
+        stream = rc.execute_call("get", url, None, resp_type="stream", hashes=["sha256"])
+        client.post_attachment("/incidents/{}/attachments".format(incident_id), None,
+                               filename="sample.bin", bytes_handle=stream)
+        sha256 = stream.hexdigests()["sha256"]
+    """
+    def __init__(self, resp, chunk_size=DEFAULT_CHUNK_SIZE, hashes=None):
+        """
+        :param resp: requests.Response, from a call made with stream=True
+        :param chunk_size: number of bytes to read at a time
+        :param hashes: list of hashlib algorithm names, such as ["md5", "sha256"], or "ssdeep" (if it's installed)
+        """
+        self.resp = resp
+        self.chunk_size = chunk_size
+        self.size = 0
+        self.hashes = MultiHash(hashes or [])
+        self._chunks = None
+        self._buffer = b""
+
+    @property
+    def status_code(self):
+        return self.resp.status_code
+
+    @property
+    def headers(self):
+        return self.resp.headers
+
+    @property
+    def content_type(self):
+        return self.resp.headers.get("Content-Type")
+
+    @property
+    def content_length(self):
+        """ the length from the Content-Length header, or None """
+        length = self.resp.headers.get("Content-Length")
+        return int(length) if length else None
+
+    def hexdigests(self):
+        """ hex digests of the content read so far """
+        return self.hashes.hexdigests()
+
+    def __iter__(self):
+        if self._buffer:
+            buffered, self._buffer = self._buffer, b""
+            yield buffered
+        for chunk in self._iter_chunks():
+            yield chunk
+
+    def _iter_chunks(self):
+        if self._chunks is None:
+            self._chunks = self._read_chunks()
+        return self._chunks
+
+    def _read_chunks(self):
+        try:
+            for chunk in self.resp.iter_content(chunk_size=self.chunk_size):
+                if not chunk:
+                    continue
+                self.size += len(chunk)
+                self.hashes.update(chunk)
+                yield chunk
+        except Exception as err:
+            raise IntegrationError(str(err))
+        finally:
+            self.close()
+
+    def read(self, size=-1):
+        """ read up to size bytes (or all the remaining bytes) """
+        chunks = self._iter_chunks()
+        while size is None or size < 0 or len(self._buffer) < size:
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def save(self, destination):
+        """
+        Write the (remaining) content to a file
+
+        :param destination: file path, or a file-like object opened for writing bytes
+        :return: dictionary of the path (if any), size, content type and hashes
+        """
+        path = destination if isinstance(destination, string_types) else None
+        try:
+            if path:
+                with open(path, "wb") as outfile:
+                    self._write(outfile)
+            else:
+                self._write(destination)
+        except Exception:
+            if path and os.path.exists(path):
+                os.remove(path)
+            raise
+
+        return {"path": path,
+                "size": self.size,
+                "content_type": self.content_type,
+                "hashes": self.hexdigests()}
+
+    def _write(self, outfile):
+        for chunk in self:
+            outfile.write(chunk)
+
+    def close(self):
+        self.resp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+# pragma pylint: disable=unused-argument, no-self-use
+
+import logging
+import time
+from multiprocessing.pool import ThreadPool
+import requests
+from requests.packages.urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+from resilient_lib.components.rate_limit import retry_after
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_RETRIES = 3
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_RETRY_MAX_DELAY = 30
+
+# Responses that mean the call can be made again
+TRANSIENT_STATUS_CODES = (409, 429, 500, 502, 503, 504)
+
+# Responses that mean the server didn't act on the call, so even a create (post) can be made again
+UNPROCESSED_STATUS_CODES = (429, 503)
+
+
+def _is_transient(err):
+    """ True if the call that raised the error can be made again """
+    if isinstance(err, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    response = getattr(err, "response", None)
+    return response is not None and response.status_code in TRANSIENT_STATUS_CODES
+
+
+def _is_unsent(err):
+    """
+    True if the server didn't act on the call that raised the error: it failed to connect,
+    or the response was 429 or 503. After other failures (such as a read timeout or a 502),
+    the server may have made the change.
+    """
+    if isinstance(err, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(err, requests.exceptions.ConnectionError):
+        reason = err.args[0] if err.args else None
+        reason = getattr(reason, "reason", reason)
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    response = getattr(err, "response", None)
+    return response is not None and response.status_code in UNPROCESSED_STATUS_CODES
+
+
+class RestBatch(object):
+    """
+    Makes many Resilient REST API calls with a SimpleClient, up to max_concurrency at a time.
+    Calls that fail with a connection error or a transient status (such as 409, 429 or 503)
+    are made again, with exponential backoff.
+
+    A post isn't idempotent, so it's only made again if the server didn't act on it (it failed to connect,
+    or the response was 429 or 503), or if its check finds that it didn't make the change (see call).
+    """
+    def __init__(self, res_client, max_concurrency=DEFAULT_MAX_CONCURRENCY, retries=DEFAULT_RETRIES,
+                 retry_backoff=DEFAULT_RETRY_BACKOFF, retry_max_delay=DEFAULT_RETRY_MAX_DELAY):
+        """
+        :param res_client: required for communication back to resilient
+        :param max_concurrency: maximum number of calls in progress at once
+        :param retries: number of times to make a call again after a transient failure
+        :param retry_backoff: seconds to wait before the first retry, doubling for each retry after
+        :param retry_max_delay: maximum seconds to wait before a retry
+        """
+        self.res_client = res_client
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_max_delay = retry_max_delay
+
+    def call_many(self, calls):
+        """
+        :param calls: list of (method, uri, payload) or (method, uri, payload, check),
+            where the method is "get", "post", "put" or "delete"
+        :return: list of results, in the same order as the calls. If a call fails, its result is the exception.
+        """
+        if not calls:
+            return []
+
+        def call(args):
+            try:
+                return self.call(*args)
+            except Exception as err:
+                LOG.error(u"Unable to %s %s: %s", args[0], args[1], err)
+                return err
+
+        pool = ThreadPool(max(1, min(self.max_concurrency, len(calls))))
+        try:
+            return pool.map(call, calls)
+        finally:
+            pool.close()
+
+    def call(self, method, uri, payload=None, check=None):
+        """
+        Make the call, and make it again after a transient failure
+
+        :param check: for a post, function that finds what the post created, called before it's made again
+            after a failure where the server may have acted on it. It returns the result to use instead of
+            making the post again, or None. Without a check, the post isn't made again after such a failure.
+        """
+        attempt = 0
+        while True:
+            try:
+                if method == "get":
+                    return self.res_client.get(uri)
+                elif method == "post":
+                    return self.res_client.post(uri, payload)
+                elif method == "put":
+                    return self.res_client.put(uri, payload)
+                return self.res_client.delete(uri)
+            except Exception as err:
+                if attempt >= self.retries or not _is_transient(err):
+                    raise
+                checked = method == "post" and not _is_unsent(err)
+                if checked and check is None:
+                    raise
+                delay = min(self.retry_max_delay, self.retry_backoff * (2 ** attempt))
+                delay = min(self.retry_max_delay, retry_after(getattr(err, "response", None), delay))
+                LOG.debug(u"Retrying %s %s in %.1fs: %s", method, uri, delay, err)
+                time.sleep(delay)
+                attempt += 1
+                if checked:
+                    result = check()
+                    if result is not None:
+                        LOG.debug(u"Not retrying %s %s, it was made", method, uri)
+                        return result
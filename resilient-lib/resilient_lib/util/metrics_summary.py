@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2018. All Rights Reserved.
+
+"""Print the summary of function metrics written by a running integration (see APP_METRICS_FILE)"""
+
+from __future__ import print_function
+import json
+import sys
+from resilient_lib.components import function_metrics
+
+
+def main():
+    """ print the summary of function metrics, from the file written by a running integration """
+    path = sys.argv[1] if len(sys.argv) > 1 else function_metrics.METRICS_FILE
+    if not path:
+        print("Usage: python -m resilient_lib.util.metrics_summary <metrics file>")
+        print("(the file is written by integrations run with the APP_METRICS_FILE environment variable)")
+        return 1
+    with open(path) as infile:
+        summary = json.load(infile)
+
+    print("{:<40} {:>8} {:>8} {:>8} {:>8} {:>8} {:>10} {:>12}".format(
+        "function", "count", "failed", "p50 ms", "p95 ms", "p99 ms", "calls", "out bytes"))
+    for name in sorted(summary):
+        metrics = summary[name]
+        times = metrics["execution_time_ms"]
+        print("{:<40} {:>8} {:>8} {:>8} {:>8} {:>8} {:>10} {:>12}".format(
+            name, metrics["count"], metrics["failures"], times["p50"], times["p95"], times["p99"],
+            metrics["http_calls"], metrics["outbound_bytes"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
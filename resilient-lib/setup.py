@@ -14,7 +14,6 @@ setup(
     description="library for resilient-circuits functions",
     long_description="This package contains common library calls which facilitate the development of functions for IBM Resilient.",
     install_requires=[
-        'bs4',
         'resilient_circuits>=30.0.0',
         'six'
     ],
@@ -0,0 +1,126 @@
+import json
+import threading
+import unittest
+import requests_mock
+import resilient
+from resilient.resilient_rest_mock import ResilientMock, resilient_endpoint
+from resilient_lib.components.artifacts import IncidentArtifacts, create_artifacts
+
+ARTIFACT_TYPES = {1: "IP Address", 3: "DNS Name", 13: "Malware MD5 Hash"}
+
+
+class ArtifactsMock(ResilientMock):
+    """ Mock of an incident's artifacts """
+
+    def __init__(self, *args, **kwargs):
+        super(ArtifactsMock, self).__init__(*args, **kwargs)
+        self.artifacts = [{"id": 1, "type": 1, "value": "192.168.1.1"},
+                          {"id": 2, "type": 3, "value": "example.com"}]
+        self.gets = 0
+        self.posts = 0
+        # (status, created) for each post to fail, created if the server makes the artifact anyway
+        self.post_failures = []
+        self.lock = threading.Lock()
+
+    @resilient_endpoint("POST", "/rest/session")
+    def session_post(self, request):
+        return requests_mock.create_response(request, status_code=200,
+                                             headers={"Set-Cookie": "JSESSIONID=FakeSessionId; Path=/"},
+                                             json={"csrf_token": "token", "user_id": 1,
+                                                   "orgs": [{"enabled": True, "id": 201, "name": self.org_name}]})
+
+    @resilient_endpoint("GET", "/rest/const")
+    def const_get(self, request):
+        return requests_mock.create_response(request, status_code=200, json={
+            "artifact_types": [{"id": type_id, "name": name} for type_id, name in ARTIFACT_TYPES.items()]})
+
+    @resilient_endpoint("GET", "/incidents/[0-9]+/artifacts(\\?|$)")
+    def artifacts_get(self, request):
+        names = "handle_format=names" in request.url
+        with self.lock:
+            self.gets += 1
+            artifacts = [dict(artifact, type=ARTIFACT_TYPES[artifact["type"]] if names else artifact["type"])
+                         for artifact in self.artifacts]
+        return requests_mock.create_response(request, status_code=200, json=artifacts)
+
+    @resilient_endpoint("POST", "/incidents/[0-9]+/artifacts$")
+    def artifacts_post(self, request):
+        body = json.loads(request.body)
+        if body["value"] == "bad":
+            return requests_mock.create_response(request, status_code=400, json={"message": "bad value"})
+        artifact_type = body["type"]
+        if not isinstance(artifact_type, int):
+            artifact_type = dict((name, type_id) for type_id, name in ARTIFACT_TYPES.items())[artifact_type]
+        with self.lock:
+            self.posts += 1
+            status, created = self.post_failures.pop(0) if self.post_failures else (200, True)
+            artifact = {"id": len(self.artifacts) + 1, "type": artifact_type, "value": body["value"]}
+            if created:
+                self.artifacts.append(artifact)
+        if status != 200:
+            return requests_mock.create_response(request, status_code=status, text="failed")
+        return requests_mock.create_response(request, status_code=200, json=[artifact])
+
+
+class TestIncidentArtifacts(unittest.TestCase):
+    """ Tests for creating artifacts without duplicates, against a mock """
+
+    def setUp(self):
+        self.mock = ArtifactsMock(org_name="Test Org")
+        self.client = resilient.SimpleClient(org_name="Test Org", base_url="https://resilient.example.com")
+        self.client.session.mount("https://", self.mock.adapter)
+        self.client.connect("api@example.com", "password")
+
+    def test_create_artifacts(self):
+        artifacts = [{"type": "IP Address", "value": "192.168.1.1"},
+                     {"type": "IP Address", "value": "192.168.1.2"},
+                     {"type": {"name": "DNS Name"}, "value": " example.com "},
+                     {"type": 1, "value": "192.168.1.2"},
+                     {"type": 13, "value": "d41d8cd98f00b204e9800998ecf8427e"},
+                     {"type": "DNS Name", "value": "bad"}]
+        result = create_artifacts(self.client, 2314, artifacts)
+
+        self.assertEqual(result["duplicates"], [artifacts[0], artifacts[2], artifacts[3]])
+        self.assertEqual(len(result["created"]), 3)
+        self.assertEqual(result["created"][0][0]["value"], "192.168.1.2")
+        self.assertEqual(result["created"][1][0]["type"], 13)
+        self.assertIsInstance(result["created"][2], resilient.SimpleHTTPException)
+        self.assertEqual(self.mock.gets, 1)
+        self.assertEqual(len(self.mock.artifacts), 4)
+
+    def test_index(self):
+        incident_artifacts = IncidentArtifacts(self.client, 2314)
+        self.assertEqual(incident_artifacts.find("IP Address", "192.168.1.1")[0]["id"], 1)
+        self.assertEqual(incident_artifacts.find(3, "example.com")[0]["id"], 2)
+        self.assertEqual(incident_artifacts.find("IP Address", "10.0.0.1"), [])
+
+        result = incident_artifacts.create_artifacts([{"type": "IP Address", "value": "10.0.0.1"}])
+        self.assertEqual(incident_artifacts.find("IP Address", "10.0.0.1"), result["created"][0])
+        result = incident_artifacts.create_artifacts([{"type": "IP Address", "value": "10.0.0.1"}])
+        self.assertEqual(result, {"created": [], "duplicates": [{"type": "IP Address", "value": "10.0.0.1"}]})
+        self.assertEqual(len(incident_artifacts.get_artifacts()), 3)
+        self.assertEqual(self.mock.gets, 1)
+        self.assertEqual(self.mock.posts, 1)
+
+        incident_artifacts.refresh()
+        self.assertEqual(self.mock.gets, 2)
+        self.assertEqual(len(incident_artifacts.get_artifacts()), 3)
+
+    def test_retry(self):
+        """A failed create is only made again if the artifact wasn't created"""
+        incident_artifacts = IncidentArtifacts(self.client, 2314, retry_backoff=0.01)
+        self.mock.post_failures = [(503, False), (502, True), (502, False)]
+        result = incident_artifacts.create_artifacts([{"type": "IP Address", "value": "10.0.0.1"}])
+        # created by the second post, which was checked
+        self.assertEqual(result["created"][0][0]["value"], "10.0.0.1")
+        self.assertEqual(self.mock.posts, 2)
+        self.assertEqual(self.mock.gets, 2)
+        self.assertEqual(len(self.mock.artifacts), 3)
+        self.assertEqual(len(incident_artifacts.find("IP Address", "10.0.0.1")), 1)
+
+        # not created by the first post, so it's made again
+        result = incident_artifacts.create_artifacts([{"type": "IP Address", "value": "10.0.0.2"}])
+        self.assertEqual(result["created"][0][0]["value"], "10.0.0.2")
+        self.assertEqual(self.mock.posts, 4)
+        self.assertEqual(self.mock.gets, 3)
+        self.assertEqual(len(self.mock.artifacts), 4)
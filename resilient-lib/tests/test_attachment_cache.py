@@ -0,0 +1,99 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+from multiprocessing.pool import ThreadPool
+import resilient
+from resilient_lib.components.attachment_cache import AttachmentCache
+from tests.test_attachments import AttachmentsMock, CONTENTS
+
+
+class TestAttachmentCache(unittest.TestCase):
+    """ Tests for the on-disk cache of attachments, against a mock """
+
+    def setUp(self):
+        self.mock = AttachmentsMock(org_name="Test Org")
+        self.client = resilient.SimpleClient(org_name="Test Org", base_url="https://resilient.example.com")
+        self.client.session.mount("https://", self.mock.adapter)
+        self.client.connect("api@example.com", "password")
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get_file_attachment(self):
+        cache = AttachmentCache(self.directory)
+        for _ in range(3):
+            self.assertEqual(cache.get_file_attachment(self.client, 2314, artifact_id=5), CONTENTS[5])
+            self.assertEqual(cache.get_file_attachment(self.client, 2314, attachment_id=6), CONTENTS[6])
+        self.assertEqual(self.mock.downloads, 2)
+        self.assertEqual(cache.stats(), {"hits": 4, "misses": 2, "files": 2,
+                                         "size": len(CONTENTS[5]) + len(CONTENTS[6])})
+
+        # named by content
+        digest = hashlib.sha256(CONTENTS[5]).hexdigest()
+        self.assertEqual(cache.get_path(self.client, 2314, artifact_id=5, version=1),
+                         os.path.join(self.directory, digest[:2], digest))
+
+        # shared by processes
+        self.assertEqual(AttachmentCache(self.directory).get_file_attachment(self.client, 2314, artifact_id=5),
+                         CONTENTS[5])
+        self.assertEqual(self.mock.downloads, 2)
+
+    def test_concurrent_downloads(self):
+        """Threads that get the same object at once download it once, and the download locks are removed"""
+        cache = AttachmentCache(self.directory)
+        pool = ThreadPool(4)
+        try:
+            results = pool.map(lambda n: cache.get_file_attachment(self.client, 2314, attachment_id=n % 2 + 1),
+                               range(8))
+        finally:
+            pool.close()
+        self.assertEqual(results, [CONTENTS[n % 2 + 1] for n in range(8)])
+        self.assertEqual(self.mock.downloads, 2)
+        self.assertEqual(cache._downloads, {})
+
+    def test_version(self):
+        cache = AttachmentCache(self.directory)
+        cache.get_file_attachment(self.client, 2314, attachment_id=3)
+        self.mock.versions[3] = 2
+        cache.get_file_attachment(self.client, 2314, attachment_id=3)
+        self.assertEqual(self.mock.downloads, 2)
+        # the same data is only kept once
+        self.assertEqual(cache.stats()["files"], 1)
+
+        cache.get_file_attachment(self.client, 2314, attachment_id=3, version=2)
+        self.assertEqual(self.mock.downloads, 2)
+
+    def test_lru_eviction(self):
+        cache = AttachmentCache(self.directory, max_size=len(CONTENTS[3]) + len(CONTENTS[4]))
+        cache.get_file_attachment(self.client, 2314, attachment_id=3)
+        cache.get_file_attachment(self.client, 2314, attachment_id=4)
+        cache.get_file_attachment(self.client, 2314, attachment_id=3)
+        cache.get_file_attachment(self.client, 2314, attachment_id=2)
+        self.assertEqual(cache.stats()["size"], len(CONTENTS[3]) + len(CONTENTS[2]))
+
+        cache.get_file_attachment(self.client, 2314, attachment_id=3)
+        self.assertEqual(self.mock.downloads, 3)
+        cache.get_file_attachment(self.client, 2314, attachment_id=4)
+        self.assertEqual(self.mock.downloads, 4)
+
+    def test_mmap(self):
+        cache = AttachmentCache(self.directory)
+        mapped = cache.get_mmap(self.client, 2314, artifact_id=7)
+        try:
+            self.assertEqual(len(mapped), len(CONTENTS[7]))
+            self.assertEqual(mapped[:100], CONTENTS[7][:100])
+            self.assertEqual(hashlib.md5(mapped).hexdigest(), hashlib.md5(CONTENTS[7]).hexdigest())
+        finally:
+            mapped.close()
+
+    def test_clear(self):
+        cache = AttachmentCache(self.directory)
+        path = cache.get_path(self.client, 2314, artifact_id=1)
+        cache.clear()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(cache.stats()["files"], 0)
+        cache.get_path(self.client, 2314, artifact_id=1)
+        self.assertEqual(self.mock.downloads, 2)
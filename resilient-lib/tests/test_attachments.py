@@ -0,0 +1,131 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import requests_mock
+import resilient
+from resilient.resilient_rest_mock import ResilientMock, resilient_endpoint
+from resilient_lib.components.resilient_common import get_file_attachments, get_file_attachment_hashes
+
+CONTENTS = dict((n, os.urandom(1000 * n)) for n in range(1, 9))
+
+
+class AttachmentsMock(ResilientMock):
+    """ Mock of incident attachments and artifacts, that records the most calls in progress at once """
+
+    def __init__(self, *args, **kwargs):
+        super(AttachmentsMock, self).__init__(*args, **kwargs)
+        self.versions = {}
+        self.downloads = 0
+        self.in_progress = 0
+        self.most_in_progress = 0
+        self.lock = threading.Lock()
+
+    def _slowly(self, response):
+        with self.lock:
+            self.in_progress += 1
+            self.most_in_progress = max(self.most_in_progress, self.in_progress)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_progress -= 1
+        return response
+
+    @resilient_endpoint("POST", "/rest/session")
+    def session_post(self, request):
+        return requests_mock.create_response(request, status_code=200,
+                                             headers={"Set-Cookie": "JSESSIONID=FakeSessionId; Path=/"},
+                                             json={"csrf_token": "token", "user_id": 1,
+                                                   "orgs": [{"enabled": True, "id": 201, "name": self.org_name}]})
+
+    @resilient_endpoint("GET", "/(attachments|artifacts)/[0-9]+$")
+    def attachment_get(self, request):
+        object_id = int(request.path.rsplit("/", 1)[1])
+        if object_id not in CONTENTS:
+            return requests_mock.create_response(request, status_code=404, json={"message": "not found"})
+        name = "file{}.bin".format(object_id)
+        vers = self.versions.get(object_id, 1)
+        dto = {"attachment": {"name": name}, "vers": vers} if "/artifacts/" in request.path else \
+            {"name": name, "vers": vers}
+        return self._slowly(requests_mock.create_response(request, status_code=200, json=dto))
+
+    @resilient_endpoint("GET", "/(attachments|artifacts)/[0-9]+/contents$")
+    def attachment_contents_get(self, request):
+        object_id = int(re.search(r"/([0-9]+)/contents$", request.path).group(1))
+        with self.lock:
+            self.downloads += 1
+        return self._slowly(requests_mock.create_response(request, status_code=200, content=CONTENTS[object_id]))
+
+
+class TestGetFileAttachments(unittest.TestCase):
+    """ Tests for getting several attachments at once, against a mock """
+
+    def setUp(self):
+        self.mock = AttachmentsMock(org_name="Test Org")
+        self.client = resilient.SimpleClient(org_name="Test Org", base_url="https://resilient.example.com")
+        self.client.session.mount("https://", self.mock.adapter)
+        self.client.connect("api@example.com", "password")
+
+    def test_get_file_attachments(self):
+        refs = [(2314, None, None, n) for n in range(1, 5)]
+        refs.append({"incident_id": 2314, "artifact_id": 5})
+        refs.append((None, 7, None, 6))
+        refs.append((2314, None, None, 99))
+        refs.append((None, None, None, None))
+
+        results = list(get_file_attachments(self.client, refs, max_concurrency=3))
+        self.assertEqual(len(results), len(refs))
+        self.assertLessEqual(self.mock.most_in_progress, 3)
+        self.assertGreater(self.mock.most_in_progress, 1)
+
+        by_ref = dict((repr(result["ref"]), result) for result in results)
+        for ref, object_id in zip(refs[:6], range(1, 7)):
+            result = by_ref[repr(ref)]
+            self.assertIsNone(result["error"])
+            self.assertEqual(result["name"], "file{}.bin".format(object_id))
+            self.assertEqual(result["content"], CONTENTS[object_id])
+            self.assertEqual(result["size"], len(CONTENTS[object_id]))
+            self.assertIsNone(result["path"])
+
+        self.assertIsNotNone(by_ref[repr(refs[6])]["error"])
+        self.assertIsInstance(by_ref[repr(refs[7])]["error"], ValueError)
+
+    def test_download_dir(self):
+        download_dir = tempfile.mkdtemp()
+        try:
+            refs = [(2314, None, None, 1), (2314, None, 8, None)]
+            results = sorted(get_file_attachments(self.client, refs, download_dir=download_dir),
+                             key=lambda result: result["size"])
+
+            self.assertEqual(results[0]["path"], os.path.join(download_dir, "attachment-1-file1.bin"))
+            self.assertEqual(results[1]["path"], os.path.join(download_dir, "artifact-8-file8.bin"))
+            for result, object_id in zip(results, (1, 8)):
+                self.assertIsNone(result["content"])
+                self.assertEqual(result["size"], len(CONTENTS[object_id]))
+                with open(result["path"], "rb") as infile:
+                    self.assertEqual(infile.read(), CONTENTS[object_id])
+        finally:
+            shutil.rmtree(download_dir)
+
+    def test_hashes(self):
+        refs = [(2314, None, None, 1), (2314, None, 8, None)]
+        download_dir = tempfile.mkdtemp()
+        try:
+            for directory in (None, download_dir):
+                for result in get_file_attachments(self.client, refs, download_dir=directory, hashes=["md5", "sha256"]):
+                    content = CONTENTS[result["ref"][2] or result["ref"][3]]
+                    self.assertEqual(result["hashes"], {"md5": hashlib.md5(content).hexdigest(),
+                                                        "sha256": hashlib.sha256(content).hexdigest()})
+        finally:
+            shutil.rmtree(download_dir)
+
+        hashes = get_file_attachment_hashes(self.client, 2314, artifact_id=3)
+        self.assertEqual(hashes, {"md5": hashlib.md5(CONTENTS[3]).hexdigest(),
+                                  "sha1": hashlib.sha1(CONTENTS[3]).hexdigest(),
+                                  "sha256": hashlib.sha256(CONTENTS[3]).hexdigest()})
+
+    def test_no_refs(self):
+        self.assertEqual(list(get_file_attachments(self.client, [])), [])
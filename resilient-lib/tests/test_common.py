@@ -1,6 +1,6 @@
 import unittest
 from resilient_lib.components.resilient_common import str_to_bool, readable_datetime, validate_fields, \
-    unescape, clean_html, build_incident_url, build_resilient_url, get_file_attachment, get_file_attachment_name
+    unescape, clean_html, HTMLTextExtractor, build_incident_url, build_resilient_url, get_file_attachment, get_file_attachment_name
 
 class TestFunctionMetrics(unittest.TestCase):
     """ Tests for the attachment_hash function"""
@@ -50,6 +50,29 @@ class TestFunctionMetrics(unittest.TestCase):
         self.assertEqual(clean_html("abc"), "abc")
         self.assertIsNone(clean_html(None))
 
+    def test_clean_html_like_beautifulsoup(self):
+        # the text is the same as BeautifulSoup(html, "html.parser").strings
+        self.assertEqual(clean_html("<p> a  &amp;amp; b </p>\n\n<p>c</p>"), " a  & b  \n c")
+        self.assertEqual(clean_html("<pre>  x\n  y </pre>  <b> </b>"), "  x\n  y     ")
+        self.assertEqual(clean_html("<script>var a='<b>';</script>text<style>p{}</style>more"), "text more")
+        self.assertEqual(clean_html("<!-- c -->a<!DOCTYPE html>b<![CDATA[ d ]]>e"), "a b  d  e")
+        self.assertEqual(clean_html("a&nbsp;b &#8220;q&#8221; &#x41;"), u"a\xa0b \u201cq\u201d A")
+        self.assertEqual(clean_html("<br>x</br>y<br/>z<b><i>w</b>v</i>"), "xy z w v")
+        self.assertEqual(clean_html("unfinished &#"), "unfinished &#")
+
+    def test_clean_html_normalize_whitespace(self):
+        self.assertEqual(clean_html("<div>\n  abc\n</div>\n<div>def  ghi </div>", normalize_whitespace=True),
+                         "abc def ghi")
+
+    def test_html_text_extractor(self):
+        extractor = HTMLTextExtractor()
+        extractor.feed("<div>abc</div><di")
+        self.assertEqual(extractor.pop_strings(), ["abc"])
+        extractor.feed("v>def</div><pre> gh")
+        extractor.feed("i </pre>")
+        extractor.close()
+        self.assertEqual(extractor.pop_strings(), ["def", " ghi "])
+
     def test_build_incident_url(self):
         url = build_incident_url(build_resilient_url("https://localhost", 8443), 12345)
         self.assertEqual(url, "https://localhost:8443/#incidents/12345")
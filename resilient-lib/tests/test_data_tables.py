@@ -0,0 +1,306 @@
+import json
+import threading
+import time
+import unittest
+import requests_mock
+import resilient
+from resilient.resilient_rest_mock import ResilientMock, resilient_endpoint
+from resilient_lib.components import data_tables
+from resilient_lib.components.data_tables import DataTableReader, DataTableWriter, get_data_table_reader, row_values
+
+
+class DataTableMock(ResilientMock):
+    """
+    Mock of an incident's data table, that can fail some calls and add latency.
+    Cells are by column name with handle_format=names, or else by column id (as the server does).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(DataTableMock, self).__init__(*args, **kwargs)
+        self.rows = {}
+        self.column_ids = {}
+        self.next_id = 1
+        self.calls = 0
+        self.latency = 0
+        # number of calls to fail (with failure_status) before succeeding
+        self.failures = 0
+        self.failure_status = 503
+        self.lock = threading.Lock()
+
+    def _respond(self, request, status_code=200, json=None):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls += 1
+            if self.failures:
+                self.failures -= 1
+                return requests_mock.create_response(request, status_code=self.failure_status, text="Failed")
+        return requests_mock.create_response(request, status_code=status_code, json=json)
+
+    def _names(self, request):
+        return request.qs.get("handle_format") == ["names"]
+
+    def _request_cells(self, request):
+        """ the cells of the request payload, by column name (or None if they aren't in the request's format) """
+        cells = json.loads(request.body)["cells"]
+        if self._names(request):
+            return cells
+        names = dict((str(column_id), name) for name, column_id in self.column_ids.items())
+        if not all(key in names for key in cells):
+            return None
+        return dict((names[key], cell) for key, cell in cells.items())
+
+    def _row(self, request, row):
+        """ the row as returned for the request: with the cells by column name or by column id """
+        if self._names(request):
+            return dict(row)
+        with self.lock:
+            for name in row["cells"]:
+                self.column_ids.setdefault(name, 1000 + len(self.column_ids))
+        return dict(row, cells=dict((str(self.column_ids[name]), cell) for name, cell in row["cells"].items()))
+
+    @resilient_endpoint("POST", "/rest/session")
+    def session_post(self, request):
+        return requests_mock.create_response(request, status_code=200,
+                                             headers={"Set-Cookie": "JSESSIONID=FakeSessionId; Path=/"},
+                                             json={"csrf_token": "token", "user_id": 1,
+                                                   "orgs": [{"enabled": True, "id": 201, "name": self.org_name}]})
+
+    @resilient_endpoint("GET", "/incidents/[0-9]+/table_data/[a-z_]+")
+    def table_get(self, request):
+        with self.lock:
+            rows = [dict(row) for row in self.rows.values()]
+        rows = [self._row(request, row) for row in sorted(rows, key=lambda row: row["id"])]
+        return self._respond(request, json={"id": 1000, "rows": rows})
+
+    @resilient_endpoint("POST", "/incidents/[0-9]+/table_data/[a-z_]+/row_data(\\?|$)")
+    def row_post(self, request):
+        response = self._respond(request)
+        if response.status_code != 200:
+            return response
+        cells = self._request_cells(request)
+        if cells is None:
+            return requests_mock.create_response(request, status_code=400, json={"message": "unknown column"})
+        with self.lock:
+            row = {"id": self.next_id, "version": 1, "cells": cells}
+            self.next_id += 1
+            self.rows[row["id"]] = row
+        return requests_mock.create_response(request, status_code=200, json=self._row(request, row))
+
+    @resilient_endpoint("PUT", "/incidents/[0-9]+/table_data/[a-z_]+/row_data/[0-9]+(\\?|$)")
+    def row_put(self, request):
+        response = self._respond(request)
+        if response.status_code != 200:
+            return response
+        cells = self._request_cells(request)
+        if cells is None:
+            return requests_mock.create_response(request, status_code=400, json={"message": "unknown column"})
+        row_id = int(request.path.rsplit("/", 1)[1])
+        with self.lock:
+            row = self.rows[row_id]
+            row["cells"] = dict(row["cells"], **cells)
+            row["version"] += 1
+        return requests_mock.create_response(request, status_code=200, json=self._row(request, row))
+
+    @resilient_endpoint("DELETE", "/incidents/[0-9]+/table_data/[a-z_]+/row_data/[0-9]+(\\?|$)")
+    def row_delete(self, request):
+        response = self._respond(request)
+        if response.status_code != 200:
+            return response
+        row_id = int(request.path.rsplit("/", 1)[1])
+        with self.lock:
+            if self.rows.pop(row_id, None) is None:
+                return requests_mock.create_response(request, status_code=404, json={"message": "not found"})
+        return requests_mock.create_response(request, status_code=200, json={"success": True})
+
+
+class TestDataTableWriter(unittest.TestCase):
+    """ Tests for writing data table rows, against a mock """
+
+    def setUp(self):
+        data_tables._readers.clear()
+        self.mock = DataTableMock(org_name="Test Org")
+        self.client = resilient.SimpleClient(org_name="Test Org", base_url="https://resilient.example.com")
+        self.client.session.mount("https://", self.mock.adapter)
+        self.client.connect("api@example.com", "password")
+        self.writer = DataTableWriter(self.client, 2314, "dt_results", max_concurrency=4, retry_backoff=0.01)
+
+    def _values(self):
+        return sorted((row_values(row) for row in self.mock.rows.values()), key=lambda values: values["ip"])
+
+    def test_insert_update_delete(self):
+        rows = [{"ip": "10.0.0.{}".format(n), "score": n} for n in range(20)]
+        results = self.writer.insert_rows(rows)
+        self.assertEqual([row_values(row) for row in results], rows)
+        self.assertEqual(len(self.mock.rows), 20)
+
+        results = self.writer.update_rows([(results[0]["id"], {"score": 100}), (results[1]["id"], {"score": 101})])
+        self.assertEqual(row_values(results[0]), {"ip": "10.0.0.0", "score": 100})
+        self.assertEqual(self.mock.rows[results[1]["id"]]["cells"]["score"]["value"], 101)
+
+        results = self.writer.delete_rows([results[0]["id"], 999])
+        self.assertEqual(results[0], {"success": True})
+        self.assertIsInstance(results[1], resilient.SimpleHTTPException)
+        self.assertEqual(len(self.mock.rows), 19)
+        self.assertEqual(self.writer.insert_rows([]), [])
+
+    def test_retry(self):
+        self.mock.failures = 3
+        results = self.writer.insert_rows([{"ip": "10.0.0.1", "score": 1}])
+        self.assertEqual(row_values(results[0]), {"ip": "10.0.0.1", "score": 1})
+        self.assertEqual(self.mock.calls, 4)
+
+        self.mock.failures = 10
+        results = DataTableWriter(self.client, 2314, "dt_results", retries=1, retry_backoff=0.01).insert_rows(
+            [{"ip": "10.0.0.2"}])
+        self.assertIsInstance(results[0], resilient.SimpleHTTPException)
+        self.assertEqual(len(self.mock.rows), 1)
+
+    def test_no_retry_of_insert(self):
+        """An insert that may have been made (such as with a 502) isn't made again, but an update is"""
+        self.mock.failure_status = 502
+        self.mock.failures = 1
+        results = self.writer.insert_rows([{"ip": "10.0.0.1", "score": 1}])
+        self.assertIsInstance(results[0], resilient.SimpleHTTPException)
+        self.assertEqual(self.mock.calls, 1)
+
+        row = self.writer.insert_rows([{"ip": "10.0.0.1", "score": 1}])[0]
+        self.mock.failures = 1
+        results = self.writer.update_rows([(row["id"], {"score": 2})])
+        self.assertEqual(row_values(results[0]), {"ip": "10.0.0.1", "score": 2})
+        self.assertEqual(self.mock.calls, 4)
+
+    def test_upsert(self):
+        self.writer.insert_rows([{"ip": "10.0.0.1", "score": 1}, {"ip": "10.0.0.2", "score": 2}])
+        result = self.writer.upsert_rows([{"ip": "10.0.0.1", "score": 10},
+                                          {"ip": "10.0.0.2", "score": 2},
+                                          {"ip": "10.0.0.3", "score": 3}], key="ip")
+        self.assertEqual(len(result["inserted"]), 1)
+        self.assertEqual(len(result["updated"]), 1)
+        self.assertEqual(len(result["unchanged"]), 1)
+        self.assertEqual(self._values(), [{"ip": "10.0.0.1", "score": 10},
+                                          {"ip": "10.0.0.2", "score": 2},
+                                          {"ip": "10.0.0.3", "score": 3}])
+
+        with self.assertRaises(ValueError):
+            self.writer.upsert_rows([{"score": 4}], key="ip")
+
+    def test_concurrency(self):
+        self.mock.latency = 0.02
+        start = time.time()
+        self.writer.insert_rows([{"ip": "10.0.0.{}".format(n)} for n in range(40)])
+        # 40 calls of 20ms, 4 at a time
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(len(self.mock.rows), 40)
+
+
+class TestDataTableReader(unittest.TestCase):
+    """ Tests for indexed lookups in data tables, against a mock """
+
+    def setUp(self):
+        data_tables._readers.clear()
+        self.mock = DataTableMock(org_name="Test Org")
+        self.client = resilient.SimpleClient(org_name="Test Org", base_url="https://resilient.example.com")
+        self.client.session.mount("https://", self.mock.adapter)
+        self.client.connect("api@example.com", "password")
+        self.writer = DataTableWriter(self.client, 2314, "dt_results")
+        self.writer.insert_rows([{"ip": "10.0.0.{}".format(n), "score": n % 3, "tags": ["a", str(n)]}
+                                 for n in range(30)])
+        self.mock.calls = 0
+
+    def test_lookup(self):
+        reader = DataTableReader(self.client, 2314, "dt_results", index_columns=["ip"])
+        self.assertTrue(reader.contains("ip", "10.0.0.5"))
+        self.assertFalse(reader.contains("ip", "10.0.0.99"))
+        self.assertEqual(len(reader.lookup("score", 1)), 10)
+        self.assertEqual(row_values(reader.lookup("tags", ["a", "7"])[0])["ip"], "10.0.0.7")
+        self.assertEqual(len(reader.get_rows()), 30)
+        # one fetch for all the lookups
+        self.assertEqual(self.mock.calls, 1)
+        self.assertEqual(reader.fetches, 1)
+
+        reader.invalidate()
+        self.assertTrue(reader.contains("ip", "10.0.0.5"))
+        self.assertEqual(reader.fetches, 2)
+
+    def test_ttl(self):
+        reader = DataTableReader(self.client, 2314, "dt_results", ttl=0.05)
+        reader.contains("ip", "10.0.0.5")
+        reader.contains("ip", "10.0.0.6")
+        self.assertEqual(reader.fetches, 1)
+        time.sleep(0.06)
+        reader.contains("ip", "10.0.0.5")
+        self.assertEqual(reader.fetches, 2)
+
+    def test_shared_reader_applies_writes(self):
+        reader = get_data_table_reader(self.client, 2314, "dt_results")
+        self.assertIs(reader, get_data_table_reader(self.client, 2314, "dt_results"))
+        self.assertIsNot(reader, get_data_table_reader(self.client, 2315, "dt_results"))
+        self.assertFalse(reader.contains("ip", "10.0.0.99"))
+        row_id = reader.lookup("ip", "10.0.0.1")[0]["id"]
+
+        self.writer.insert_rows([{"ip": "10.0.0.99", "score": 0}])
+        self.writer.update_rows([(row_id, {"ip": "10.0.0.101"})])
+        self.writer.delete_rows([reader.lookup("ip", "10.0.0.2")[0]["id"]])
+
+        self.assertTrue(reader.contains("ip", "10.0.0.99"))
+        self.assertFalse(reader.contains("ip", "10.0.0.1"))
+        self.assertEqual(row_values(reader.lookup("ip", "10.0.0.101")[0])["score"], 1)
+        self.assertFalse(reader.contains("ip", "10.0.0.2"))
+        self.assertEqual(len(reader.lookup("score", 0)), 11)
+        self.assertEqual(reader.fetches, 1)
+
+        # an older version of a row doesn't replace the current one
+        older = dict(reader.lookup("ip", "10.0.0.101")[0], version=1, cells={"ip": {"value": "10.0.0.1"}})
+        reader.apply_row(older)
+        self.assertTrue(reader.contains("ip", "10.0.0.101"))
+
+    def test_lookup_after_insert(self):
+        """Inserted rows are applied to the shared reader with their cells by column name"""
+        reader = get_data_table_reader(self.client, 2314, "dt_results")
+        self.assertFalse(reader.contains("ip", "10.0.0.98"))
+        self.writer.insert_rows([{"ip": "10.0.0.98", "score": 7}])
+
+        rows = reader.lookup("ip", "10.0.0.98")
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(row_values(rows[0]), {"ip": "10.0.0.98", "score": 7})
+        self.assertEqual(len(reader.lookup("score", 7)), 1)
+        self.assertEqual(reader.fetches, 1)
+
+        # the server returns cells by column id without handle_format=names
+        self.assertNotIn("ip", self.client.get("/incidents/2314/table_data/dt_results")["rows"][0]["cells"])
+
+    def test_shared_reader_eviction(self):
+        """The shared readers are bounded: the least recently used is dropped, and so is one idle for its ttl"""
+        max_readers = data_tables.MAX_TABLE_READERS
+        data_tables.MAX_TABLE_READERS = 2
+        try:
+            # a writer doesn't keep a reader of its own
+            self.assertEqual(len(data_tables._readers), 0)
+            first = get_data_table_reader(self.client, 1, "dt_results")
+            second = get_data_table_reader(self.client, 2, "dt_results")
+            self.assertIs(first, get_data_table_reader(self.client, 1, "dt_results"))
+            get_data_table_reader(self.client, 3, "dt_results")
+            self.assertEqual(len(data_tables._readers), 2)
+            self.assertIs(first, get_data_table_reader(self.client, 1, "dt_results"))
+            self.assertIsNot(second, get_data_table_reader(self.client, 2, "dt_results"))
+
+            # a later ttl applies to the shared reader, and it's dropped when it isn't used for it
+            idle = get_data_table_reader(self.client, 1, "dt_results", ttl=0.05)
+            self.assertIs(idle, first)
+            self.assertEqual(idle.ttl, 0.05)
+            time.sleep(0.1)
+            get_data_table_reader(self.client, 2, "dt_results")
+            self.assertEqual(len(data_tables._readers), 1)
+            self.assertIsNot(idle, get_data_table_reader(self.client, 1, "dt_results"))
+        finally:
+            data_tables.MAX_TABLE_READERS = max_readers
+
+    def test_upsert_with_shared_reader(self):
+        self.writer.upsert_rows([{"ip": "10.0.0.1", "score": 1}, {"ip": "10.0.0.50", "score": 1}], key="ip")
+        self.mock.calls = 0
+        result = self.writer.upsert_rows([{"ip": "10.0.0.50", "score": 1}, {"ip": "10.0.0.51", "score": 1}],
+                                         key="ip", refresh=False)
+        self.assertEqual(len(result["unchanged"]), 1)
+        self.assertEqual(len(result["inserted"]), 1)
+        # only the insert
+        self.assertEqual(self.mock.calls, 1)
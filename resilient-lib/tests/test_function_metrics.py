@@ -1,5 +1,12 @@
+import json
+import os
+import shutil
+import tempfile
 import unittest
+import requests_mock
+from resilient_lib.components import function_metrics, requests_common
 from resilient_lib.components.function_metrics import FunctionMetrics
+from resilient_lib.components.requests_common import RequestsCommon
 
 
 class TestFunctionMetrics(unittest.TestCase):
@@ -29,3 +36,82 @@ class TestFunctionMetrics(unittest.TestCase):
         self.assertIsNotNone(result['execution_time_ms'])
         self.assertIsNotNone(result['timestamp'])
 
+
+    def test_resource_metrics(self):
+        fm = FunctionMetrics("requests")
+        sum(x * x for x in range(200000))
+        result = fm.finish()
+
+        self.assertEqual(result['version'], '1.2')
+        self.assertGreaterEqual(result['cpu_time_ms'], 0)
+        self.assertGreaterEqual(result['peak_memory_delta_kb'], 0)
+        self.assertEqual(result['http_calls'], 0)
+        self.assertEqual(result['outbound_bytes'], 0)
+
+    def test_outbound_calls(self):
+        rc = RequestsCommon()
+        fm = FunctionMetrics("requests")
+        with requests_mock.Mocker() as mock:
+            mock.post("https://example.com/api", text="12345")
+            rc.execute_call("post", "https://example.com/api", {"a": 1}, resp_type="text")
+            rc.execute_call("post", "https://example.com/api", {"a": 1}, resp_type="text")
+        result = fm.finish()
+
+        self.assertEqual(result['http_calls'], 2)
+        self.assertEqual(result['outbound_bytes'], 2 * len(b'{"a": 1}'))
+        self.assertEqual(result['inbound_bytes'], 10)
+
+    def test_calls_in_other_threads(self):
+        """Calls made in pool threads for the function are counted for it, not for the pool threads"""
+        rc = RequestsCommon()
+        fm = FunctionMetrics("requests")
+        with requests_mock.Mocker() as mock:
+            mock.get("https://example.com/api", text="12345")
+            rc.execute_many([{"verb": "get", "url": "https://example.com/api", "resp_type": "text"}] * 3)
+            if requests_common.asyncio is not None:
+                loop = requests_common.asyncio.new_event_loop()
+                try:
+                    loop.run_until_complete(rc.execute_call_async("get", "https://example.com/api", None,
+                                                                  loop=loop, resp_type="text"))
+                finally:
+                    loop.close()
+        result = fm.finish()
+
+        calls = 4 if requests_common.asyncio is not None else 3
+        self.assertEqual(result['http_calls'], calls)
+        self.assertEqual(result['inbound_bytes'], calls * 5)
+
+    def test_summary(self):
+        function_metrics.reset_metrics_summary()
+        for _ in range(10):
+            FunctionMetrics("requests").finish(success=True)
+        FunctionMetrics("requests").finish(success=False)
+        FunctionMetrics("missing").finish()
+
+        summary = function_metrics.get_metrics_summary("requests")
+        self.assertEqual(summary['count'], 11)
+        self.assertEqual(summary['failures'], 1)
+        self.assertIsNotNone(summary['execution_time_ms']['p50'])
+        self.assertIsNotNone(summary['execution_time_ms']['p99'])
+        self.assertEqual(sorted(function_metrics.get_metrics_summary()), ['missing', 'requests'])
+        self.assertIsNone(function_metrics.get_metrics_summary("other"))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(function_metrics._percentile(values, 50), 50)
+        self.assertEqual(function_metrics._percentile(values, 95), 95)
+        self.assertEqual(function_metrics._percentile(values, 99), 99)
+        self.assertEqual(function_metrics._percentile([7], 99), 7)
+        self.assertIsNone(function_metrics._percentile([], 50))
+
+    def test_save_summary(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "metrics.json")
+            function_metrics.reset_metrics_summary()
+            FunctionMetrics("requests").finish()
+            function_metrics.save_metrics_summary(path)
+            with open(path) as infile:
+                self.assertEqual(json.load(infile)['requests']['count'], 1)
+        finally:
+            shutil.rmtree(directory)
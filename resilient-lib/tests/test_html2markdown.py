@@ -308,3 +308,40 @@ this is line 3</blockquote></div>"""
         parser = MarkdownParser(bullets=["*", "+", "-"])
         converted_mixed = parser.convert(data)
         self.assertEqual(converted_mixed, markdown)
+
+    def test_reuse(self):
+        data = """<div><ul><li>a<ul><li>b</li></ul></li></ul></div>"""
+        parser = MarkdownParser(bullets=["-", "+"])
+        first = parser.convert(data)
+        self.assertEqual(parser.convert(data), first)
+        self.assertEqual(parser.list_bullets, ["-", "+"])
+
+        # a failed conversion doesn't affect the next one
+        with self.assertRaises(ValueError):
+            parser.convert("<div><ul><li>a</ul></div>")
+        self.assertEqual(parser.convert(data), first)
+
+    def test_convert_many(self):
+        parser = MarkdownParser()
+        data = ["<div><strong>one</strong></div>", None, "<div><em>two</em></div>"]
+        self.assertEqual(parser.convert_many(data), ["**one**", None, "*two*"])
+
+    def test_convert_stream(self):
+        data = """<div class="rte"><div><strong>bold</strong> text &amp; more</div><div><br/></div>""" \
+               """<ol><li>one</li><li>two</li></ol><div style="color: rgb(255,0,0);">red</div></div>"""
+        parser = MarkdownParser()
+        expected = parser.convert(data)
+        for size in (1, 7, 50, len(data)):
+            chunks = [data[i:i + size] for i in range(0, len(data), size)]
+            self.assertEqual("".join(parser.convert_stream(chunks)), expected)
+
+    def test_threads(self):
+        from multiprocessing.pool import ThreadPool
+        parser = MarkdownParser()
+        data = ["<div><ul><li>item {0}</li><li><strong>{0}</strong></li></ul></div>".format(n) for n in range(200)]
+        expected = [MarkdownParser().convert(item) for item in data]
+        pool = ThreadPool(8)
+        try:
+            self.assertEqual(pool.map(parser.convert, data), expected)
+        finally:
+            pool.close()
@@ -0,0 +1,54 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+import unittest
+from resilient_lib.components import multi_hash
+from resilient_lib.components.multi_hash import MultiHash, hash_stream, hash_file, hash_data
+
+DATA = os.urandom(300000)
+EXPECTED = dict((name, hashlib.new(name, DATA).hexdigest()) for name in ("md5", "sha1", "sha256"))
+
+
+class TestMultiHash(unittest.TestCase):
+    """ Tests for computing several digests in one pass """
+
+    def test_multi_hash(self):
+        digests = MultiHash()
+        for start in range(0, len(DATA), 4096):
+            digests.update(DATA[start:start + 4096])
+        self.assertEqual(digests.hexdigests(), EXPECTED)
+        self.assertEqual(digests.size, len(DATA))
+
+        self.assertEqual(MultiHash(["sha512"]).update(DATA).hexdigests(),
+                         {"sha512": hashlib.sha512(DATA).hexdigest()})
+        self.assertEqual(MultiHash([]).update(DATA).hexdigests(), {})
+        with self.assertRaises(ValueError):
+            MultiHash(["nosuchhash"])
+
+    def test_hash_stream(self):
+        self.assertEqual(hash_stream(io.BytesIO(DATA), chunk_size=1000), EXPECTED)
+        self.assertEqual(hash_stream(iter([DATA[:10], DATA[10:]]), hashes=["md5"]), {"md5": EXPECTED["md5"]})
+
+    def test_hash_file_and_mmap(self):
+        handle, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(handle, "wb") as outfile:
+                outfile.write(DATA)
+            self.assertEqual(hash_file(path), EXPECTED)
+            with open(path, "rb") as infile:
+                mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+                try:
+                    self.assertEqual(hash_data(mapped), EXPECTED)
+                finally:
+                    mapped.close()
+        finally:
+            os.remove(path)
+        self.assertEqual(hash_data(DATA), EXPECTED)
+
+    @unittest.skipIf(multi_hash.ssdeep is None, "requires ssdeep")
+    def test_ssdeep(self):
+        digests = hash_stream(io.BytesIO(DATA), hashes=["sha256", "ssdeep"])
+        self.assertEqual(digests["ssdeep"], multi_hash.ssdeep.hash(DATA))
+        self.assertEqual(digests["sha256"], EXPECTED["sha256"])
@@ -31,3 +31,22 @@ class TestFunctionMetrics(unittest.TestCase):
         self.assertEqual(result.get('metrics')['package'], pgkname)
         self.assertIsNotNone(result.get('inputs'))
         self.assertEqual(result['inputs']['param1'], 'value1')
+
+    def test_raw_max_size(self):
+        result = {"result1": "x" * 100}
+        result_dumps = json.dumps(result)
+
+        payload = ResultPayload("requests").done(True, result, raw_max_size=len(result_dumps))
+        self.assertEqual(payload['raw'], result_dumps)
+
+        payload = ResultPayload("requests").done(True, result, raw_max_size=len(result_dumps) - 1)
+        self.assertIsNone(payload['raw'])
+        self.assertEqual(payload['content'], result)
+
+        payload = ResultPayload("requests").done(True, result, raw_max_size=0)
+        self.assertIsNone(payload['raw'])
+
+        # there's no limit unless one is given
+        big = {"result1": "x" * 100000}
+        self.assertEqual(ResultPayload("requests").done(True, big)['raw'], json.dumps(big))
+        self.assertEqual(ResultPayload("requests").done(True, big, raw_max_size=None)['raw'], json.dumps(big))
@@ -0,0 +1,109 @@
+import time
+import unittest
+import requests_mock
+from resilient_lib.components import rate_limit
+from resilient_lib.components.rate_limit import TokenBucket, parse_rate, retry_after
+from resilient_lib.components.requests_common import RequestsCommon
+from resilient_lib.components.integration_errors import IntegrationError
+
+URL = "https://api.example.com/v1/lookup"
+
+
+class TestRateLimit(unittest.TestCase):
+    """ Tests for rate limits and retries in RequestsCommon, against a mock """
+
+    def setUp(self):
+        rate_limit._limiters.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/s"), (10, 1))
+        self.assertEqual(parse_rate("4/m"), (4, 60))
+        self.assertEqual(parse_rate("1000 / hour"), (1000, 3600))
+        self.assertEqual(parse_rate("5/15min"), (5, 900))
+        self.assertEqual(parse_rate("2.5"), (2.5, 1))
+        with self.assertRaises(ValueError):
+            parse_rate("10/fortnight")
+        with self.assertRaises(ValueError):
+            parse_rate("fast")
+        for value in ("0/s", "0", "0.0/min", "5/0s"):
+            with self.assertRaises(ValueError):
+                parse_rate(value)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(100, capacity=2)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        start = time.time()
+        self.assertGreater(bucket.acquire(), 0)
+        self.assertGreaterEqual(time.time() - start, 0.009)
+
+        bucket.pause(0.05)
+        start = time.time()
+        bucket.acquire()
+        self.assertGreaterEqual(time.time() - start, 0.04)
+
+    def test_shared_by_host(self):
+        opts = {"integrations": {"rate_limit": "10/s"}}
+        limiter = RequestsCommon(opts).get_rate_limiter(URL)
+        self.assertIs(limiter, RequestsCommon(opts).get_rate_limiter("https://API.example.com/other"))
+        self.assertIsNot(limiter, RequestsCommon(opts).get_rate_limiter("https://other.example.com/"))
+        self.assertIsNone(RequestsCommon().get_rate_limiter(URL))
+
+    def test_shared_by_function(self):
+        function_opts = {"rate_limit": "4/m", "rate_limit_scope": "function", "api_key": "abc"}
+        limiter = RequestsCommon(None, function_opts).get_rate_limiter(URL)
+        self.assertIs(limiter, RequestsCommon(None, dict(function_opts)).get_rate_limiter("https://other.example.com/"))
+        self.assertIsNot(limiter, RequestsCommon(None, dict(function_opts, api_key="def")).get_rate_limiter(URL))
+
+    def test_retry_after(self):
+        rc = RequestsCommon(None, {"retry": "2", "retry_backoff": "0.01"})
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, [{"status_code": 429, "headers": {"Retry-After": "0"}},
+                           {"status_code": 503},
+                           {"json": {"value": 1}}])
+            self.assertEqual(rc.execute_call("get", URL, None), {"value": 1})
+        self.assertEqual(mock.call_count, 3)
+
+    def test_retries_exhausted(self):
+        rc = RequestsCommon({"integrations": {"retry": "1", "retry_backoff": "0", "rate_limit": "100/s"}})
+        with requests_mock.Mocker() as mock:
+            mock.post(URL, status_code=429, text="slow down")
+            with self.assertRaises(IntegrationError):
+                rc.execute_call("post", URL, {"value": 1})
+        self.assertEqual(mock.call_count, 2)
+
+    def test_no_retry_of_post_503(self):
+        """The server may have acted on a POST that got a 503, so it's only retried if the caller says so"""
+        with requests_mock.Mocker() as mock:
+            mock.post(URL, [{"status_code": 503}, {"json": {"value": 1}}])
+            rc = RequestsCommon(None, {"retry": "2", "retry_backoff": "0"})
+            self.assertEqual(rc.execute_call("post", URL, {}, callback=lambda resp: resp.status_code), 503)
+            self.assertEqual(mock.call_count, 1)
+
+            rc = RequestsCommon(None, {"retry": "2", "retry_backoff": "0", "retry_non_idempotent": "true"})
+            self.assertEqual(rc.execute_call("post", URL, {}, callback=lambda resp: resp.status_code), 200)
+            self.assertEqual(mock.call_count, 2)
+
+    def test_retry_max_delay(self):
+        rc = RequestsCommon(None, {"retry": "1", "retry_max_delay": "0.01"})
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, [{"status_code": 429, "headers": {"Retry-After": "3600"}}, {"json": {"value": 1}}])
+            start = time.time()
+            self.assertEqual(rc.execute_call("get", URL, None), {"value": 1})
+            self.assertLess(time.time() - start, 1)
+
+    def test_no_retry(self):
+        rc = RequestsCommon()
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, status_code=429)
+            self.assertEqual(rc.execute_call("get", URL, None, callback=lambda resp: resp.status_code), 429)
+        self.assertEqual(mock.call_count, 1)
+
+    def test_retry_after_header(self):
+        class Resp(object):
+            def __init__(self, headers):
+                self.headers = headers
+        self.assertEqual(retry_after(Resp({"Retry-After": "5"}), 1), 5)
+        self.assertEqual(retry_after(Resp({}), 1), 1)
+        self.assertEqual(retry_after(Resp({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}), 1), 0)
+        self.assertEqual(retry_after(Resp({"Retry-After": "soon"}), 2), 2)
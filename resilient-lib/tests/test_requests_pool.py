@@ -0,0 +1,130 @@
+import unittest
+import requests_mock
+from resilient_lib.components import requests_common
+from resilient_lib.components.requests_common import RequestsCommon
+from resilient_lib.components.integration_errors import IntegrationError
+
+
+class TestRequestsPool(unittest.TestCase):
+    """ Tests for the pooled sessions used by RequestsCommon, against a mock """
+
+    def setUp(self):
+        requests_common._sessions.clear()
+
+    def test_session_per_host(self):
+        rc = RequestsCommon()
+        session = rc.get_session("https://example.com/api/one")
+        self.assertIs(session, rc.get_session("https://EXAMPLE.com/api/two?x=1"))
+        self.assertIs(session, RequestsCommon().get_session("https://example.com/"))
+        self.assertIsNot(session, rc.get_session("https://example.org/"))
+        self.assertIsNot(session, rc.get_session("http://example.com/"))
+
+    def test_pool_options(self):
+        opts = {"integrations": {"http_pool_size": "4", "http_keepalive": "30", "http_retries": "2"}}
+        rc = RequestsCommon(opts)
+        session = rc.get_session("https://example.com/")
+        self.assertIsNot(session, RequestsCommon().get_session("https://example.com/"))
+
+        adapter = session.get_adapter("https://example.com/")
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertTrue(adapter.socket_options)
+
+    def test_proxies_computed_once(self):
+        opts = {"integrations": {"https_proxy": "https://proxy.example.com"}}
+        rc = RequestsCommon(opts)
+        proxies = rc.get_proxies()
+        opts["integrations"]["https_proxy"] = "https://other.example.com"
+        self.assertIs(rc.get_proxies(), proxies)
+        self.assertEqual(proxies["https"], "https://proxy.example.com")
+
+    def test_execute_call(self):
+        rc = RequestsCommon()
+        with requests_mock.Mocker() as mock:
+            mock.get("https://example.com/api", json={"value": 1},
+                     headers={"Set-Cookie": "session=abc; Path=/"})
+            mock.post("https://example.com/api", json={"value": 2})
+
+            self.assertEqual(rc.execute_call("get", "https://example.com/api", {"q": "x"}), {"value": 1})
+            self.assertEqual(rc.execute_call("post", "https://example.com/api", {"q": "x"}), {"value": 2})
+
+            self.assertEqual(mock.request_history[0].qs, {"q": ["x"]})
+            self.assertEqual(mock.request_history[1].json(), {"q": "x"})
+            # cookies are not shared between calls
+            self.assertNotIn("Cookie", mock.request_history[1].headers)
+
+
+class TestRequestsMany(unittest.TestCase):
+    """ Tests for concurrent calls with RequestsCommon, against a mock """
+
+    def test_execute_many(self):
+        rc = RequestsCommon()
+        with requests_mock.Mocker() as mock:
+            for n in range(20):
+                mock.get("https://example.com/item/{}".format(n), json={"item": n})
+            mock.get("https://example.com/item/missing", status_code=404, text="not found")
+
+            calls = [("get", "https://example.com/item/{}".format(n), None) for n in range(20)]
+            calls.insert(5, {"verb": "get", "url": "https://example.com/item/missing"})
+            calls.append(("bad", "https://example.com/item/0", None))
+            results = rc.execute_many(calls, max_concurrency=4)
+
+        self.assertEqual(len(results), 22)
+        self.assertEqual(results[0], {"item": 0})
+        self.assertIsInstance(results[5], IntegrationError)
+        self.assertIn("not found", results[5].value)
+        self.assertEqual(results[6], {"item": 5})
+        self.assertEqual(results[20], {"item": 19})
+        self.assertIsInstance(results[21], IntegrationError)
+
+    def test_execute_many_callback(self):
+        rc = RequestsCommon()
+        with requests_mock.Mocker() as mock:
+            mock.get("https://example.com/", status_code=404)
+            results = rc.execute_many([{"verb": "get", "url": "https://example.com/",
+                                        "callback": lambda resp: resp.status_code}])
+        self.assertEqual(results, [404])
+        self.assertEqual(rc.execute_many([]), [])
+
+    @unittest.skipIf(requests_common.asyncio is None, "requires asyncio")
+    def test_execute_call_async(self):
+        asyncio = requests_common.asyncio
+        rc = RequestsCommon()
+        loop = asyncio.new_event_loop()
+        try:
+            with requests_mock.Mocker() as mock:
+                mock.get("https://example.com/one", json={"item": 1})
+                mock.get("https://example.com/two", status_code=500, text="error")
+                # both calls are made at once, each future is awaited in turn
+                # (gather no longer takes a loop argument)
+                futures = [rc.execute_call_async("get", "https://example.com/one", loop=loop),
+                           rc.execute_call_async("get", "https://example.com/two", loop=loop)]
+                results = []
+                for future in futures:
+                    try:
+                        results.append(loop.run_until_complete(future))
+                    except IntegrationError as err:
+                        results.append(err)
+        finally:
+            loop.close()
+        self.assertEqual(results[0], {"item": 1})
+        self.assertIsInstance(results[1], IntegrationError)
+
+    @unittest.skipIf(requests_common.asyncio is None, "requires asyncio")
+    def test_execute_call_async_running_loop(self):
+        """Without a loop argument, the call is made in the running loop"""
+        asyncio = requests_common.asyncio
+        rc = RequestsCommon()
+        loop = asyncio.new_event_loop()
+        futures = []
+        try:
+            with requests_mock.Mocker() as mock:
+                mock.get("https://example.com/one", json={"item": 1})
+                # make the call from a callback in the running loop
+                loop.call_soon(lambda: futures.append(rc.execute_call_async("get", "https://example.com/one")))
+                loop.call_soon(loop.stop)
+                loop.run_forever()
+                result = loop.run_until_complete(futures[0])
+        finally:
+            loop.close()
+        self.assertEqual(result, {"item": 1})
@@ -0,0 +1,108 @@
+import time
+import unittest
+import requests_mock
+from resilient_lib.components import response_cache
+from resilient_lib.components.requests_common import RequestsCommon
+from resilient_lib.components.response_cache import ResponseCache, parse_ttl_patterns
+
+URL = "https://api.example.com/v1/ip/1.2.3.4"
+
+
+def _rc(**options):
+    options["cache"] = "true"
+    return RequestsCommon({"integrations": options})
+
+
+class TestResponseCache(unittest.TestCase):
+    """ Tests for the response cache used by RequestsCommon, against a mock """
+
+    def setUp(self):
+        response_cache._caches.clear()
+
+    def test_not_enabled(self):
+        rc = RequestsCommon({"integrations": {"cache_ttl": "60"}})
+        self.assertIsNone(rc.cache)
+        self.assertIsNone(rc.get_cache_stats())
+
+    def test_default_ttl(self):
+        rc = _rc(cache_ttl="60")
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, json={"score": 1})
+            self.assertEqual(rc.execute_call("get", URL, {"q": 1}), {"score": 1})
+            self.assertEqual(_rc(cache_ttl="60").execute_call("get", URL, {"q": 1}), {"score": 1})
+            self.assertEqual(rc.execute_call("get", URL, {"q": 2}), {"score": 1})
+            # other verbs are not cached
+            mock.post(URL, json={})
+            rc.execute_call("post", URL, {"q": 1})
+            rc.execute_call("post", URL, {"q": 1})
+        self.assertEqual(mock.call_count, 4)
+        self.assertEqual(rc.get_cache_stats(), {"hits": 1, "misses": 2, "revalidated": 0, "size": 2})
+
+    def test_no_ttl(self):
+        rc = _rc()
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, json={"score": 1})
+            rc.execute_call("get", URL, None)
+            rc.execute_call("get", URL, None)
+        self.assertEqual(mock.call_count, 2)
+
+    def test_cache_control(self):
+        rc = _rc(cache_ttl="60")
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, json={"score": 1}, headers={"Cache-Control": "no-store"})
+            mock.get(URL + "/max-age", json={"score": 2}, headers={"Cache-Control": "public, max-age=0"})
+            for _ in range(2):
+                rc.execute_call("get", URL, None)
+                rc.execute_call("get", URL + "/max-age", None)
+        self.assertEqual(mock.call_count, 4)
+
+    def test_ttl_patterns(self):
+        self.assertEqual(parse_ttl_patterns("a=b=1; c=2\n\nd = 3"), (("a=b", 1), ("c", 2), ("d", 3)))
+        rc = _rc(cache_ttl_patterns=r"/v1/ip/=60")
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, json={"score": 1})
+            mock.get("https://api.example.com/v1/domain/x", json={"score": 2})
+            for _ in range(2):
+                rc.execute_call("get", URL, None)
+                rc.execute_call("get", "https://api.example.com/v1/domain/x", None)
+        self.assertEqual(mock.call_count, 3)
+
+    def test_etag(self):
+        rc = _rc(cache_ttl="0")
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, json={"score": 1}, headers={"ETag": '"v1"'})
+            self.assertEqual(rc.execute_call("get", URL, None), {"score": 1})
+            mock.get(URL, status_code=304)
+            self.assertEqual(rc.execute_call("get", URL, None), {"score": 1})
+        self.assertEqual(mock.request_history[1].headers["If-None-Match"], '"v1"')
+        self.assertEqual(rc.get_cache_stats()["revalidated"], 1)
+
+    def test_headers_and_auth_in_key(self):
+        rc = _rc(cache_ttl="60")
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, json={"score": 1})
+            rc.execute_call("get", URL, None, headers={"X-Api-Key": "a"})
+            rc.execute_call("get", URL, None, headers={"X-Api-Key": "b"})
+            rc.execute_call("get", URL, None, basicauth=("user", "a"))
+            rc.execute_call("get", URL, None, basicauth=("user", "a"))
+        self.assertEqual(mock.call_count, 3)
+
+    def test_sqlite(self):
+        import tempfile, os, shutil
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, "responses.sqlite")
+            cache = ResponseCache(ttl=60, filename=filename)
+            with requests_mock.Mocker() as mock:
+                mock.get(URL, content=b"\x00\x01binary", headers={"Content-Type": "application/octet-stream"})
+                resp = cache.fetch("key", lambda headers: RequestsCommon().get_session(URL).get(URL))
+                self.assertEqual(resp.content, b"\x00\x01binary")
+
+            # another process, with its own memory cache
+            other = ResponseCache(ttl=60, filename=filename)
+            resp = other.fetch("key", lambda headers: self.fail("not cached"))
+            self.assertEqual(resp.content, b"\x00\x01binary")
+            self.assertEqual(resp.headers["content-type"], "application/octet-stream")
+            self.assertEqual(other.stats()["hits"], 1)
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,103 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import requests_mock
+import resilient
+from resilient.resilient_rest_mock import ResilientMock, resilient_endpoint
+from resilient_lib.components.requests_common import RequestsCommon
+from resilient_lib.components.response_stream import ResponseStream
+from resilient_lib.components.integration_errors import IntegrationError
+
+URL = "https://files.example.com/sample.bin"
+CONTENT = os.urandom(100000)
+
+
+class AttachmentMock(ResilientMock):
+    """ Mock that records the size of attachments that are posted """
+
+    def __init__(self, *args, **kwargs):
+        super(AttachmentMock, self).__init__(*args, **kwargs)
+        self.upload = None
+
+    @resilient_endpoint("POST", "/rest/session")
+    def session_post(self, request):
+        return requests_mock.create_response(request, status_code=200,
+                                             headers={"Set-Cookie": "JSESSIONID=FakeSessionId; Path=/"},
+                                             json={"csrf_token": "token", "user_id": 1,
+                                                   "orgs": [{"enabled": True, "id": 201, "name": self.org_name}]})
+
+    @resilient_endpoint("POST", "/incidents/[0-9]+/attachments$")
+    def attachment_post(self, request):
+        body = request.body
+        self.upload = body.read() if hasattr(body, "read") else b"".join(body)
+        return requests_mock.create_response(request, status_code=200, json={"id": 1})
+
+
+class TestResponseStream(unittest.TestCase):
+    """ Tests for streamed responses from RequestsCommon, against a mock """
+
+    def _stream(self, **kwargs):
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, body=io.BytesIO(CONTENT), headers={"Content-Type": "application/octet-stream"})
+            return RequestsCommon().execute_call("get", URL, None, resp_type="stream", **kwargs)
+
+    def test_iterate(self):
+        stream = self._stream(chunk_size=4096, hashes=["sha256", "md5"])
+        self.assertIsInstance(stream, ResponseStream)
+        chunks = list(stream)
+        self.assertEqual(len(chunks), 25)
+        self.assertEqual(b"".join(chunks), CONTENT)
+        self.assertEqual(stream.size, len(CONTENT))
+        self.assertEqual(stream.hexdigests(), {"sha256": hashlib.sha256(CONTENT).hexdigest(),
+                                               "md5": hashlib.md5(CONTENT).hexdigest()})
+
+    def test_read(self):
+        stream = self._stream(chunk_size=1000)
+        self.assertEqual(stream.read(10), CONTENT[:10])
+        self.assertEqual(stream.read(2500), CONTENT[10:2510])
+        self.assertEqual(b"".join(stream), CONTENT[2510:])
+        self.assertEqual(stream.read(), b"")
+
+    def test_download_to(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "sample.bin")
+            with requests_mock.Mocker() as mock:
+                mock.get(URL, body=io.BytesIO(CONTENT), headers={"Content-Type": "application/octet-stream"})
+                result = RequestsCommon().execute_call("get", URL, None, download_to=path, hashes=["sha1"])
+            self.assertEqual(result, {"path": path,
+                                      "size": len(CONTENT),
+                                      "content_type": "application/octet-stream",
+                                      "hashes": {"sha1": hashlib.sha1(CONTENT).hexdigest()}})
+            with open(path, "rb") as infile:
+                self.assertEqual(infile.read(), CONTENT)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_download_to_file(self):
+        outfile = io.BytesIO()
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, body=io.BytesIO(CONTENT))
+            result = RequestsCommon().execute_call("get", URL, None, download_to=outfile)
+        self.assertIsNone(result["path"])
+        self.assertEqual(outfile.getvalue(), CONTENT)
+
+    def test_error(self):
+        with requests_mock.Mocker() as mock:
+            mock.get(URL, status_code=404, text="not found")
+            with self.assertRaises(IntegrationError):
+                RequestsCommon().execute_call("get", URL, None, resp_type="stream")
+
+    def test_post_attachment(self):
+        mock = AttachmentMock(org_name="Test Org")
+        client = resilient.SimpleClient(org_name="Test Org", base_url="https://resilient.example.com")
+        client.session.mount("https://", mock.adapter)
+        client.connect("api@example.com", "password")
+
+        stream = self._stream(hashes=["sha256"])
+        client.post_attachment("/incidents/2314/attachments", None, filename="sample.bin", bytes_handle=stream)
+        self.assertIn(CONTENT, mock.upload)
+        self.assertEqual(stream.hexdigests()["sha256"], hashlib.sha256(CONTENT).hexdigest())
@@ -20,3 +20,4 @@ from .co3argparse import parse_parameters, ArgumentParser
 from .co3sslutil import match_hostname
 from .patch import Patch
 from .patch import PatchStatus
+from .session_cache import SessionCache
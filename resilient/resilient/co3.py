@@ -24,6 +24,8 @@ from requests_toolbelt.multipart.encoder import MultipartEncoder
 from cachetools import cachedmethod
 from cachetools.ttl import TTLCache
 from .co3base import ensure_unicode, get_proxy_dict, NoChange
+from .resilient_rest_mock import ResilientReplayMock
+from .session_cache import SessionCache
 
 try:
     # Python 3
@@ -93,6 +95,12 @@ def get_client(opts):
                           "proxies": proxy,
                           "base_url": url,
                           "verify": verify}
+    # 0 compresses every request body
+    if opts.get("request_compression_threshold") not in (None, ""):
+        simple_client_args["request_compression_threshold"] = int(opts["request_compression_threshold"])
+    if opts.get("session_cache"):
+        # Reuse the session from a previous run, if it is still valid
+        simple_client_args["session_cache"] = SessionCache(opts.get("session_cache_dir"))
     if opts.get("log_http_responses"):
         LOG.warn("Logging all HTTP Responses from Resilient to %s", opts["log_http_responses"])
         simple_client = LoggingSimpleClient
@@ -102,6 +110,13 @@ def get_client(opts):
 
     resilient_client = simple_client(**simple_client_args)
 
+    # Size the connection pool to the number of threads that share this client
+    pool_size = opts.get("rest_pool_size") or opts.get("num_workers")
+    resilient_client.configure_pool(maxsize=int(pool_size) if pool_size else None,
+                                    block=bool(opts.get("rest_pool_block")),
+                                    retries=int(opts.get("rest_retries") or 0),
+                                    keepalive=int(opts.get("rest_keepalive") or 0))
+
     if opts.get("resilient_mock"):
         # Use a Mock for the Resilient Rest API
         LOG.warn("Using Mock '%s' for Resilient REST API", opts["resilient_mock"])
@@ -113,9 +128,18 @@ def get_client(opts):
         mock_class = getattr(module, class_name)
         res_mock = mock_class(org_name=opts.get("org"), email=opts["email"])
         resilient_client.session.mount("https://", res_mock.adapter)
+    elif opts.get("replay_http_responses"):
+        # Replay the responses that were captured with log_http_responses
+        LOG.warn("Replaying Resilient REST API responses from %s", opts["replay_http_responses"])
+        res_mock = ResilientReplayMock(org_name=opts.get("org"), email=opts["email"],
+                                       capture_directory=opts["replay_http_responses"])
+        resilient_client.session.mount("https://", res_mock.adapter)
 
     userinfo = resilient_client.connect(opts["email"], opts["password"])
 
+    if opts.get("rest_preconnect"):
+        resilient_client.warm_up(int(opts["rest_preconnect"]))
+
     # Validate the org, and store org_id in the opts dictionary
     LOG.debug(json.dumps(userinfo, indent=2))
     if(len(userinfo["orgs"])) > 1 and opts.get("org") is None:
@@ -166,7 +190,8 @@ def _raise_if_error(response):
 class SimpleClient(co3base.BaseClient):
     """Python helper class for using the Resilient REST API."""
 
-    def __init__(self, org_name=None, base_url=None, proxies=None, verify=None, cache_ttl=240):
+    def __init__(self, org_name=None, base_url=None, proxies=None, verify=None, cache_ttl=240,
+                 request_compression_threshold=None, session_cache=None):
         """
 
         :param org_name: The name of the organization to use.
@@ -174,8 +199,14 @@ class SimpleClient(co3base.BaseClient):
         :param proxies: A dictionary of HTTP proxies to use, if any.
         :param verify: The path to a PEM file containing the trusted CAs, or False to disable all TLS verification
         :param cache_ttl: Time to live for cached API responses
+        :param request_compression_threshold: gzip JSON request bodies of at least this many bytes
+          (None to never compress).  Responses are always negotiated as gzip/deflate.
+        :param session_cache: A :class:`SessionCache`, to reuse a saved session instead of logging in
+          (the session is still validated with the server).
         """
-        super(SimpleClient, self).__init__(org_name, base_url, proxies, verify)
+        super(SimpleClient, self).__init__(org_name, base_url, proxies, verify,
+                                           request_compression_threshold=request_compression_threshold,
+                                           session_cache=session_cache)
         self.cache = TTLCache(maxsize=128, ttl=cache_ttl)
 
     def connect(self, email, password, timeout=None):
@@ -278,6 +309,25 @@ class SimpleClient(co3base.BaseClient):
             _raise_if_error(ex.get_response())
         return response
 
+    def get_content_stream(self, uri, co3_context_token=None, timeout=None):
+        """Gets the specified URI as a stream, so that large content (such as an attachment)
+        is never held in memory all at once.
+
+        :param uri: Relative URI of the resource to fetch.
+        :param co3_context_token: The Co3ContextToken from an Action Module message, if available.
+        :param timeout: optional timeout (seconds)
+        :return: The requests.Response, with the content not yet read.  Read it with iter_content(),
+          then close() it to release the connection.
+        :raises SimpleHTTPException: if an HTTP exception occurs.
+        """
+        # Call get_content_stream from BaseClient. Convert exception if there is any
+        response = None
+        try:
+            response = super(SimpleClient, self).get_content_stream(uri, co3_context_token, timeout)
+        except co3base.BasicHTTPException as ex:
+            _raise_if_error(ex.get_response())
+        return response
+
     def post(self, uri, payload, co3_context_token=None, timeout=None):
         """Posts to the specified URI.
 
@@ -304,11 +354,12 @@ class SimpleClient(co3base.BaseClient):
         """Internal method used to call the underlying server patch endpoint"""
         url = u"{0}/rest/orgs/{1}{2}".format(self.base_url, self.org_id, ensure_unicode(uri))
         if isinstance(patch, dict):
-            payload_json = json.dumps(patch)
+            payload_json, encoding_headers = self.make_json_body(patch)
         else:
-            payload_json = json.dumps(patch.to_dict())
+            payload_json, encoding_headers = self.make_json_body(patch.to_dict())
 
         hdrs = {"handle_format": "names"}
+        hdrs.update(encoding_headers or {})
         response = self._execute_request(self.session.patch,
                                          url,
                                          data=payload_json,
@@ -434,25 +485,37 @@ class SimpleClient(co3base.BaseClient):
         return response
 
     def post_attachment(self, uri, filepath,
-                        filename=None, mimetype=None, data=None, co3_context_token=None, timeout=None):
+                        filename=None, mimetype=None, data=None, co3_context_token=None, timeout=None,
+                        bytes_handle=None, progress_callback=None, retries=0):
         """
         Upload a file to the specified URI
         e.g. "/incidents/<id>/attachments" (for incident attachments)
         or,  "/tasks/<id>/attachments" (for task attachments)
 
+        The content is streamed from `filepath`, or from `bytes_handle`: bytes,
+        a file-like object, or an iterator of bytes chunks.
+
         :param uri: Relative URI of the resource to post.
-        :param filepath: the path of the file to post
-        :param filename: optional name of the file when posted
+        :param filepath: the path of the file to post, or None to post bytes_handle
+        :param filename: optional name of the file when posted (required with bytes_handle)
         :param mimetype: optional override for the guessed MIME type
         :param data: optional dict with additional MIME parts (not required for file attachments; used in artifacts)
         :param co3_context_token: the Co3ContextToken from an Action Module message, if available.
         :param timeout: optional timeout (seconds)
+        :param bytes_handle: the content to post, if there is no filepath
+        :param progress_callback: optional function called as `progress_callback(bytes_sent, total_bytes)`
+          while uploading; total_bytes is None when the length is not known
+        :param retries: number of times to re-send the content after a connection error
+          (not possible for a non-seekable stream or an iterator)
         """
         # Call BaseClient post_attachment. Convert exception if there is any
         response = None
         try:
             response = super(SimpleClient, self).post_attachment(uri, filepath, filename, mimetype, data,
-                                                                 co3_context_token, timeout)
+                                                                 co3_context_token, timeout,
+                                                                 bytes_handle=bytes_handle,
+                                                                 progress_callback=progress_callback,
+                                                                 retries=retries)
         except co3base.BasicHTTPException as ex:
             _raise_if_error(ex.get_response())
         return response
@@ -471,13 +534,13 @@ class SimpleClient(co3base.BaseClient):
         :raises SimpleHTTPException: if an HTTP exception occurs.
         """
         url = u"{0}/rest/search_ex".format(self.base_url)
-        payload_json = json.dumps(payload)
+        payload_json, encoding_headers = self.make_json_body(payload)
         response = self._execute_request(self.session.post,
                                          url,
                                          data=payload_json,
                                          proxies=self.proxies,
                                          cookies=self.cookies,
-                                         headers=self.make_headers(co3_context_token),
+                                         headers=self.make_headers(co3_context_token, encoding_headers),
                                          verify=self.verify,
                                          timeout=timeout)
         _raise_if_error(response)
@@ -572,9 +635,10 @@ class LoggingSimpleClient(SimpleClient):
                              url.path, url.params,
                              datetime.datetime.now().isoformat())).replace('/', '_').replace(':', '-')
         try:
+            response_json = json.dumps(response.json(), indent=2)
             with open(os.path.join(self.logging_directory,
                                    filename.format("JSON")), "w+") as logfile:
-                logfile.write(json.dumps(response.json(), indent=2))
+                logfile.write(response_json)
         except:
             with open(os.path.join(self.logging_directory,
                                    filename.format("DATA")), "w+b") as logfile:
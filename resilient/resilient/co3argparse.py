@@ -119,6 +119,14 @@ class ArgumentParser(argparse.ArgumentParser):
         default_proxy_user = self.getopt("resilient", "proxy_user")
         default_proxy_password = self.getopt("resilient", "proxy_password")
         default_stomp_prefetch_limit = int(self.getopt("resilient", "stomp_prefetch_limit") or 20)
+        default_request_compression_threshold = self.getopt("resilient", "request_compression_threshold")
+        default_rest_pool_size = self.getopt("resilient", "rest_pool_size")
+        default_rest_pool_block = (self.getopt("resilient", "rest_pool_block") or "").lower() in ("1", "true", "yes")
+        default_rest_retries = int(self.getopt("resilient", "rest_retries") or 0)
+        default_rest_keepalive = int(self.getopt("resilient", "rest_keepalive") or 0)
+        default_rest_preconnect = int(self.getopt("resilient", "rest_preconnect") or 0)
+        default_session_cache = (self.getopt("resilient", "session_cache") or "").lower() in ("1", "true", "yes")
+        default_session_cache_dir = self.getopt("resilient", "session_cache_dir")
 
         self.add_argument("--email",
                           default=default_email,
@@ -183,6 +191,47 @@ class ArgumentParser(argparse.ArgumentParser):
                           type=int,
                           help="MAX number of Action Module messages to send before ACK is required")
 
+        self.add_argument("--request-compression-threshold",
+                          default=default_request_compression_threshold,
+                          type=int,
+                          help="Gzip REST API request bodies of at least this many bytes "
+                               "(the Resilient server must accept Content-Encoding: gzip)")
+
+        self.add_argument("--rest-pool-size",
+                          default=default_rest_pool_size,
+                          type=int,
+                          help="Number of REST API connections to keep open "
+                               "(defaults to the number of function workers)")
+
+        self.add_argument("--rest-pool-block",
+                          default=default_rest_pool_block,
+                          action="store_true",
+                          help="Wait for a free REST API connection instead of opening an extra one")
+
+        self.add_argument("--rest-retries",
+                          default=default_rest_retries,
+                          type=int,
+                          help="Retry REST API requests after connection errors and 502/503/504 responses")
+
+        self.add_argument("--rest-keepalive",
+                          default=default_rest_keepalive,
+                          type=int,
+                          help="Enable TCP keep-alive on REST API connections, probing after this many idle seconds")
+
+        self.add_argument("--rest-preconnect",
+                          default=default_rest_preconnect,
+                          type=int,
+                          help="Number of REST API connections to open at startup")
+
+        self.add_argument("--session-cache",
+                          default=default_session_cache,
+                          action="store_true",
+                          help="Save the REST API session, and reuse it (while still valid) instead of logging in")
+
+        self.add_argument("--session-cache-dir",
+                          default=default_session_cache_dir,
+                          help="Directory for the saved REST API sessions (default ~/.resilient/sessions)")
+
     def parse_args(self, args=None, namespace=None):
         """
         Parse the configuration options and command-line arguments.
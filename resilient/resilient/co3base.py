@@ -4,18 +4,24 @@
 """Base client for Resilient REST API"""
 from __future__ import print_function
 
+import io
 import json
+import socket
 import ssl
 import mimetypes
 import os
 import sys
 import logging
 import unicodedata
+import zlib
+from multiprocessing.pool import ThreadPool
 import requests
 
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.poolmanager import PoolManager
-from requests_toolbelt.multipart.encoder import MultipartEncoder
+from requests.packages.urllib3.connection import HTTPConnection
+from requests.packages.urllib3.util.retry import Retry
+from requests_toolbelt.multipart.encoder import MultipartEncoder, MultipartEncoderMonitor
 
 try:
     # Python 3
@@ -26,6 +32,25 @@ except:
 
 LOG = logging.getLogger(__name__)
 
+# Size of the chunks read from a non-seekable attachment source
+UPLOAD_CHUNK_SIZE = 65536
+
+# Seconds to wait for each request that opens a connection ahead of time
+WARM_UP_TIMEOUT = 10
+
+# zlib level for gzip request bodies (favour speed; JSON compresses well at low levels)
+REQUEST_COMPRESSION_LEVEL = 3
+
+
+def keepalive_socket_options(idle=None):
+    """Socket options that enable TCP keep-alive, probing after `idle` seconds (where the platform allows)"""
+    options = list(HTTPConnection.default_socket_options)
+    options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    if idle and hasattr(socket, "TCP_KEEPIDLE"):
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle))
+        options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, idle))
+    return options
+
 
 class TLSHttpAdapter(HTTPAdapter):
     """
@@ -33,12 +58,32 @@ class TLSHttpAdapter(HTTPAdapter):
     Some environments default to SSLv3, so we need to specifically ask for
     the highest protocol version that both the client and server support.
     Despite the name, SSLv23 can select "TLS" protocols as well as "SSL".
+
+    The adapter can also enable TCP keep-alive on its pooled connections
+    (which SimpleClient.warm_up can open ahead of time).
     """
-    def init_poolmanager(self, connections, maxsize, block=False):
+    def __init__(self, *args, **kwargs):
+        # set before the base class creates the pool manager
+        self.socket_options = kwargs.pop("socket_options", None)
+        super(TLSHttpAdapter, self).__init__(*args, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        # save these values for pickling (as HTTPAdapter does)
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        if self.socket_options:
+            pool_kwargs["socket_options"] = self.socket_options
         self.poolmanager = PoolManager(num_pools=connections,
                                        maxsize=maxsize,
                                        block=block,
-                                       ssl_version=ssl.PROTOCOL_SSLv23)
+                                       ssl_version=ssl.PROTOCOL_SSLv23,
+                                       **pool_kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if self.socket_options:
+            proxy_kwargs.setdefault("socket_options", self.socket_options)
+        return super(TLSHttpAdapter, self).proxy_manager_for(proxy, **proxy_kwargs)
 
 
 class BasicHTTPException(Exception):
@@ -102,16 +147,54 @@ def get_proxy_dict(opts):
     return proxy
 
 
+class AttachmentReader(object):
+    """
+    Read-only view of a seekable stream, from its current position to the end.
+    MultipartEncoder streams this directly (without copying it into memory),
+    and it can be rewound to re-send the content.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.start = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        self.end = stream.tell()
+        stream.seek(self.start)
+
+    @property
+    def len(self):
+        """Number of bytes remaining (used by MultipartEncoder)"""
+        return self.end - self.stream.tell()
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def rewind(self):
+        self.stream.seek(self.start)
+
+    @staticmethod
+    def is_seekable(stream):
+        """True if the stream supports tell() and seek()"""
+        try:
+            stream.seek(stream.tell())
+            return True
+        except (AttributeError, IOError, OSError, ValueError):
+            return False
+
+
 class BaseClient(object):
     """Helper for using Resilient REST API."""
 
-    def __init__(self, org_name=None, base_url=None, proxies=None, verify=None):
+    def __init__(self, org_name=None, base_url=None, proxies=None, verify=None,
+                 request_compression_threshold=None, session_cache=None):
         """
         Args:
           org_name - the name of the organization to use.
           base_url - the base URL to use.
           proxies - HTTP proxies to use, if any.
           verify - The name of a PEM file to use as the list of trusted CAs.
+          request_compression_threshold - gzip JSON request bodies of at least this many bytes
+            (None to never compress).  Responses are always negotiated as gzip/deflate.
+          session_cache - a SessionCache, to reuse a saved session instead of logging in.
         """
         self.headers = {'content-type': 'application/json'}
         self.cookies = None
@@ -130,6 +213,8 @@ class BaseClient(object):
         if verify is None:
             self.verify = True
         self.authdata = None
+        self.request_compression_threshold = request_compression_threshold
+        self.session_cache = session_cache
         self.session = requests.Session()
         self.session.mount(u'https://', TLSHttpAdapter())
 
@@ -149,6 +234,10 @@ class BaseClient(object):
             u'email': ensure_unicode(email),
             u'password': ensure_unicode(password)
         }
+        if self.session_cache:
+            session = self._connect_cached(timeout=timeout)
+            if session:
+                return session
         return self._connect(timeout=timeout)
 
     def _connect(self, timeout=None):
@@ -161,6 +250,37 @@ class BaseClient(object):
                                      timeout=timeout)
         BasicHTTPException.raise_if_error(response)
         session = json.loads(response.text)
+        self._use_session(session, response.cookies['JSESSIONID'], session['csrf_token'])
+        if self.session_cache:
+            self.session_cache.save(self.base_url, self.org_name, self.authdata[u'email'],
+                                    self.cookies['JSESSIONID'], session['csrf_token'])
+        return session
+
+    def _connect_cached(self, timeout=None):
+        """Resume the session saved in the session cache, if it is still valid.
+           Returns the session, or None if there is no usable session in the cache.
+        """
+        email = self.authdata[u'email']
+        tokens = self.session_cache.load(self.base_url, self.org_name, email)
+        if not tokens:
+            return None
+        response = self.session.get(u"{0}/rest/session".format(self.base_url),
+                                    proxies=self.proxies,
+                                    cookies={'JSESSIONID': tokens['JSESSIONID']},
+                                    headers=self.make_headers(additional_headers={'X-sess-id': tokens['csrf_token']}),
+                                    verify=self.verify,
+                                    timeout=timeout)
+        if response.status_code != 200:
+            LOG.debug("Cached session is no longer valid (%s)", response.status_code)
+            self.session_cache.delete(self.base_url, self.org_name, email)
+            return None
+        session = json.loads(response.text)
+        self._use_session(session, tokens['JSESSIONID'], tokens['csrf_token'])
+        LOG.debug("Resumed cached session")
+        return session
+
+    def _use_session(self, session, jsessionid, csrf_token):
+        """Select the org from a session, and use its tokens for subsequent requests"""
         orgs = session['orgs']
         selected_org = None
         if orgs is None or len(orgs) == 0:
@@ -194,12 +314,11 @@ class BaseClient(object):
         self.org_id = selected_org['id']
 
         # set the X-sess-id token, which is used to prevent CSRF attacks.
-        self.headers['X-sess-id'] = session['csrf_token']
+        self.headers['X-sess-id'] = csrf_token
         self.cookies = {
-            'JSESSIONID': response.cookies['JSESSIONID']
+            'JSESSIONID': jsessionid
         }
         self.user_id = session["user_id"]
-        return session
 
     def make_headers(self, co3_context_token=None, additional_headers=None):
         """Makes a headers dict, including the X-Co3ContextToken (if co3_context_token is specified)."""
@@ -210,6 +329,87 @@ class BaseClient(object):
             headers.update(additional_headers)
         return headers
 
+    def configure_pool(self, maxsize=None, block=False, retries=0, keepalive=None):
+        """Mounts a TLS adapter with these connection pool settings.
+
+        Args:
+          maxsize - the number of connections to keep open to the server; size this to
+            (at least) the number of threads that share the client.  None for the default (10).
+          block - if True, threads wait for a free connection rather than open (and then discard)
+            connections beyond maxsize.
+          retries - number of times to retry after a connection error, or a 502/503/504 response
+            to an idempotent request, with exponential backoff.
+          keepalive - enable TCP keep-alive, probing idle connections after this many seconds.
+        """
+        adapter_args = {"pool_block": block}
+        if maxsize:
+            adapter_args["pool_maxsize"] = maxsize
+        if retries:
+            adapter_args["max_retries"] = Retry(total=retries,
+                                                backoff_factor=0.5,
+                                                status_forcelist=(502, 503, 504),
+                                                raise_on_status=False)
+        if keepalive:
+            adapter_args["socket_options"] = keepalive_socket_options(keepalive)
+        self.session.mount(u'https://', TLSHttpAdapter(**adapter_args))
+
+    def warm_up(self, count):
+        """Opens up to `count` pooled connections to the server ahead of time (no more than the pool keeps),
+        so that the first requests don't each pay for a TCP and TLS handshake.  It makes that many HEAD
+        requests at once; each takes its own connection, which then stays in the pool.
+        Failures are logged, not raised (the connections are opened on demand anyway).
+
+        Returns:
+          the number of requests that succeeded (the connections opened, if they were all concurrent).
+        """
+        adapter = self.session.get_adapter(self.base_url)
+        if not isinstance(adapter, TLSHttpAdapter):
+            # e.g. a mock
+            return 0
+        count = min(count, adapter._pool_maxsize)
+        if count <= 0:
+            return 0
+
+        def head(_):
+            try:
+                self.session.head(self.base_url, proxies=self.proxies, verify=self.verify,
+                                  timeout=WARM_UP_TIMEOUT, allow_redirects=False)
+                return True
+            except Exception as exc:
+                LOG.debug(u"Unable to pre-open a connection to %s: %s", self.base_url, exc)
+                return False
+
+        pool = ThreadPool(count)
+        try:
+            opened = sum(pool.map(head, range(count)))
+        finally:
+            pool.close()
+            pool.join()
+        if opened:
+            LOG.debug("Opened %d connections to %s", opened, self.base_url)
+        else:
+            LOG.warning(u"Unable to pre-open connections to %s", self.base_url)
+        return opened
+
+    def make_json_body(self, payload):
+        """Serializes a payload to JSON, gzip-compressed if it is at least request_compression_threshold bytes.
+
+        Returns:
+          (body, headers) - the request body, and additional headers (or None) for make_headers.
+        """
+        payload_json = json.dumps(payload)
+        threshold = self.request_compression_threshold
+        if threshold is None:
+            return payload_json, None
+        # the threshold is a number of bytes, as sent
+        payload_bytes = payload_json.encode('utf-8')
+        if len(payload_bytes) < threshold:
+            return payload_json, None
+        # wbits 16+MAX_WBITS writes the gzip header and trailer
+        compressor = zlib.compressobj(REQUEST_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        body = compressor.compress(payload_bytes) + compressor.flush()
+        return body, {'content-encoding': 'gzip'}
+
     def _execute_request(self, operation, url, **kwargs):
         """Execute a HTTP request.
            If unauthorized (likely due to a session timeout), retry.
@@ -217,9 +417,37 @@ class BaseClient(object):
         result = operation(url, **kwargs)
         if result.status_code == 401:  # unauthorized, re-auth and try again
             self._connect()
+            # with the new session's cookie and CSRF token
+            if kwargs.get("cookies") is not None:
+                kwargs["cookies"] = self.cookies
+            if kwargs.get("headers") is not None and 'X-sess-id' in self.headers:
+                kwargs["headers"] = dict(kwargs["headers"], **{'X-sess-id': self.headers['X-sess-id']})
             result = operation(url, **kwargs)
         return result
 
+    def refresh_session(self, timeout=None):
+        """Keeps the session alive, by getting the current session from the server.
+        If the session has expired, this re-authenticates.  Unlike creating a new client,
+        this keeps the pooled connections (and any cached responses).
+
+        Args:
+          timeout - number of seconds to wait for response
+        Returns:
+          The Resilient session object (dict)
+        Raises:
+          BasicHTTPException - if an HTTP exception occurs.
+        """
+        url = u"{0}/rest/session".format(self.base_url)
+        response = self._execute_request(self.session.get,
+                                         url,
+                                         proxies=self.proxies,
+                                         cookies=self.cookies,
+                                         headers=self.make_headers(),
+                                         verify=self.verify,
+                                         timeout=timeout)
+        BasicHTTPException.raise_if_error(response)
+        return json.loads(response.text)
+
     def get(self, uri, co3_context_token=None, timeout=None):
         """Gets the specified URI.  Note that this URI is relative to <base_url>/rest/orgs/<org_id>.  So
         for example, if you specify a uri of /incidents, the actual URL would be something like this:
@@ -272,6 +500,32 @@ class BaseClient(object):
         BasicHTTPException.raise_if_error(response)
         return response.content
 
+    def get_content_stream(self, uri, co3_context_token=None, timeout=None):
+        """Gets the specified URI as a stream, so that large content (such as an attachment)
+        is never held in memory all at once.  Note that this URI is relative to <base_url>/rest/orgs/<org_id>.
+
+        Args:
+          uri
+          co3_context_token
+          timeout: number of seconds to wait for response
+        Returns:
+          The requests.Response, with the content not yet read.  Read it with iter_content(),
+          then close() it to release the connection.
+        Raises:
+          BasicHTTPException - if an HTTP exception occurs.
+        """
+        url = u"{0}/rest/orgs/{1}{2}".format(self.base_url, self.org_id, ensure_unicode(uri))
+        response = self._execute_request(self.session.get,
+                                         url,
+                                         proxies=self.proxies,
+                                         cookies=self.cookies,
+                                         headers=self.make_headers(co3_context_token),
+                                         verify=self.verify,
+                                         timeout=timeout,
+                                         stream=True)
+        BasicHTTPException.raise_if_error(response)
+        return response
+
     def post(self, uri, payload, co3_context_token=None, timeout=None):
         """
         Posts to the specified URI.
@@ -290,70 +544,166 @@ class BaseClient(object):
           BasicHTTPException - if an HTTP exception occurs.
         """
         url = u"{0}/rest/orgs/{1}{2}".format(self.base_url, self.org_id, ensure_unicode(uri))
-        payload_json = json.dumps(payload)
+        payload_json, encoding_headers = self.make_json_body(payload)
         response = self._execute_request(self.session.post,
                                          url,
                                          data=payload_json,
                                          proxies=self.proxies,
                                          cookies=self.cookies,
-                                         headers=self.make_headers(co3_context_token),
+                                         headers=self.make_headers(co3_context_token, encoding_headers),
                                          verify=self.verify,
                                          timeout=timeout)
         BasicHTTPException.raise_if_error(response)
         return json.loads(response.text)
 
     def post_attachment(self, uri, filepath,
-                        filename=None, mimetype=None, data=None, co3_context_token=None, timeout=None):
+                        filename=None, mimetype=None, data=None, co3_context_token=None, timeout=None,
+                        bytes_handle=None, progress_callback=None, retries=0):
         """
         Upload a file to the specified URI
         e.g. "/incidents/<id>/attachments" (for incident attachments)
         or,  "/tasks/<id>/attachments" (for task attachments)
 
+        The content is streamed, so it is never held in memory all at once.
+        Instead of a file path, the content can be given as `bytes_handle`:
+        bytes, a file-like object (read from its current position), or an iterator
+        of bytes chunks.  A non-seekable file-like object or an iterator is sent
+        with chunked transfer-encoding, and can't be re-sent.
+
         :param uri: The REST URI for posting
-        :param filepath: the path of the file to post
-        :param filename: optional name of the file when posted
+        :param filepath: the path of the file to post, or None to post bytes_handle
+        :param filename: optional name of the file when posted (required with bytes_handle)
         :param mimetype: optional override for the guessed MIME type
         :param data: optional dict with additional MIME parts (not required for file attachments; used in artifacts)
         :param co3_context_token: Action Module context token, if responding to an Action Module event
         :param timeout: optional timeout (seconds)
+        :param bytes_handle: the content to post, if there is no filepath
+        :param progress_callback: optional function called as `progress_callback(bytes_sent, total_bytes)`
+            while uploading; total_bytes is None when the length is not known
+        :param retries: number of times to re-send the content after a connection error
         """
-        filepath = ensure_unicode(filepath)
+        if filepath:
+            filepath = ensure_unicode(filepath)
+        elif bytes_handle is None:
+            raise ValueError("Either filepath or bytes_handle is required")
+        elif not filename:
+            raise ValueError("filename is required with bytes_handle")
         if filename:
             filename = ensure_unicode(filename)
         url = u"{0}/rest/orgs/{1}{2}".format(self.base_url, self.org_id, ensure_unicode(uri))
         mime_type = mimetype or mimetypes.guess_type(filename or filepath)[0] or "application/octet-stream"
-        with open(filepath, 'rb') as filehandle:
-            attachment_name = filename or os.path.basename(filepath)
-            multipart_data = {'file': (attachment_name, filehandle, mime_type)}
-            multipart_data.update(data or {})
-            encoder = MultipartEncoder(fields=multipart_data)
+        attachment_name = filename or os.path.basename(filepath)
+        if filepath:
+            with open(filepath, 'rb') as filehandle:
+                return self._post_multipart(url, attachment_name, filehandle, mime_type, data,
+                                            co3_context_token, timeout, progress_callback, retries)
+        if isinstance(bytes_handle, (bytes, bytearray)):
+            bytes_handle = io.BytesIO(bytes_handle)
+        return self._post_multipart(url, attachment_name, bytes_handle, mime_type, data,
+                                    co3_context_token, timeout, progress_callback, retries)
+
+    def _post_multipart(self, url, attachment_name, source, mime_type, data,
+                        co3_context_token, timeout, progress_callback, retries):
+        """Post a multipart/form-data body, streaming the 'file' part from source.
+           The body is rebuilt (and the source rewound) for each attempt, including the
+           retry after re-authentication in _execute_request.  Content from a stream or
+           iterator can't be re-sent, so its 401 response is raised rather than retried.
+        """
+        # The 'file' part goes last, so that a stream of unknown length can be framed around it
+        fields = list((data or {}).items())
+        if hasattr(source, "read") and AttachmentReader.is_seekable(source):
+            reader = AttachmentReader(source)
+            chunks = None
+            fields.append(('file', (attachment_name, reader, mime_type)))
+        else:
+            reader = None
+            if hasattr(source, "read"):
+                chunks = iter(lambda: source.read(UPLOAD_CHUNK_SIZE), b"")
+            else:
+                chunks = iter(source)
+            fields.append(('file', (attachment_name, b"", mime_type)))
+        # the response to each attempt (None if it failed)
+        attempts = []
+
+        def post_body(url, **kwargs):
+            """Build the body and post it"""
+            if attempts:
+                if reader is None:
+                    # the content is gone, so this is the response to the first attempt (a 401)
+                    return attempts[-1]
+                reader.rewind()
+            attempts.append(None)
+            encoder = MultipartEncoder(fields=fields)
+            if chunks is None:
+                body = encoder
+                if progress_callback:
+                    body = MultipartEncoderMonitor(encoder,
+                                                   lambda monitor: progress_callback(monitor.bytes_read, monitor.len))
+            else:
+                body = self._chunked_multipart(encoder, chunks, progress_callback)
             headers = self.make_headers(co3_context_token,
                                         additional_headers={'content-type': encoder.content_type})
-            response = self._execute_request(self.session.post,
-                                             url,
-                                             data=encoder,
-                                             proxies=self.proxies,
+            attempts[-1] = self.session.post(url,
+                                             data=body,
                                              cookies=self.cookies,
                                              headers=headers,
-                                             verify=self.verify,
-                                             timeout=timeout)
-            BasicHTTPException.raise_if_error(response)
-            return json.loads(response.text)
+                                             **kwargs)
+            return attempts[-1]
+
+        # the retry after re-authentication isn't counted
+        failures = 0
+        while True:
+            try:
+                response = self._execute_request(post_body,
+                                                 url,
+                                                 proxies=self.proxies,
+                                                 verify=self.verify,
+                                                 timeout=timeout)
+                break
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as exc:
+                if reader is None or failures >= retries:
+                    raise
+                failures += 1
+                LOG.warning(u"Retrying upload of '%s' after error: %s", attachment_name, exc)
+        BasicHTTPException.raise_if_error(response)
+        return json.loads(response.text)
+
+    @staticmethod
+    def _chunked_multipart(encoder, chunks, progress_callback=None):
+        """Generate a multipart body around a stream of chunks (the encoder has the framing and an empty
+           'file' part at the end), so that it can be sent with chunked transfer-encoding.
+        """
+        framing = encoder.to_string()
+        epilogue = u"\r\n--{0}--\r\n".format(encoder.boundary_value).encode("utf-8")
+        yield framing[:-len(epilogue)]
+        sent = 0
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+                sent += len(chunk)
+                if progress_callback:
+                    progress_callback(sent, None)
+        yield epilogue
 
     def post_artifact_file(self, uri, artifact_type, artifact_filepath,
-                           description=None, value=None, mimetype=None, co3_context_token=None, timeout=None):
+                           description=None, value=None, mimetype=None, co3_context_token=None, timeout=None,
+                           filename=None, bytes_handle=None, progress_callback=None, retries=0):
         """
         Post a file artifact to the specified URI
         e.g. "/incidents/<id>/artifacts/files"
 
         :param uri: The REST URI for posting
         :param artifact_type: the artifact type name ("IP Address", etc) or type ID
-        :param artifact_filepath: the path of the file to post
+        :param artifact_filepath: the path of the file to post, or None to post bytes_handle
         :param description: optional description for the artifact
         :param value: optional value for the artifact
         :param mimetype: optional override for the guessed MIME type
         :param co3_context_token: Action Module context token, if responding to an Action Module event
         :param timeout: optional timeout (seconds)
+        :param filename: optional name of the file when posted (required with bytes_handle)
+        :param bytes_handle: the content to post if there is no artifact_filepath (see :meth:`post_attachment`)
+        :param progress_callback: optional function called as `progress_callback(bytes_sent, total_bytes)`
+        :param retries: number of times to re-send the content after a connection error
 
         """
         artifact = {
@@ -366,10 +716,14 @@ class BaseClient(object):
         }
         return self.post_attachment(uri,
                                     artifact_filepath,
+                                    filename=filename,
                                     mimetype=mimetype,
                                     data=mimedata,
                                     co3_context_token=co3_context_token,
-                                    timeout=timeout)
+                                    timeout=timeout,
+                                    bytes_handle=bytes_handle,
+                                    progress_callback=progress_callback,
+                                    retries=retries)
 
     def _get_put(self, uri, apply_func, co3_context_token=None, timeout=None):
         """Internal helper to do a get/apply/put loop
@@ -389,13 +743,13 @@ class BaseClient(object):
             apply_func(payload)
         except NoChange:
             return payload
-        payload_json = json.dumps(payload)
+        payload_json, encoding_headers = self.make_json_body(payload)
         response = self._execute_request(self.session.put,
                                          url,
                                          data=payload_json,
                                          proxies=self.proxies,
                                          cookies=self.cookies,
-                                         headers=self.make_headers(co3_context_token),
+                                         headers=self.make_headers(co3_context_token, encoding_headers),
                                          verify=self.verify,
                                          timeout=timeout)
         if response.status_code == 200:
@@ -445,13 +799,13 @@ class BaseClient(object):
           BasicHTTPException - if an HTTP exception occurs.
         """
         url = u"{0}/rest/orgs/{1}{2}".format(self.base_url, self.org_id, ensure_unicode(uri))
-        payload_json = json.dumps(payload)
+        payload_json, encoding_headers = self.make_json_body(payload)
         response = self._execute_request(self.session.put,
                                          url,
                                          data=payload_json,
                                          proxies=self.proxies,
                                          cookies=self.cookies,
-                                         headers=self.make_headers(co3_context_token),
+                                         headers=self.make_headers(co3_context_token, encoding_headers),
                                          verify=self.verify,
                                          timeout=timeout)
         BasicHTTPException.raise_if_error(response)
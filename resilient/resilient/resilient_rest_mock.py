@@ -1,16 +1,39 @@
 # (c) Copyright IBM Corp. 2010, 2017. All Rights Reserved.
 """ Requests mock for Resilient REST API """
 
+import io
+import os
 import logging
+import threading
 from collections import namedtuple
 import json
 import re
 import requests_mock
 from six import add_metaclass
+
+try:
+    # Python 3
+    import urllib.parse as urlparse
+except:
+    # Python 2
+    import urlparse
+
 LOG = logging.getLogger(__name__)
 LOG.addHandler(logging.StreamHandler())
 LOG.setLevel(logging.DEBUG)
 
+# Files written by LoggingSimpleClient are named
+#   <status>_<JSON|DATA|HEADER>_<method>_<path>_<params>_<timestamp>
+# where '/' in the path is replaced by '_' and ':' in the timestamp by '-'
+CAPTURE_FILENAME = re.compile(r"^(?P<status>\d+)_(?P<kind>JSON|DATA|HEADER)_(?P<method>[A-Z]+)"
+                              r"_(?P<path>.*)_(?P<params>[^_]*)_(?P<timestamp>[^_]+)$")
+
+# Numeric path segments (org id, incident id, ...) are replaced with this to make a path template
+NUMERIC_SEGMENT = re.compile(r"_[0-9]+(?=_|$)")
+
+# Headers that describe the original transfer, not the (already decoded) captured body
+TRANSFER_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
 
 def resilient_endpoint(request_type, uri):
     def mark(func):
@@ -20,11 +43,21 @@ def resilient_endpoint(request_type, uri):
     return mark
 
 
+def capture_path_key(path):
+    """ Mangle a URL path the same way LoggingSimpleClient does for its filenames """
+    return path.replace('/', '_').replace(':', '-')
+
+
+def capture_template_key(path_key):
+    """ Make a path template from a mangled path, by replacing the numeric segments """
+    return NUMERIC_SEGMENT.sub("_#", path_key)
+
+
 class ResilientMockType(type):
     def __new__(mcl, name, bases, nmspc):
         Endpoint = namedtuple("Endpoint", "type uri")
         try:
-            endpoints = bases[0].registered_endpoints
+            endpoints = dict(bases[0].registered_endpoints)
         except:
             endpoints = {}
         for obj in nmspc.values():
@@ -42,23 +75,109 @@ class ResilientMock(object):
         self.org_name = org_name or "Test Org"
         LOG.info("Initialize ResilientMock %s %s", self.email, self.org_name)
 
-        self.adapter = requests_mock.Adapter()
-        for endpoint, handler in self.registered_endpoints.items():
-            # Register with regex since some endpoints embed the org_id in the path
+        # Index the handlers by request method, with precompiled patterns,
+        # so that each request is only tested against the endpoints for its own method.
+        # Later registrations are tried first (the same order as adapter matchers).
+        self.endpoints = {}
+        for endpoint, handler in reversed(list(self.registered_endpoints.items())):
             LOG.info("Registering %s %s to %s", endpoint.type,
                      endpoint.uri, str(handler))
-            self.adapter.add_matcher(lambda request,
-                                     method=endpoint.type,
-                                     callback=handler,
-                                     uri=endpoint.uri: self._custom_matcher(method,
-                                                                   uri,
-                                                                   lambda request: callback(self, request),
-                                                                   request))
-
-    @staticmethod
-    def _custom_matcher(request_type, uri, response_callback, request):
+            self.endpoints.setdefault(endpoint.type, []).append((re.compile(endpoint.uri), handler))
+
+        self.adapter = requests_mock.Adapter()
+        self.adapter.add_matcher(self._match)
+
+    def _match(self, request):
         """ matcher function for passing to adapter.add_matcher() """
-        if request.method == request_type and re.search(uri, request.url):
-            return response_callback(request)
-        else:
-            return None
+        for pattern, handler in self.endpoints.get(request.method, ()):
+            if pattern.search(request.url):
+                response = handler(self, request)
+                if response is not None:
+                    return response
+        return None
+
+
+class ResilientReplayMock(ResilientMock):
+    """
+    Mock that replays the Resilient REST API responses captured by LoggingSimpleClient
+    (the `log_http_responses` option).
+
+    Responses are looked up by (method, path), then by (method, path template) where the
+    numeric path segments are wildcards.  When the same request was captured several times,
+    the responses are replayed in the order they were captured, repeating the last one.
+    Requests that are not in the capture fall through to any endpoints registered
+    with `@resilient_endpoint` in a subclass.
+    """
+
+    def __init__(self, org_name=None, email=None, capture_directory=None):
+        super(ResilientReplayMock, self).__init__(org_name=org_name, email=email)
+        self.responses = {}
+        self.templates = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        if capture_directory:
+            self.load(capture_directory)
+
+    def load(self, capture_directory):
+        """
+        Load the captured responses from a directory
+
+        :param capture_directory: directory written by LoggingSimpleClient
+        :return: the number of responses loaded
+        """
+        directory = os.path.expandvars(os.path.expanduser(capture_directory))
+        if not os.path.isdir(directory):
+            raise Exception("Response Capture Directory {0} does not exist!".format(capture_directory))
+
+        captures = []
+        for filename in os.listdir(directory):
+            match = CAPTURE_FILENAME.match(filename)
+            if not match or match.group("kind") == "HEADER":
+                continue
+            with io.open(os.path.join(directory, filename), "rb") as capture_file:
+                content = capture_file.read()
+            if match.group("kind") == "JSON" and not content:
+                # Earlier versions of LoggingSimpleClient left an empty JSON file beside each DATA file
+                continue
+            headers = {}
+            header_filename = "_".join((match.group("status"), "HEADER", filename.split("_", 2)[2]))
+            header_path = os.path.join(directory, header_filename)
+            if os.path.exists(header_path):
+                with io.open(header_path, "r", encoding="utf-8") as header_file:
+                    headers = dict((key, value) for key, value in json.load(header_file).items()
+                                   if key.lower() not in TRANSFER_HEADERS)
+            captures.append((match.group("timestamp"),
+                             match.group("method"),
+                             match.group("path"),
+                             (int(match.group("status")), content, headers)))
+
+        for _, method, path_key, response in sorted(captures, key=lambda capture: capture[0]):
+            self.responses.setdefault((method, path_key), []).append(response)
+            self.templates.setdefault((method, capture_template_key(path_key)), []).append(response)
+
+        LOG.info("Loaded %d captured responses from %s", len(captures), directory)
+        return len(captures)
+
+    def _next_response(self, key, captured):
+        """ The next captured response for this key, repeating the last one """
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = min(position + 1, len(captured) - 1)
+        return captured[position]
+
+    def _match(self, request):
+        """ matcher function for passing to adapter.add_matcher() """
+        path_key = capture_path_key(urlparse.urlparse(request.url).path)
+        key = (request.method, path_key)
+        captured = self.responses.get(key)
+        if captured is None:
+            key = (request.method, capture_template_key(path_key))
+            captured = self.templates.get(key)
+        if captured is None:
+            return super(ResilientReplayMock, self)._match(request)
+
+        status_code, content, headers = self._next_response(key, captured)
+        return requests_mock.create_response(request,
+                                             status_code=status_code,
+                                             content=content,
+                                             headers=dict(headers))
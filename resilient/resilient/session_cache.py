@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# (c) Copyright IBM Corp. 2010, 2017. All Rights Reserved.
+
+"""Cache of Resilient REST API session tokens, reused across process restarts"""
+
+import os
+import io
+import json
+import time
+import hashlib
+import logging
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_SESSION_CACHE_DIR = os.path.join("~", ".resilient", "sessions")
+
+
+class SessionCache(object):
+    """
+    Stores the session cookie and CSRF token of a REST API session in a file
+    that only the current user can read, keyed by (server URL, org, user).
+
+    The files contain credentials to an open session, so they are written with
+    mode 0600 in a 0700 directory, and files that other users could read are ignored.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = os.path.expanduser(directory or DEFAULT_SESSION_CACHE_DIR)
+
+    def _path(self, base_url, org_name, email):
+        key = u"\n".join((base_url or u"", org_name or u"", email or u""))
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    @staticmethod
+    def _is_private(path):
+        """True if the file is owned by this user and not accessible to anyone else"""
+        if os.name == "nt":
+            # No POSIX permissions; rely on the user profile directory ACLs
+            return True
+        stat = os.stat(path)
+        return stat.st_uid == os.getuid() and not stat.st_mode & 0o077
+
+    def load(self, base_url, org_name, email):
+        """
+        Get the cached session tokens
+
+        :return: dict with 'JSESSIONID' and 'csrf_token', or None
+        """
+        path = self._path(base_url, org_name, email)
+        try:
+            if not self._is_private(path):
+                LOG.warning(u"Ignoring session cache file %s, which other users can access", path)
+                self.delete(base_url, org_name, email)
+                return None
+            with io.open(path, "r", encoding="utf-8") as cache_file:
+                tokens = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+        if not tokens.get("JSESSIONID") or not tokens.get("csrf_token"):
+            return None
+        return tokens
+
+    def save(self, base_url, org_name, email, jsessionid, csrf_token):
+        """Store the session tokens"""
+        path = self._path(base_url, org_name, email)
+        tokens = {"JSESSIONID": jsessionid,
+                  "csrf_token": csrf_token,
+                  "saved": int(time.time())}
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0o700)
+            # Write to a new private file, then rename it over the old one
+            temp_path = "{0}.{1}.tmp".format(path, os.getpid())
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            handle = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(handle, "w") as cache_file:
+                cache_file.write(json.dumps(tokens))
+            if os.name == "nt" and os.path.exists(path):
+                os.remove(path)
+            os.rename(temp_path, path)
+        except (IOError, OSError) as exc:
+            LOG.warning(u"Unable to save session to cache %s: %s", self.directory, exc)
+
+    def delete(self, base_url, org_name, email):
+        """Remove the cached session tokens"""
+        try:
+            os.remove(self._path(base_url, org_name, email))
+        except (IOError, OSError):
+            pass
@@ -0,0 +1,157 @@
+# (c) Copyright IBM Corp. 2010, 2017. All Rights Reserved.
+from __future__ import print_function
+import io
+import json
+import re
+import pytest
+import requests
+import requests_mock
+from requests_toolbelt.multipart.decoder import MultipartDecoder
+import resilient
+from resilient.resilient_rest_mock import ResilientMock, resilient_endpoint
+
+
+class AttachmentMock(ResilientMock):
+    """ Mock that records the attachments that are posted """
+
+    def __init__(self, *args, **kwargs):
+        super(AttachmentMock, self).__init__(*args, **kwargs)
+        self.uploads = []
+        self.failures = []
+
+    @resilient_endpoint("POST", "/rest/session")
+    def session_post(self, request):
+        session_data = {
+            "csrf_token": "79945884c2e6f2339cbffbbaba01f17b",
+            "user_id": 1,
+            "orgs": [{"enabled": True, "id": 201, "name": self.org_name}],
+        }
+        return requests_mock.create_response(request,
+                                             status_code=200,
+                                             headers={"Set-Cookie": "JSESSIONID=FakeSessionId; Path=/"},
+                                             json=session_data)
+
+    @resilient_endpoint("POST", "/incidents/[0-9]+/(attachments|artifacts/files)$")
+    def attachment_post(self, request):
+        body = request.body
+        if not isinstance(body, bytes):
+            # streamed body: an encoder or a generator of chunks
+            body = body.read() if hasattr(body, "read") else b"".join(body)
+        if self.failures:
+            status = self.failures.pop(0)
+            if status == "error":
+                raise requests.exceptions.ConnectionError("connection reset")
+            return requests_mock.create_response(request, status_code=status, json={})
+        fields = {}
+        for part in MultipartDecoder(body, request.headers["content-type"]).parts:
+            disposition = part.headers[b"Content-Disposition"].decode("utf-8")
+            name = re.search(r'name="([^"]*)"', disposition).group(1)
+            fields.setdefault(name, []).append(part.content)
+        self.uploads.append((request, fields))
+        return requests_mock.create_response(request, status_code=200, json={"id": len(self.uploads)})
+
+
+@pytest.fixture
+def mock_client():
+    mock = AttachmentMock(org_name="Test Org")
+    client = resilient.SimpleClient(org_name="Test Org", base_url="https://resilient.example.com")
+    client.session.mount("https://", mock.adapter)
+    client.connect("api@example.com", "password")
+    return mock, client
+
+
+def _content(fields, name="file"):
+    return fields[name][0]
+
+
+class TestPostAttachment:
+    def test_filepath(self, mock_client, tmpdir):
+        mock, client = mock_client
+        path = tmpdir.join("data.txt")
+        path.write_binary(b"file content")
+        assert client.post_attachment("/incidents/1/attachments", path.strpath) == {"id": 1}
+        assert _content(mock.uploads[0][1]) == b"file content"
+
+    def test_bytes(self, mock_client):
+        mock, client = mock_client
+        client.post_attachment("/incidents/1/attachments", None, filename="data.bin", bytes_handle=b"\x00\x01\x02")
+        assert _content(mock.uploads[0][1]) == b"\x00\x01\x02"
+
+    def test_file_like_position(self, mock_client):
+        mock, client = mock_client
+        handle = io.BytesIO(b"skip:content")
+        handle.seek(5)
+        client.post_attachment("/incidents/1/attachments", None, filename="data.bin", bytes_handle=handle)
+        assert _content(mock.uploads[0][1]) == b"content"
+
+    def test_iterator(self, mock_client):
+        mock, client = mock_client
+        progress = []
+        chunks = (part for part in (b"one,", b"two,", b"three"))
+        client.post_attachment("/incidents/1/attachments", None, filename="data.csv", bytes_handle=chunks,
+                               progress_callback=lambda sent, total: progress.append((sent, total)))
+        request = mock.uploads[0][0]
+        assert request.headers.get("Transfer-Encoding") == "chunked"
+        assert _content(mock.uploads[0][1]) == b"one,two,three"
+        assert progress == [(4, None), (8, None), (13, None)]
+
+    def test_progress(self, mock_client):
+        mock, client = mock_client
+        progress = []
+        client.post_attachment("/incidents/1/attachments", None, filename="data.bin", bytes_handle=b"x" * 100000,
+                               progress_callback=lambda sent, total: progress.append((sent, total)))
+        assert progress
+        assert progress[-1][0] == progress[-1][1]
+
+    def test_missing_content(self, mock_client):
+        mock, client = mock_client
+        with pytest.raises(ValueError):
+            client.post_attachment("/incidents/1/attachments", None)
+        with pytest.raises(ValueError):
+            client.post_attachment("/incidents/1/attachments", None, bytes_handle=b"no name")
+
+    def test_retry(self, mock_client):
+        mock, client = mock_client
+        mock.failures = ["error"]
+        client.post_attachment("/incidents/1/attachments", None, filename="data.bin", bytes_handle=b"content",
+                               retries=1)
+        assert _content(mock.uploads[0][1]) == b"content"
+
+    def test_no_retry_for_iterator(self, mock_client):
+        mock, client = mock_client
+        mock.failures = ["error"]
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.post_attachment("/incidents/1/attachments", None, filename="data.bin",
+                                   bytes_handle=iter([b"content"]), retries=1)
+
+    def test_reauthenticate(self, mock_client):
+        mock, client = mock_client
+        mock.failures = [401]
+        client.post_attachment("/incidents/1/attachments", None, filename="data.bin", bytes_handle=b"content")
+        assert _content(mock.uploads[0][1]) == b"content"
+
+    def test_reauthenticate_not_a_retry(self, mock_client):
+        """The re-send after re-authentication doesn't count as a retry"""
+        mock, client = mock_client
+        mock.failures = [401, "error"]
+        client.post_attachment("/incidents/1/attachments", None, filename="data.bin", bytes_handle=b"content",
+                               retries=1)
+        assert _content(mock.uploads[0][1]) == b"content"
+
+    def test_reauthenticate_iterator(self, mock_client):
+        """Content from an iterator can't be re-sent, so the 401 is raised"""
+        mock, client = mock_client
+        mock.failures = [401]
+        with pytest.raises(resilient.SimpleHTTPException) as exc_info:
+            client.post_attachment("/incidents/1/attachments", None, filename="data.bin",
+                                   bytes_handle=iter([b"content"]))
+        assert exc_info.value.response.status_code == 401
+        assert not mock.uploads
+
+    def test_artifact_file(self, mock_client):
+        mock, client = mock_client
+        client.post_artifact_file("/incidents/1/artifacts/files", "Malware Sample", None,
+                                  filename="sample.exe", bytes_handle=b"MZ")
+        fields = mock.uploads[0][1]
+        assert _content(fields) == b"MZ"
+        assert json.loads(_content(fields, "artifact").decode("utf-8"))["type"] == "Malware Sample"
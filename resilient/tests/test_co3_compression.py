@@ -0,0 +1,89 @@
+# (c) Copyright IBM Corp. 2010, 2017. All Rights Reserved.
+from __future__ import print_function
+import gzip
+import io
+import json
+import pytest
+import requests_mock
+import resilient
+from resilient.resilient_rest_mock import ResilientMock, resilient_endpoint
+
+
+class EchoMock(ResilientMock):
+    """ Mock that echoes the (decompressed) request body """
+
+    @resilient_endpoint("POST", "/rest/session")
+    def session_post(self, request):
+        session_data = {
+            "csrf_token": "79945884c2e6f2339cbffbbaba01f17b",
+            "user_id": 1,
+            "orgs": [{"enabled": True, "id": 201, "name": self.org_name}],
+        }
+        return requests_mock.create_response(request,
+                                             status_code=200,
+                                             headers={"Set-Cookie": "JSESSIONID=FakeSessionId; Path=/"},
+                                             json=session_data)
+
+    @resilient_endpoint("POST", "/incidents$")
+    def incident_post(self, request):
+        body = request.body
+        encoding = request.headers.get("Content-Encoding")
+        if encoding == "gzip":
+            body = gzip.GzipFile(fileobj=io.BytesIO(body)).read()
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        return requests_mock.create_response(request,
+                                             status_code=200,
+                                             json={"encoding": encoding,
+                                                   "accept": request.headers.get("Accept-Encoding"),
+                                                   "payload": json.loads(body)})
+
+
+def _client(threshold):
+    client = resilient.SimpleClient(org_name="Test Org", base_url="https://resilient.example.com",
+                                    request_compression_threshold=threshold)
+    client.session.mount("https://", EchoMock(org_name="Test Org").adapter)
+    client.connect("api@example.com", "password")
+    return client
+
+
+class TestRequestCompression:
+    @pytest.mark.parametrize("threshold, size, encoding", [
+        (None, 10000, None),
+        (1000, 10, None),
+        (1000, 10000, "gzip"),
+    ])
+    def test_threshold(self, threshold, size, encoding):
+        payload = {"name": "x" * size}
+        result = _client(threshold).post("/incidents", payload)
+        assert result["encoding"] == encoding
+        assert result["payload"] == payload
+
+    def test_accept_encoding(self):
+        result = _client(None).post("/incidents", {})
+        assert "gzip" in result["accept"]
+
+    def test_make_json_body(self):
+        client = resilient.SimpleClient(request_compression_threshold=0)
+        body, headers = client.make_json_body({"a": u"\u00e9"})
+        assert headers == {"content-encoding": "gzip"}
+        assert json.loads(gzip.GzipFile(fileobj=io.BytesIO(body)).read().decode("utf-8")) == {"a": u"\u00e9"}
+
+    def test_threshold_in_bytes(self):
+        client = resilient.SimpleClient(request_compression_threshold=len(json.dumps({"a": "xx"}).encode("utf-8")))
+        assert client.make_json_body({"a": "x"})[1] is None
+        assert client.make_json_body({"a": "xx"})[1] == {"content-encoding": "gzip"}
+
+    def test_get_client_threshold(self, monkeypatch):
+        """A threshold of 0 (compress every request) can be configured"""
+        created = []
+
+        def simple_client(**kwargs):
+            created.append(kwargs)
+            raise StopIteration()
+        monkeypatch.setattr(resilient.co3, "SimpleClient", simple_client)
+        opts = {"host": "resilient.example.com", "email": "api@example.com", "password": "password",
+                "org": "Test Org", "cafile": "false", "request_compression_threshold": 0}
+        with pytest.raises(StopIteration):
+            resilient.get_client(opts)
+        assert created[0]["request_compression_threshold"] == 0
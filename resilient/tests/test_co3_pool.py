@@ -0,0 +1,96 @@
+# (c) Copyright IBM Corp. 2010, 2017. All Rights Reserved.
+from __future__ import print_function
+import socket
+import threading
+import time
+import pytest
+import resilient
+from resilient.co3base import TLSHttpAdapter
+
+
+class ConnectionCounter(object):
+    """ HTTP server that counts the connections made to it, and answers each request after a short delay """
+    def __init__(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(20)
+        self.port = self.server.getsockname()[1]
+        self.accepted = []
+        self.thread = threading.Thread(target=self._accept)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except Exception:
+                return
+            self.accepted.append(conn)
+            handler = threading.Thread(target=self._respond, args=(conn,))
+            handler.daemon = True
+            handler.start()
+
+    @staticmethod
+    def _respond(conn):
+        data = b""
+        while True:
+            try:
+                chunk = conn.recv(4096)
+            except Exception:
+                return
+            if not chunk:
+                return
+            data += chunk
+            while b"\r\n\r\n" in data:
+                _, data = data.split(b"\r\n\r\n", 1)
+                time.sleep(0.1)
+                conn.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+
+    def close(self):
+        for conn in self.accepted:
+            conn.close()
+        self.server.close()
+
+
+@pytest.fixture
+def counter():
+    server = ConnectionCounter()
+    yield server
+    server.close()
+
+
+class TestConnectionPool:
+    def test_default_pool(self):
+        client = resilient.SimpleClient()
+        adapter = client.session.get_adapter("https://example.com")
+        assert isinstance(adapter, TLSHttpAdapter)
+        assert adapter.poolmanager.connection_pool_kw["maxsize"] == 10
+        assert "socket_options" not in adapter.poolmanager.connection_pool_kw
+
+    def test_configure_pool(self):
+        client = resilient.SimpleClient()
+        client.configure_pool(maxsize=25, block=True, retries=3, keepalive=30)
+        adapter = client.session.get_adapter("https://example.com")
+        pool_kw = adapter.poolmanager.connection_pool_kw
+        assert pool_kw["maxsize"] == 25
+        assert pool_kw["block"] is True
+        assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in pool_kw["socket_options"]
+        assert adapter.max_retries.total == 3
+        assert 503 in adapter.max_retries.status_forcelist
+
+    def test_warm_up(self, counter):
+        client = resilient.SimpleClient(base_url="http://127.0.0.1:{0}".format(counter.port))
+        adapter = TLSHttpAdapter(pool_maxsize=4)
+        client.session.mount("http://", adapter)
+        assert client.warm_up(6) == 4
+        assert len(counter.accepted) == 4
+
+        # the connections are used for the next requests
+        for _ in range(4):
+            client.session.head(client.base_url)
+        assert len(counter.accepted) == 4
+
+    def test_warm_up_failure(self):
+        client = resilient.SimpleClient(base_url="https://127.0.0.1:1")
+        assert client.warm_up(2) == 0
@@ -0,0 +1,120 @@
+# (c) Copyright IBM Corp. 2010, 2017. All Rights Reserved.
+from __future__ import print_function
+import json
+import os
+import pytest
+import requests
+import requests_mock
+import resilient
+from resilient.co3 import LoggingSimpleClient
+from resilient.resilient_rest_mock import ResilientMock, ResilientReplayMock, resilient_endpoint
+
+BASE_URL = "https://resilient.example.com"
+
+
+class RecordingMock(ResilientMock):
+    """ Hand-written mock to capture responses from """
+
+    @resilient_endpoint("POST", "/rest/session")
+    def session_post(self, request):
+        session_data = {
+            "csrf_token": "79945884c2e6f2339cbffbbaba01f17b",
+            "user_id": 1,
+            "orgs": [{"enabled": True, "id": 201, "name": self.org_name}],
+            "session_ip": "192.168.56.1",
+            "user_email": self.email
+        }
+        # Like a real server, so the cookie is in the captured headers
+        headers = {"Set-Cookie": "JSESSIONID=FakeSessionId; Path=/; Secure"}
+        return requests_mock.create_response(request,
+                                             status_code=200,
+                                             headers=headers,
+                                             json=session_data)
+
+    @resilient_endpoint("GET", "/incidents/[0-9]+$")
+    def incident_get(self, request):
+        inc_id = int(request.url.rsplit("/", 1)[1])
+        return requests_mock.create_response(request,
+                                             status_code=200,
+                                             json={"id": inc_id, "name": "captured"})
+
+    @resilient_endpoint("GET", "/incidents/[0-9]+/attachments/[0-9]+/contents$")
+    def attachment_contents_get(self, request):
+        return requests_mock.create_response(request,
+                                             status_code=200,
+                                             content=b"\x00binary\xff")
+
+
+class FallbackMock(ResilientReplayMock):
+    """ Replay mock with a hand-written endpoint for anything that was not captured """
+
+    @resilient_endpoint("GET", "/tasks/[0-9]+$")
+    def task_get(self, request):
+        return requests_mock.create_response(request, status_code=200, json={"fallback": True})
+
+
+def _client(mock, client_class=resilient.SimpleClient, **kwargs):
+    client = client_class(org_name="Test Org", base_url=BASE_URL, **kwargs)
+    client.session.mount("https://", mock.adapter)
+    client.connect("api@example.com", "password")
+    return client
+
+
+@pytest.fixture
+def capture_dir(tmpdir):
+    """ Record some traffic with LoggingSimpleClient """
+    client = _client(RecordingMock(org_name="Test Org"),
+                     client_class=LoggingSimpleClient,
+                     logging_directory=tmpdir.strpath)
+    client.get("/incidents/2314")
+    client.get_content("/incidents/2314/attachments/7/contents")
+    return tmpdir.strpath
+
+
+class TestResilientMock:
+    def test_method_index(self):
+        mock = RecordingMock()
+        assert set(mock.endpoints) == {"POST", "GET"}
+        assert len(mock.endpoints["GET"]) == 2
+
+    def test_unmatched(self):
+        client = _client(RecordingMock(org_name="Test Org"))
+        with pytest.raises(requests_mock.NoMockAddress):
+            client.get("/artifacts")
+
+
+class TestResilientReplayMock:
+    def test_replay(self, capture_dir):
+        mock = ResilientReplayMock(org_name="Test Org", capture_directory=capture_dir)
+        client = _client(mock)
+        assert client.org_id == 201
+        assert client.cookies["JSESSIONID"] == "FakeSessionId"
+        assert client.get("/incidents/2314") == {"id": 2314, "name": "captured"}
+        assert client.get_content("/incidents/2314/attachments/7/contents") == b"\x00binary\xff"
+
+    def test_replay_template(self, capture_dir):
+        client = _client(ResilientReplayMock(org_name="Test Org", capture_directory=capture_dir))
+        # Not captured, so the response for the same path template is used
+        assert client.get("/incidents/1001") == {"id": 2314, "name": "captured"}
+
+    def test_replay_fallback(self, capture_dir):
+        client = _client(FallbackMock(org_name="Test Org", capture_directory=capture_dir))
+        assert client.get("/tasks/5") == {"fallback": True}
+        with pytest.raises(requests_mock.NoMockAddress):
+            client.get("/artifacts")
+
+    def test_replay_sequence(self, tmpdir):
+        for timestamp, value in (("2018-01-01T10-00-01.000001", 1),
+                                 ("2018-01-01T10-00-02.000001", 2)):
+            filename = "200_JSON_GET__rest_orgs_201_incidents_1__{0}".format(timestamp)
+            tmpdir.join(filename).write(json.dumps({"value": value}))
+        mock = ResilientReplayMock(capture_directory=tmpdir.strpath)
+        session = requests.Session()
+        session.mount("https://", mock.adapter)
+        url = BASE_URL + "/rest/orgs/201/incidents/1"
+        values = [session.get(url).json()["value"] for _ in range(3)]
+        assert values == [1, 2, 2]
+
+    def test_missing_directory(self, tmpdir):
+        with pytest.raises(Exception):
+            ResilientReplayMock(capture_directory=os.path.join(tmpdir.strpath, "missing"))
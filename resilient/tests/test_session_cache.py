@@ -0,0 +1,141 @@
+# (c) Copyright IBM Corp. 2010, 2017. All Rights Reserved.
+from __future__ import print_function
+import os
+import stat
+import pytest
+import requests_mock
+import resilient
+from resilient.resilient_rest_mock import ResilientMock, resilient_endpoint
+
+BASE_URL = "https://resilient.example.com"
+
+
+class SessionMock(ResilientMock):
+    """ Mock that counts logins, and accepts the session cookie until it is expired """
+
+    def __init__(self, *args, **kwargs):
+        super(SessionMock, self).__init__(*args, **kwargs)
+        self.logins = 0
+        self.valid_sessions = set()
+        # (session cookie, X-sess-id) of each request with a session
+        self.requests = []
+
+    def _session_data(self):
+        return {"csrf_token": "csrf-{0}".format(self.logins),
+                "user_id": 1,
+                "orgs": [{"enabled": True, "id": 201, "name": self.org_name}]}
+
+    @resilient_endpoint("POST", "/rest/session")
+    def session_post(self, request):
+        self.logins += 1
+        session_id = "session-{0}".format(self.logins)
+        self.valid_sessions.add(session_id)
+        return requests_mock.create_response(request,
+                                             status_code=200,
+                                             headers={"Set-Cookie": "JSESSIONID={0}; Path=/".format(session_id)},
+                                             json=self._session_data())
+
+    def _respond(self, request, json):
+        """ the response, or 401 if the request's session isn't valid """
+        cookie = request.headers.get("Cookie", "")
+        session_id = cookie.split("JSESSIONID=", 1)[-1]
+        self.requests.append((session_id, request.headers.get("X-sess-id")))
+        if session_id not in self.valid_sessions:
+            return requests_mock.create_response(request, status_code=401, json={})
+        return requests_mock.create_response(request, status_code=200, json=json)
+
+    @resilient_endpoint("GET", "/rest/session")
+    def session_get(self, request):
+        return self._respond(request, self._session_data())
+
+    @resilient_endpoint("GET", "/rest/orgs/201/incidents/[0-9]+$")
+    def incident_get(self, request):
+        return self._respond(request, {"id": 1})
+
+
+@pytest.fixture
+def mock():
+    return SessionMock(org_name="Test Org")
+
+
+def _connect(mock, cache):
+    client = resilient.SimpleClient(org_name="Test Org", base_url=BASE_URL, session_cache=cache)
+    client.session.mount("https://", mock.adapter)
+    client.connect("api@example.com", "password")
+    return client
+
+
+class TestSessionCache:
+    def test_reuse(self, mock, tmpdir):
+        cache = resilient.SessionCache(tmpdir.join("sessions").strpath)
+        first = _connect(mock, cache)
+        second = _connect(mock, cache)
+        assert mock.logins == 1
+        assert second.cookies == first.cookies == {"JSESSIONID": "session-1"}
+        assert second.headers["X-sess-id"] == "csrf-1"
+        assert second.org_id == 201
+
+    def test_file_permissions(self, mock, tmpdir):
+        directory = tmpdir.join("sessions")
+        _connect(mock, resilient.SessionCache(directory.strpath))
+        files = os.listdir(directory.strpath)
+        assert len(files) == 1
+        assert stat.S_IMODE(os.stat(directory.strpath).st_mode) == 0o700
+        assert stat.S_IMODE(os.stat(directory.join(files[0]).strpath).st_mode) == 0o600
+
+    def test_stale(self, mock, tmpdir):
+        cache = resilient.SessionCache(tmpdir.strpath)
+        _connect(mock, cache)
+        mock.valid_sessions.clear()
+        client = _connect(mock, cache)
+        assert mock.logins == 2
+        assert client.cookies == {"JSESSIONID": "session-2"}
+        assert cache.load(BASE_URL, "Test Org", "api@example.com")["JSESSIONID"] == "session-2"
+
+    def test_keyed_by_user(self, mock, tmpdir):
+        cache = resilient.SessionCache(tmpdir.strpath)
+        cache.save(BASE_URL, "Test Org", "other@example.com", "session-x", "csrf-x")
+        _connect(mock, cache)
+        assert mock.logins == 1
+        assert cache.load(BASE_URL, "Other Org", "api@example.com") is None
+
+    def test_insecure_file_ignored(self, mock, tmpdir):
+        cache = resilient.SessionCache(tmpdir.strpath)
+        _connect(mock, cache)
+        path = tmpdir.join(os.listdir(tmpdir.strpath)[0]).strpath
+        os.chmod(path, 0o644)
+        assert cache.load(BASE_URL, "Test Org", "api@example.com") is None
+        assert not os.path.exists(path)
+
+    def test_no_cache(self, mock):
+        _connect(mock, None)
+        _connect(mock, None)
+        assert mock.logins == 2
+
+
+class TestRefreshSession:
+    def test_refresh(self, mock):
+        client = _connect(mock, None)
+        session = client.refresh_session()
+        assert session["csrf_token"] == "csrf-1"
+        assert mock.logins == 1
+
+    def test_refresh_expired(self, mock):
+        client = _connect(mock, None)
+        adapter = client.session.get_adapter(BASE_URL)
+        mock.valid_sessions.clear()
+        session = client.refresh_session()
+        # re-authenticated, and retried with the new session cookie
+        assert mock.logins == 2
+        assert session["csrf_token"] == "csrf-2"
+        assert client.headers["X-sess-id"] == "csrf-2"
+        assert client.session.get_adapter(BASE_URL) is adapter
+        # the request was sent again with the new session's cookie and X-sess-id
+        assert mock.requests == [("session-1", "csrf-1"), ("session-2", "csrf-2")]
+
+    def test_resend_after_401(self, mock):
+        client = _connect(mock, None)
+        mock.valid_sessions.clear()
+        assert client.get("/incidents/1") == {"id": 1}
+        assert mock.logins == 2
+        assert mock.requests == [("session-1", "csrf-1"), ("session-2", "csrf-2")]